@@ -0,0 +1,100 @@
+# Wall clock and bytes on the wire with and without request compression, against
+# the emulator behind a bandwidth limit: importContent with a compressible .pie
+# (sent as a string and streamed from a PieFile) and with incompressible random
+# data, and a large getFolderItems listing with and without gzipped responses.
+#
+#   python -m benchmarks.bench_compression --bandwidth 10e6 --pie-mb 8
+
+import argparse
+import base64
+import os
+import time
+
+from pyramid_api.api import PasswordGrant
+from pyramid_api.api_types import PieApiObject
+from pyramid_api.emulator import (
+    SEEDED_PASSWORD,
+    Emulator,
+    EmulatorState,
+    seed
+)
+from pyramid_api.streaming import PieFile
+
+IMPORT = '/API2/content/importContent'
+LISTING = '/API2/content/getFolderItems'
+
+
+def compressible_pie(size):
+    rows = b''.join(b'{"row": %d, "region": "north", "value": %d},' % (i, i % 97) for i in range(size // 40))
+    return base64.b64encode(rows[:size * 3 // 4])
+
+
+def random_pie(size):
+    return base64.b64encode(os.urandom(size * 3 // 4))
+
+
+def wire(api, endpoint):
+    stats = api.metrics.snapshot()[endpoint]
+    return (
+        stats['request_bytes']['sum'], stats['request_wire_bytes']['sum'],
+        stats['response_bytes']['sum'], stats['response_wire_bytes']['sum'])
+
+
+def run(label, emu, user, fn, endpoint, calls, **options):
+    api = PasswordGrant(emu.url, user, SEEDED_PASSWORD).get_api(**options)
+    me = api.getMe()
+    root = api.getUserPublicRootFolder(me.id)
+    start = time.perf_counter()
+    for _ in range(calls):
+        fn(api, me, root)
+    elapsed = (time.perf_counter() - start) / calls
+    sent, sent_wire, received, received_wire = wire(api, endpoint)
+    api.close()
+    print(
+        f'{label:<36} {elapsed * 1000:>9.1f} ms'
+        f' {sent / calls / 1e6:>9.2f} MB -> {sent_wire / calls / 1e6:>7.2f} MB sent'
+        f' {received / calls / 1e6:>9.2f} MB -> {received_wire / calls / 1e6:>7.2f} MB received')
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--bandwidth', type=float, default=10e6, help='bytes/s, 0 for none')
+    parser.add_argument('--pie-mb', type=float, default=8)
+    parser.add_argument('--items', type=int, default=20000, help='items in the listed folder')
+    parser.add_argument('--calls', type=int, default=3)
+    parser.add_argument('--threshold', type=int, default=64 << 10)
+    args = parser.parse_args()
+
+    state = EmulatorState()
+    tenant_id, = seed(state, items=args.items, fanout=args.items)
+    user = f'{state.tenants[tenant_id]["name"]}.user0'
+    size = int(args.pie_mb * 1e6)
+    pies = {'compressible': compressible_pie(size), 'random': random_pie(size)}
+    compressed = {'compress_requests': True, 'compress_threshold': args.threshold}
+
+    with Emulator(state, bandwidth=args.bandwidth or None) as emu:
+        for name, pie in pies.items():
+            text = pie.decode('ascii')
+
+            def as_string(api, me, root):
+                api.importContent(PieApiObject(root.id, text))
+
+            def as_file(api, me, root):
+                api.importContent(PieApiObject(root.id, PieFile(pie)))
+
+            for label, fn in (('str', as_string), ('PieFile', as_file)):
+                base = run(f'importContent[{label}] {name}', emu, user, fn, IMPORT, args.calls)
+                gz = run('  gzip', emu, user, fn, IMPORT, args.calls, **compressed)
+                print(f'{"":<36} {base / gz:>9.2f}x')
+
+        def listing(api, me, root):
+            api.getFolderItems(me.id, root.id)
+
+        base = run(f'getFolderItems/{args.items}', emu, user, listing, LISTING, args.calls, accept_encoding=None)
+        gz = run('  gzip', emu, user, listing, LISTING, args.calls)
+        print(f'{"":<36} {base / gz:>9.2f}x')
+
+
+if __name__ == '__main__':
+    main()
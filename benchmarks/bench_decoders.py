@@ -0,0 +1,60 @@
+# Decoding a 100k item findContentItem / getFolderItems listing, and encoding
+# as many createUser bodies.
+#
+#   python -m benchmarks.bench_decoders --items 100000
+
+import argparse
+from dataclasses import asdict
+import time
+
+from pyramid_api.api_types import (
+    ContentItem,
+    User
+)
+from pyramid_api.codecs import (
+    decoder,
+    encode_list,
+    encoder
+)
+
+
+def listing(n):
+    return [{
+        'id': f'id-{i}', 'parentId': 'parent', 'caption': f'item {i}', 'itemType': 1,
+        'contentType': 3, 'createdBy': 'admin', 'createdDate': 1600000000 + i,
+        'version': '1', 'modifiedDate': '2021-01-01', 'tenantId': 't1', 'description': None
+    } for i in range(n)]
+
+
+def run(label, fn, items, baseline=None):
+    start = time.perf_counter()
+    fn(items)
+    elapsed = time.perf_counter() - start
+    speedup = f'{baseline / elapsed:>6.1f}x' if baseline else ''
+    print(f'{label:<24} {len(items) / elapsed:>12.0f} items/s {speedup}')
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--items', type=int, default=100000)
+    args = parser.parse_args()
+    items = listing(args.items)
+    dec = decoder(ContentItem)
+    base = run('from_dict', lambda xs: [ContentItem.from_dict(i) for i in xs], items)
+    run('ContentItem(**i)', lambda xs: [ContentItem(**i) for i in xs], items, base)
+    run('codecs.decoder', lambda xs: list(map(dec, xs)), items, base)
+
+    users = [User('t1', f'user{i}', ['r1', 'r2'], email=f'user{i}@example.com') for i in range(args.items)]
+    enc = encoder(User)
+    print()
+    base = run(
+        'asdict + ignore nulls',
+        lambda xs: [{k: v for k, v in asdict(u).items() if v != None} for u in xs],
+        users)
+    run('codecs.encoder', lambda xs: list(map(enc, xs)), users, base)
+    run('codecs.encode_list', encode_list, users, base)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+# Compares one-connection-per-call (the old module level requests.request) with the
+# pooled keep-alive session owned by API, against a local HTTP/1.1 server.
+#
+#   python -m benchmarks.bench_session --calls 2000 --threads 8
+
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from http.server import (
+    BaseHTTPRequestHandler,
+    ThreadingHTTPServer
+)
+import json
+import threading
+import time
+
+import requests
+
+from pyramid_api.api import Grant
+
+ME = json.dumps({'data': {'tenantId': 't1', 'userName': 'admin', 'id': 'u1'}}).encode()
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    connections = 0
+    lock = threading.Lock()
+
+    def setup(self):
+        super().setup()
+        with Handler.lock:
+            Handler.connections += 1
+
+    def do_HEAD(self):
+        self.send_response(200)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(ME)))
+        self.end_headers()
+        self.wfile.write(ME)
+
+    def log_message(self, *args):
+        pass
+
+
+def run(label, fn, calls, threads):
+    Handler.connections = 0
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(lambda _: fn(), range(calls)))
+    elapsed = time.perf_counter() - start
+    print(f'{label:<10} {calls / elapsed:>10.0f} calls/s {Handler.connections:>8} connections')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--calls', type=int, default=2000)
+    parser.add_argument('--threads', type=int, default=8)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    domain = f'http://127.0.0.1:{server.server_port}'
+    ep = f'{domain}/API2/access/getMe'
+
+    run('unpooled', lambda: requests.request('POST', ep, json={'auth': 't'}).json(),
+        args.calls, args.threads)
+
+    grant = Grant()
+    grant.domain = domain
+    api = grant.get_api(pool_maxsize=args.threads, warm_up=args.threads)
+    api.token = 't'
+    run('pooled', api.getMe, args.calls, args.threads)
+    api.close()
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
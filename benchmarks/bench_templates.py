@@ -0,0 +1,53 @@
+# Rendering a WrappedType file for many rows of values: createFromFile per row
+# against a template compiled once, row by row and from columns.
+#
+#   python -m benchmarks.bench_templates --rows 10000
+
+import argparse
+import os
+import tempfile
+import time
+
+from pyramid_api.api_types import (
+    AdminType,
+    User
+)
+from pyramid_api.helper_types import WrappedType
+
+
+def run(label, fn, rows, baseline=None):
+    start = time.perf_counter()
+    fn(rows)
+    elapsed = time.perf_counter() - start
+    speedup = f'{baseline / elapsed:>6.1f}x' if baseline else ''
+    print(f'{label:<32} {len(rows) / elapsed:>12.0f} rows/s {speedup}')
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=10000)
+    args = parser.parse_args()
+    path = os.path.join(tempfile.gettempdir(), 'pyramid-bench-user.json')
+    WrappedType.create(User(
+        '${tenant}', '$first.$last', ['$role', 'fixed-role'],
+        email='${first}.${last}@example.com', adminType=AdminType.domainadmin)).to_file(path)
+    rows = [
+        {'tenant': 't1', 'first': f'ann{i}', 'last': 'lee', 'role': f'r{i % 3}'}
+        for i in range(args.rows)]
+    columns = {
+        'tenant': 't1', 'first': [r['first'] for r in rows],
+        'last': 'lee', 'role': [r['role'] for r in rows]}
+
+    base = run(
+        'createFromFile',
+        lambda xs: [WrappedType.createFromFile(path, v).to_instance() for v in xs], rows)
+    run(
+        'compileFromFile + instances',
+        lambda xs: list(WrappedType.compileFromFile(path).instances(xs)), rows, base)
+    template = WrappedType.compileFromFile(path)
+    run('instances_from_columns', lambda _: template.instances_from_columns(columns), rows, base)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,524 @@
+# What the client itself costs per call: body encoding, the _call_api layers, JSON
+# decoding and dataclass construction. Every public API method and the WrappedType
+# round trips run against an in-process transport that answers with pre-encoded
+# bytes and drains uploads without parsing them, so no server work is measured.
+# Listings run with 1, 1k and 100k items, uploads with 1 KB to 200 MB .pie files.
+#
+#   python -m benchmarks.suite
+#   python -m benchmarks.suite --quick --filter 'getFolderItems|importContent'
+#   python -m benchmarks.suite --save-baseline benchmarks/baseline.json
+#   python -m benchmarks.suite --baseline benchmarks/baseline.json --output results.json
+#
+# Reports ops/s, p50/p95/p99 latency and the peak traced memory of one call. With
+# --baseline the exit status is 1 when a case got slower or hungrier than
+# --tolerance allows.
+
+import argparse
+from dataclasses import dataclass
+import gc
+import inspect
+import json
+import math
+import os
+import platform
+import re
+import sys
+import tempfile
+import time
+import tracemalloc
+import warnings
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    List,
+    Sequence
+)
+from urllib.parse import urlparse
+
+from requests import Response
+from requests.adapters import BaseAdapter
+from requests.structures import CaseInsensitiveDict
+
+from pyramid_api.api import (
+    API,
+    Grant,
+    PasswordGrant,
+    TokenGrant
+)
+from pyramid_api.api_types import (
+    AccessType,
+    ContentItemObjectType,
+    ContentType,
+    NewFolder,
+    NewTenant,
+    PieApiObject,
+    Role,
+    SearchParams,
+    Server,
+    User
+)
+from pyramid_api.helper_types import WrappedType
+from pyramid_api.streaming import PieFile
+
+KB = 1 << 10
+MB = 1 << 20
+
+ITEM_COUNTS = (1, 1000, 100000)
+QUICK_ITEM_COUNTS = (1, 1000)
+PIE_SIZES = (KB, MB, 20 * MB, 200 * MB)
+QUICK_PIE_SIZES = (KB, MB)
+
+DOMAIN = 'http://pyramid.bench'
+
+# API methods that are not endpoint calls
+NOT_ENDPOINTS = frozenset(['bulk', 'map', 'close', 'warm_up'])
+
+
+##
+# --- Transport ---
+##
+
+class BenchAdapter(BaseAdapter):
+
+    def __init__(self):
+        super().__init__()
+        self.responses: Dict[str, bytes] = {}
+        self.sent = 0
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        body = request.body
+        if isinstance(body, (bytes, str)):
+            self.sent += len(body)
+        elif body is not None:
+            for chunk in body:
+                self.sent += len(chunk)
+        res = Response()
+        res.status_code = 200
+        res.reason = 'OK'
+        res.url = request.url
+        res.request = request
+        res.encoding = 'utf-8'
+        res.headers = CaseInsensitiveDict({'Content-Type': 'application/json'})
+        res._content = self.responses[urlparse(request.url).path]
+        return res
+
+    def close(self):
+        pass
+
+
+def bench_api() -> API:
+    api = Grant().get_api()
+    api.domain = DOMAIN
+    api.token = 'bench-token'
+    api.session.mount(DOMAIN, BenchAdapter())
+    return api
+
+
+##
+# --- Payloads ---
+##
+
+def content_items(n: int) -> List[Dict]:
+    return [{
+        'id': f'item-{i:08d}', 'parentId': 'folder-00000001', 'caption': f'Quarterly report {i}',
+        'itemType': 1, 'contentType': 3, 'createdBy': 'admin', 'createdDate': 1600000000 + i,
+        'version': '1', 'modifiedDate': '2021-01-01T00:00:00', 'tenantId': 'tenant-1',
+        'description': None
+    } for i in range(n)]
+
+
+def users(n: int) -> List[Dict]:
+    return [{
+        'tenantId': 'tenant-1', 'userName': f'user{i}', 'roleIds': ['role-1', 'role-2'],
+        'clientLicenseType': 200, 'id': f'user-{i:08d}', 'firstName': 'First',
+        'lastName': f'Last {i}', 'email': f'user{i}@example.com', 'adminType': 0, 'statusID': 1,
+        'createdDate': 1600000000 + i, 'lastLoginDate': 1600000000 + i
+    } for i in range(n)]
+
+
+def roles(n: int) -> List[Dict]:
+    return [
+        {'tenantId': 'tenant-1', 'roleName': 'role', 'roleId': f'role-{i:08d}'} for i in range(n)]
+
+
+def connection_strings(n: int) -> List[Dict]:
+    return [{
+        'id': f'conn-{i:08d}', 'modelId': f'model-{i}', 'modelName': f'Model {i}',
+        'serverId': 'server-1', 'serverName': 'postgres', 'dataBaseId': f'db-{i}',
+        'dataBaseName': f'sales_{i}', 'connectionStringType': 8, 'isDynamicModel': False
+    } for i in range(n)]
+
+
+def materialized_items(n: int) -> List[Dict]:
+    return [
+        {'itemId': f'item-{i:08d}', 'itemCaption': f'Item {i}', 'itemType': 1} for i in range(n)]
+
+
+def one(item: Callable[[int], List[Dict]]) -> Callable[[int], Dict]:
+    return lambda _: {'data': item(1)[0]}
+
+
+def many(item: Callable[[int], List[Dict]]) -> Callable[[int], Dict]:
+    return lambda n: {'data': item(n)}
+
+
+def modified(_: int) -> Dict:
+    return {'data': {'success': True, 'modifiedList': [{'id': 'new-id', 'name': 'new'}]}}
+
+
+def pie_file(size: int) -> str:
+    # base64 text like a real .pie export, written once per size and reused
+    path = os.path.join(tempfile.gettempdir(), f'pyramid-bench-{size}.pie')
+    if not os.path.exists(path) or os.path.getsize(path) != size:
+        block = b'QUJD' * (MB // 4)
+        with open(path, 'wb') as f:
+            for start in range(0, size, len(block)):
+                f.write(block[:min(len(block), size - start)])
+    return path
+
+
+##
+# --- Cases ---
+##
+
+@dataclass
+class Case:
+    name: str
+    # API method (or other callable) measured, used for the coverage check
+    covers: str
+    call: Callable[[API, Any], Any]
+    endpoint: str = None
+    response: Callable[[int], Any] = None
+    sizes: Sequence[int] = (1,)
+    # size -> argument handed to call, ie a file on disk
+    setup: Callable[[int], Any] = None
+    unit: str = 'items'
+
+    def ids(self, quick: bool) -> List[int]:
+        if self.sizes is ITEM_COUNTS and quick:
+            return list(QUICK_ITEM_COUNTS)
+        if self.sizes is PIE_SIZES and quick:
+            return list(QUICK_PIE_SIZES)
+        return list(self.sizes)
+
+
+def _wrapped(instance: Any) -> Callable[[API, Any], Any]:
+    return lambda api, _: WrappedType.create(instance).to_instance()
+
+
+def _wrapped_file(api: API, path: str) -> Any:
+    return WrappedType.createFromFile(path, {'tenantId': 't1', 'tenantName': 'bench'}).to_instance()
+
+
+def _wrapped_template(_: int) -> str:
+    path = os.path.join(tempfile.gettempdir(), 'pyramid-bench-wrapped.json')
+    WrappedType.create(NewTenant('$tenantId', '$tenantName', 1, 1, True)).to_file(path)
+    return path
+
+
+SEARCH = SearchParams('report', [ContentType.datadiscovery, ContentType.folder])
+USER = User('tenant-1', 'new-user', ['role-1'], email='new@example.com')
+SERVER = Server(5432, 'postgres', serverType=8, serverIp='10.0.0.1', tenantId='tenant-1')
+
+CASES: List[Case] = [
+    # auth
+    Case('authenticate', 'authenticate',
+         lambda api, _: api.authenticate(PasswordGrant(DOMAIN, 'admin', 'pw')),
+         '/API2/auth/authenticateUser', lambda _: 'bench-token'),
+    Case('validate_grant', 'validate_grant',
+         lambda api, _: api.validate_grant(TokenGrant(DOMAIN, 'bench-token')),
+         '/API2/access/getMe', one(users)),
+    # identity and notifications
+    Case('getMe', 'getMe', lambda api, _: api.getMe(), '/API2/access/getMe', one(users)),
+    Case('getNotificationIndicators', 'getNotificationIndicators',
+         lambda api, _: api.getNotificationIndicators('u1'),
+         '/API2/notification/getNotificationIndicators',
+         lambda _: {'data': {'models': 1, 'subscriptions': 2, 'alerts': 0,
+                             'publications': 3, 'conversations': 4}}),
+    Case('getUsersByName', 'getUsersByName', lambda api, _: api.getUsersByName('user'),
+         '/API2/access/getUsersByName', many(users), ITEM_COUNTS),
+    Case('getRolesByName', 'getRolesByName', lambda api, _: api.getRolesByName('role'),
+         '/API2/access/getRolesByName', many(roles), ITEM_COUNTS),
+    # content
+    Case('createNewFolder', 'createNewFolder',
+         lambda api, _: api.createNewFolder(NewFolder('folder-1', 'new folder')),
+         '/API2/content/createNewFolder', modified),
+    Case('findContentItem', 'findContentItem', lambda api, _: api.findContentItem(SEARCH),
+         '/API2/content/findContentItem', many(content_items), ITEM_COUNTS),
+    Case('findContentItem[columnar]', 'findContentItem',
+         lambda api, _: api.findContentItem(SEARCH, columnar=True),
+         '/API2/content/findContentItem', many(content_items), ITEM_COUNTS),
+    Case('getFolderItems', 'getFolderItems', lambda api, _: api.getFolderItems('u1', 'f1'),
+         '/API2/content/getFolderItems', many(content_items), ITEM_COUNTS),
+    Case('getFolderItems[columnar]', 'getFolderItems',
+         lambda api, _: api.getFolderItems('u1', 'f1', columnar=True),
+         '/API2/content/getFolderItems', many(content_items), ITEM_COUNTS),
+    Case('getUserPublicRootFolder', 'getUserPublicRootFolder',
+         lambda api, _: api.getUserPublicRootFolder('u1'),
+         '/API2/content/getUserPublicRootFolder', one(content_items)),
+    Case('getPrivateRootFolder', 'getPrivateRootFolder',
+         lambda api, _: api.getPrivateRootFolder('u1'),
+         '/API2/content/getPrivateRootFolder', one(content_items)),
+    Case('getPrivateFolderForUser', 'getPrivateFolderForUser',
+         lambda api, _: api.getPrivateFolderForUser('u1'),
+         '/API2/content/getPrivateFolderForUser', one(content_items)),
+    Case('getPublicOrGroupFolderByTenantId', 'getPublicOrGroupFolderByTenantId',
+         lambda api, _: api.getPublicOrGroupFolderByTenantId('tenant-1'),
+         '/API2/content/getPublicOrGroupFolderByTenantId', one(content_items)),
+    Case('getUserGroupRootFolder', 'getUserGroupRootFolder',
+         lambda api, _: api.getUserGroupRootFolder('u1'),
+         '/API2/content/getUserGroupRootFolder', one(content_items)),
+    Case('importContent[str]', 'importContent',
+         lambda api, data: api.importContent(PieApiObject('folder-1', data)),
+         '/API2/content/importContent', lambda _: {'data': {}}, (KB, MB),
+         setup=lambda size: 'QUJD' * (size // 4), unit='bytes'),
+    Case('importContent[PieFile]', 'importContent',
+         lambda api, path: api.importContent(PieApiObject('folder-1', PieFile(path))),
+         '/API2/content/importContent', lambda _: {'data': {}}, PIE_SIZES,
+         setup=pie_file, unit='bytes'),
+    Case('addRoleToItem', 'addRoleToItem', lambda api, _: api.addRoleToItem('f1', 'r1'),
+         '/API2/content/addRoleToItem', modified),
+    # management
+    Case('createTenant', 'createTenant', lambda api, _: api.createTenant(NewTenant('t1', 'bench')),
+         '/API2/access/createTenant', modified),
+    Case('getTenantByName', 'getTenantByName', lambda api, _: api.getTenantByName('bench'),
+         '/API2/access/getTenantByName',
+         lambda _: {'data': {
+             'id': 't1', 'name': 'bench', 'tenantSettings': {'showGroupFolder': True}}}),
+    Case('deleteTenants', 'deleteTenants', lambda api, _: api.deleteTenants(['t1'], True, True),
+         '/API2/access/deleteTenants', modified),
+    Case('createRole', 'createRole', lambda api, _: api.createRole(Role('t1', 'bench role')),
+         '/API2/access/createRole', modified),
+    Case('createUserDb', 'createUserDb', lambda api, _: api.createUserDb(USER),
+         '/API2/access/createUserDb', modified),
+    # data sources
+    Case('createDataServer', 'createDataServer', lambda api, _: api.createDataServer(SERVER),
+         '/API2/dataSources/createDataServer', modified),
+    Case('addRoleToServer', 'addRoleToServer',
+         lambda api, _: api.addRoleToServer('s1', 'r1', AccessType.read),
+         '/API2/dataSources/addRolesToServer', modified),
+    Case('addRoleToDataBase', 'addRoleToDataBase',
+         lambda api, _: api.addRoleToDataBase('db1', 'r1'),
+         '/API2/dataSources/addRolesToDataBase', modified),
+    Case('addRoleToModel', 'addRoleToModel', lambda api, _: api.addRoleToModel('m1', 'r1'),
+         '/API2/dataSources/addRolesToDataBase', modified),
+    Case('changeDataSource', 'changeDataSource',
+         lambda api, _: api.changeDataSource('c1', 'c2', 'i1'),
+         '/API2/dataSources/changeDataSource', modified),
+    Case('getDataSourcesByTenant', 'getDataSourcesByTenant',
+         lambda api, _: api.getDataSourcesByTenant('t1'),
+         '/API2/dataSources/getDataSourcesByTenant', many(materialized_items), ITEM_COUNTS),
+    Case('getAllConnectionStrings', 'getAllConnectionStrings',
+         lambda api, _: api.getAllConnectionStrings(),
+         '/API2/dataSources/getAllConnectionStrings', many(connection_strings), ITEM_COUNTS),
+    Case('getAllConnectionStrings[columnar]', 'getAllConnectionStrings',
+         lambda api, _: api.getAllConnectionStrings(columnar=True),
+         '/API2/dataSources/getAllConnectionStrings', many(connection_strings), ITEM_COUNTS),
+    Case('getItemConnectionString', 'getItemConnectionString',
+         lambda api, _: api.getItemConnectionString('i1', ContentItemObjectType.datadiscovery),
+         '/API2/dataSources/getItemConnectionString', many(connection_strings)),
+    Case('findServerByName', 'findServerByName', lambda api, _: api.findServerByName('postgres'),
+         '/API2/dataSources/findServerByName', many(materialized_items), ITEM_COUNTS),
+    Case('importModel[str]', 'importModel', lambda api, data: api.importModel('db1', data),
+         '/API2/dataSources/importModel', lambda _: {'data': 'model-1'}, (KB, MB),
+         setup=lambda size: 'QUJD' * (size // 4), unit='bytes'),
+    Case('importModel[PieFile]', 'importModel',
+         lambda api, path: api.importModel('db1', PieFile(path)),
+         '/API2/dataSources/importModel', lambda _: {'data': 'model-1'}, PIE_SIZES,
+         setup=pie_file, unit='bytes'),
+    Case('recognizeDataBase', 'recognizeDataBase',
+         lambda api, _: api.recognizeDataBase('s1', 'sales'),
+         '/API2/dataSources/recognizeDataBase', modified),
+    # tasks
+    Case('reRunTask', 'reRunTask', lambda api, _: api.reRunTask('task-1'),
+         '/API2/tasks/reRunTask', modified),
+    Case('runSchedule', 'runSchedule', lambda api, _: api.runSchedule('schedule-1'),
+         '/API2/tasks/runSchedule', lambda _: {'data': 'job-1'}),
+    # WrappedType round trips
+    Case('WrappedType[NewTenant]', 'WrappedType', _wrapped(NewTenant('t1', 'bench', 1, 1, True))),
+    Case('WrappedType[User]', 'WrappedType', _wrapped(USER)),
+    Case('WrappedType[Server]', 'WrappedType', _wrapped(SERVER)),
+    Case('WrappedType[Role]', 'WrappedType', _wrapped(Role('t1', 'bench role'))),
+    Case('WrappedType[SearchParams]', 'WrappedType', _wrapped(SEARCH)),
+    Case('WrappedType.createFromFile', 'WrappedType', _wrapped_file, setup=_wrapped_template),
+]
+
+
+def api_methods() -> List[str]:
+    return sorted(
+        name for name, _ in inspect.getmembers(API, inspect.isfunction)
+        if not name.startswith('_') and name not in NOT_ENDPOINTS
+    )
+
+
+def uncovered() -> List[str]:
+    return sorted(set(api_methods()) - {c.covers for c in CASES})
+
+
+##
+# --- Measurement ---
+##
+
+@dataclass
+class Result:
+    ops_per_sec: float
+    p50_ms: float
+    p95_ms: float
+    p99_ms: float
+    peak_kb: float
+    iterations: int
+
+
+def percentile(ordered: List[float], q: float) -> float:
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))]
+
+
+def measure(fn: Callable[[], Any], min_time: float, max_iterations: int) -> Result:
+    fn()  # warm up, ie compile decoders
+    gc.collect()
+    times = []
+    start = time.perf_counter()
+    while len(times) < 3 or (
+            time.perf_counter() - start < min_time and len(times) < max_iterations):
+        t = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t)
+    total = sum(times)
+    times.sort()
+    # memory is traced on a separate call, tracing slows everything down
+    gc.collect()
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return Result(
+        len(times) / total,
+        percentile(times, 0.5) * 1000,
+        percentile(times, 0.95) * 1000,
+        percentile(times, 0.99) * 1000,
+        peak / KB,
+        len(times)
+    )
+
+
+def run_case(api: API, case: Case, size: int, min_time: float, max_iterations: int) -> Result:
+    adapter = api.session.get_adapter(DOMAIN)
+    if case.endpoint is not None:
+        adapter.responses[case.endpoint] = json.dumps(case.response(size)).encode('utf-8')
+    arg = case.setup(size) if case.setup is not None else None
+    try:
+        return measure(lambda: case.call(api, arg), min_time, max_iterations)
+    finally:
+        adapter.responses.pop(case.endpoint, None)
+
+
+def case_id(case: Case, size: int) -> str:
+    if len(case.sizes) == 1:
+        return case.name
+    if case.unit == 'bytes':
+        return f'{case.name}/{size // MB}MB' if size >= MB else f'{case.name}/{size // KB}KB'
+    return f'{case.name}/{size}'
+
+
+def run_suite(
+    pattern: str = None,
+    quick: bool = False,
+    min_time: float = 0.5,
+    max_iterations: int = 10000,
+    echo: Callable[[str], Any] = print
+) -> Dict[str, Result]:
+    api = bench_api()
+    results = {}
+    try:
+        for case in CASES:
+            for size in case.ids(quick):
+                key = case_id(case, size)
+                if pattern and not re.search(pattern, key):
+                    continue
+                res = run_case(api, case, size, min_time, max_iterations)
+                results[key] = res
+                echo(
+                    f'{key:<44} {res.ops_per_sec:>12.1f} ops/s  p50 {res.p50_ms:>9.3f}ms  '
+                    f'p95 {res.p95_ms:>9.3f}ms  p99 {res.p99_ms:>9.3f}ms  '
+                    f'peak {res.peak_kb:>10.1f}KB')
+    finally:
+        api.close()
+    return results
+
+
+##
+# --- Results ---
+##
+
+def to_document(results: Dict[str, Result]) -> Dict[str, Any]:
+    return {
+        'meta': {
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': sys.version.split()[0],
+            'platform': platform.platform(),
+            'machine': platform.machine()
+        },
+        'results': {
+            key: vars(res) for key, res in results.items()
+        }
+    }
+
+
+def compare(
+    results: Dict[str, Any],
+    baseline: Dict[str, Any],
+    tolerance: float = 0.1,
+    memory_slack_kb: float = 64
+) -> List[str]:
+    # regressions of `results` against `baseline`, both in to_document format
+    regressions = []
+    for key, cur in results['results'].items():
+        base = baseline['results'].get(key)
+        if base is None:
+            continue
+        if cur['ops_per_sec'] < base['ops_per_sec'] * (1 - tolerance):
+            regressions.append(
+                f'{key}: {cur["ops_per_sec"]:.1f} ops/s, baseline {base["ops_per_sec"]:.1f}')
+        if cur['peak_kb'] > base['peak_kb'] * (1 + tolerance) + memory_slack_kb:
+            regressions.append(
+                f'{key}: peak {cur["peak_kb"]:.1f}KB, baseline {base["peak_kb"]:.1f}KB')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--filter', help='regex on the case ids, ie "getFolderItems/100000"')
+    parser.add_argument('--quick', action='store_true', help='skip 100k item and >1MB cases')
+    parser.add_argument('--min-time', type=float, default=0.5, help='seconds per case')
+    parser.add_argument('--max-iterations', type=int, default=10000)
+    parser.add_argument('--output', help='write results as JSON')
+    parser.add_argument('--baseline', help='compare against a results file')
+    parser.add_argument('--save-baseline', help='write results as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=0.1)
+    args = parser.parse_args()
+    # dataclasses_json complains about the None defaults of api_types on every call
+    warnings.filterwarnings('ignore', category=RuntimeWarning, module='dataclasses_json')
+
+    missing = uncovered()
+    if missing:
+        print(f'warning: no benchmark for {", ".join(missing)}')
+    document = to_document(run_suite(args.filter, args.quick, args.min_time, args.max_iterations))
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, 'w') as f:
+                json.dump(document, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(document, json.load(f), args.tolerance)
+        for line in regressions:
+            print(f'REGRESSION {line}')
+        if regressions:
+            sys.exit(1)
+        print(f'no regressions against {args.baseline}')
+
+
+if __name__ == '__main__':
+    main()
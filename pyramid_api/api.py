@@ -1,22 +1,42 @@
-from dataclasses import asdict
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    ThreadPoolExecutor,
+    wait
+)
+from contextlib import nullcontext
+from contextvars import copy_context
+from dataclasses import dataclass
+from functools import lru_cache
 import json
 from json.decoder import JSONDecodeError
 import logging
+import threading
+import time
 from typing import (
     Any,
+    Callable,
     Dict,
+    Iterable,
+    Iterator,
     List,
+    Optional,
+    TYPE_CHECKING,
+    Tuple,
     Union
 )
 
 import requests
-from requests.exceptions import HTTPError
+from requests.adapters import HTTPAdapter
+from requests.exceptions import (
+    HTTPError,
+    RequestException,
+    Timeout
+)
 
 from .api_types import (
     AccessType,
     ConnectionStringProperties,
     ContentItem,
-    ContentType,
     ContentItemObjectType,
     ImportApiResultObject,
     NotificationIndicatorsResult,
@@ -34,9 +54,128 @@ from .api_types import (
     TenantData,
     ValidRootFolderType,
 )
+from .bulk import (
+    DEFAULT_WORKERS,
+    BulkResult,
+    run_bulk
+)
+from .cache import (
+    ResponseCache,
+    as_cache,
+    request_key
+)
+from .codecs import (
+    decoder,
+    encode
+)
+from .columnar import (
+    Table,
+    TableBuilder
+)
+from .compression import (
+    DEFAULT_ACCEPT_ENCODING,
+    DEFAULT_LEVEL,
+    DEFAULT_THRESHOLD,
+    GZIP,
+    GzipStream,
+    compress,
+    should_compress,
+    wire_bytes
+)
+from .concurrency import (
+    ConcurrencyController,
+    as_concurrency_controller
+)
+from .endpoints import (
+    AUTHENTICATE_USER,
+    READ_ENDPOINTS
+)
+from .hooks import (
+    CallTiming,
+    Hooks,
+    as_hooks,
+    record_phase,
+    timed_encode
+)
+from .latency import (
+    LatencyPolicy,
+    as_latency_policy
+)
+from .metrics import (
+    MetricsRegistry,
+    as_metrics
+)
+from .singleflight import (
+    SingleFlight,
+    as_single_flight
+)
+from .streaming import (
+    RESPONSE_CHUNK_SIZE,
+    JsonArrayParser,
+    PieFile,
+    StreamingJsonBody
+)
+from .token_cache import (
+    TokenCache,
+    as_token_cache
+)
+from .tracing import (
+    LazyJson,
+    Tracer
+)
+
+if TYPE_CHECKING:
+    from .async_api import AsyncAPI
 
 LOG = logging.getLogger(__name__)
 
+##
+# --- Connection ---
+##
+
+@dataclass
+class ConnectionOptions:
+    # number of per-host pools kept alive by the session
+    pool_connections: int = 10
+    # keep-alive connections per host, should be >= the number of threads sharing the API
+    pool_maxsize: int = 10
+    # block instead of opening throwaway connections when the pool is exhausted
+    pool_block: bool = False
+    connect_timeout: Optional[float] = None
+    read_timeout: Optional[float] = None
+    max_retries: int = 0
+    # connections to open up front so the first calls skip the TCP/TLS handshake
+    warm_up: int = 0
+    # share one session (and its pools) across several API instances
+    session: Optional[requests.Session] = None
+    # gzip request bodies of at least compress_threshold bytes, the server must
+    # accept Content-Encoding: gzip (see compression.py)
+    compress_requests: bool = False
+    compress_threshold: int = DEFAULT_THRESHOLD
+    compress_level: int = DEFAULT_LEVEL
+    # response encodings to ask for, None asks for plain responses
+    accept_encoding: Optional[str] = DEFAULT_ACCEPT_ENCODING
+
+    @property
+    def timeout(self) -> Optional[Tuple[Optional[float], Optional[float]]]:
+        if self.connect_timeout is None and self.read_timeout is None:
+            return None
+        return (self.connect_timeout, self.read_timeout)
+
+    def build_session(self) -> requests.Session:
+        session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=self.pool_connections,
+            pool_maxsize=self.pool_maxsize,
+            max_retries=self.max_retries,
+            pool_block=self.pool_block
+        )
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        session.headers['Accept-Encoding'] = self.accept_encoding or 'identity'
+        return session
+
+
 ##
 # --- Auth ---
 ##
@@ -45,8 +184,55 @@ class Grant:
     domain: str = None
     token: str = None
 
-    def get_api(self) -> 'API':
-        return API(self)
+    def get_api(
+        self,
+        options: ConnectionOptions = None,
+        cache: Union[bool, 'ResponseCache'] = None,
+        tracer: 'Tracer' = None,
+        latency: Union[bool, 'LatencyPolicy'] = None,
+        token_cache: Union[bool, str, 'TokenCache'] = None,
+        single_flight: Union[bool, 'SingleFlight'] = None,
+        concurrency: Union[bool, 'ConcurrencyController'] = None,
+        metrics: 'MetricsRegistry' = None,
+        hooks: Union['Hooks', Callable[['CallTiming'], Any]] = None,
+        **kwargs
+    ) -> 'API':
+        # kwargs are ConnectionOptions fields, ie get_api(pool_maxsize=32, read_timeout=60)
+        # cache=True enables a ResponseCache with the default TTLs, latency=True
+        # adaptive read timeouts (LatencyPolicy(hedge=True) to also hedge reads),
+        # token_cache=True reuses tokens across processes, single_flight=True
+        # coalesces identical concurrent reads, concurrency=True adapts the calls
+        # in flight per endpoint to the server's health. Pass the same metrics
+        # registry to several APIs to pool their numbers. hooks=Profiler() breaks
+        # the time of every call down into phases.
+        if options is None:
+            options = ConnectionOptions(**kwargs)
+        return API(
+            self, options, cache=cache, tracer=tracer, latency=latency,
+            token_cache=token_cache, single_flight=single_flight, concurrency=concurrency,
+            metrics=metrics, hooks=hooks)
+
+    async def get_async_api(
+        self,
+        options: ConnectionOptions = None,
+        max_concurrency: int = 100,
+        cache: Union[bool, 'ResponseCache'] = None,
+        tracer: 'Tracer' = None,
+        latency: Union[bool, 'LatencyPolicy'] = None,
+        token_cache: Union[bool, str, 'TokenCache'] = None,
+        single_flight: Union[bool, 'SingleFlight'] = None,
+        concurrency: Union[bool, 'ConcurrencyController'] = None,
+        metrics: 'MetricsRegistry' = None,
+        hooks: Union['Hooks', Callable[['CallTiming'], Any]] = None,
+        **kwargs
+    ) -> 'AsyncAPI':
+        from .async_api import AsyncAPI
+        if options is None:
+            options = ConnectionOptions(**kwargs)
+        return await AsyncAPI.create(
+            self, options, max_concurrency, cache=cache, tracer=tracer, latency=latency,
+            token_cache=token_cache, single_flight=single_flight, concurrency=concurrency,
+            metrics=metrics, hooks=hooks)
 
 
 class PasswordGrant(Grant):
@@ -74,6 +260,66 @@ class APIException(Exception):
     pass
 
 
+AUTH_FAILURE_STATUSES = (401, 403)
+
+
+def _auth_failure(err: HTTPError) -> bool:
+    return getattr(err.response, 'status_code', None) in AUTH_FAILURE_STATUSES
+
+
+##
+# --- Response Decoders ---
+##
+
+def _data(res: Dict) -> Any:
+    return res['data']
+
+
+@lru_cache(maxsize=None)
+def _one(class_: type) -> Callable[[Dict], Any]:
+    item = decoder(class_)
+
+    def decode(res: Dict):
+        return item(res['data'])
+    return decode
+
+
+@lru_cache(maxsize=None)
+def _many(class_: type) -> Callable[[Dict], List[Any]]:
+    item = decoder(class_)
+
+    def decode(res: Dict):
+        return list(map(item, res['data']))
+    return decode
+
+
+def _sent_bytes(payload: Any, size: Optional[int]) -> int:
+    # request bytes on the wire once `payload` (see API._body) has been sent
+    if isinstance(payload, bytes):
+        return len(payload)
+    if isinstance(payload, GzipStream):
+        return payload.size
+    return size or 0
+
+
+def _parse(parse: Callable[..., List[Any]], *chunk: bytes) -> List[Any]:
+    # a JsonArrayParser step of a streamed response, timed as its parse phase
+    start = time.perf_counter()
+    values = parse(*chunk)
+    record_phase('parse', start)
+    return values
+
+
+def _decode(decoder: Callable[[Any], Any], res: Any) -> Any:
+    start = time.perf_counter()
+    value = decoder(res)
+    record_phase('decode', start)
+    return value
+
+
+_NO_HOOKS = nullcontext()
+
+
 ##
 # --- API ---
 ##
@@ -84,51 +330,440 @@ class API:
     token: str = None
     debug: bool = False
     called_endpoints = None
-
-    def __init__(self, credential: Grant):
+    options: ConnectionOptions = None
+    session: requests.Session = None
+    cache: ResponseCache = None
+    tracer: Tracer = None
+    latency: LatencyPolicy = None
+    token_cache: TokenCache = None
+    single_flight: SingleFlight = None
+    concurrency: ConcurrencyController = None
+    metrics: MetricsRegistry = None
+    hooks: Hooks = None
+
+    def __init__(
+        self,
+        credential: Grant,
+        options: ConnectionOptions = None,
+        cache: Union[bool, ResponseCache] = None,
+        tracer: Tracer = None,
+        latency: Union[bool, LatencyPolicy] = None,
+        token_cache: Union[bool, str, TokenCache] = None,
+        single_flight: Union[bool, SingleFlight] = None,
+        concurrency: Union[bool, ConcurrencyController] = None,
+        metrics: MetricsRegistry = None,
+        hooks: Union[Hooks, Callable[[CallTiming], Any]] = None
+    ):
         if LOG.getEffectiveLevel() is logging.DEBUG:
             self.called_endpoints = set()
             LOG.warn('LogLevel is Debug! API will log ALL requests and responses!')
             LOG.warn('Unless you are debugging you do not want this!')
-        if isinstance(credential, PasswordGrant):
+        self.options = options or ConnectionOptions()
+        self._owns_session = self.options.session is None
+        self.session = self.options.session or self.options.build_session()
+        self.cache = as_cache(cache)
+        self.tracer = tracer
+        self.latency = as_latency_policy(latency)
+        self._hedge_pool = None
+        self.token_cache = as_token_cache(token_cache)
+        self.single_flight = as_single_flight(single_flight)
+        self.concurrency = as_concurrency_controller(concurrency)
+        self.metrics = as_metrics(metrics)
+        self.hooks = as_hooks(hooks)
+        self._credential = credential
+        self._auth_lock = threading.Lock()
+        self.domain = credential.domain
+        if self.options.warm_up and self.domain:
+            self.warm_up(self.options.warm_up)
+        cached = self._cached_token(credential)
+        if cached is not None:
+            self.token = cached
+        elif isinstance(credential, PasswordGrant):
             self.authenticate(credential)
         elif isinstance(credential, TokenGrant):
             self.validate_grant(credential)
 
+    def __enter__(self) -> 'API':
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        # a shared session belongs to whoever passed it in
+        if self._owns_session:
+            self.session.close()
+        if self._hedge_pool is not None:
+            self._hedge_pool.shutdown(wait=False)
+            self._hedge_pool = None
+
+    def warm_up(self, connections: int = 1) -> int:
+        # Opens up to `connections` keep-alive sockets concurrently so they sit in the
+        # pool before the first real call. Returns how many succeeded.
+        def _open(_):
+            try:
+                self.session.head(
+                    self.domain,
+                    allow_redirects=False,
+                    timeout=self.options.timeout
+                )
+                return True
+            except RequestException as err:
+                LOG.debug(f'warm up failed: {err}')
+                return False
+        with ThreadPoolExecutor(max_workers=connections) as pool:
+            return sum(pool.map(_open, range(connections)))
+
     def _call_api(self, endpoint: str, data: Any, method: str = 'POST'):
+        with self._lifecycle(endpoint, data):
+            try:
+                return self._cached(endpoint, data, method)
+            except HTTPError as err:
+                stale = self._stale_token(endpoint, data, err)
+                if stale is None:
+                    raise
+            with self._auth_lock:
+                # threads that failed on the same token log in only once
+                if self.token == stale:
+                    self.authenticate(self._credential)
+            return self._cached(endpoint, {**data, 'auth': self.token}, method)
+
+    def _lifecycle(self, endpoint: str, data: Any):
+        # before / after hooks and phase timings of one call, see hooks.py
+        return _NO_HOOKS if self.hooks is None else self.hooks.call(endpoint, data)
+
+    def _encode(self, obj: Any, drop_nulls: bool = True) -> Dict[str, Any]:
+        # timed as the call's encode phase only for APIs with hooks
+        if self.hooks is None:
+            return encode(obj, drop_nulls)
+        return timed_encode(obj, drop_nulls)
+
+    def _cached_token(self, credential: Grant) -> Optional[str]:
+        if self.token_cache is None:
+            return None
+        return self.token_cache.get(credential)
+
+    def _stale_token(self, endpoint: str, data: Any, err: HTTPError) -> Optional[str]:
+        # With a token cache, the token a call was rejected with when logging in
+        # again and resending the call may help, None otherwise.
+        if self.token_cache is None or endpoint == AUTHENTICATE_USER or not _auth_failure(err):
+            return None
+        document = data.document if isinstance(data, StreamingJsonBody) else data
+        stale = document.get('auth') if isinstance(document, dict) else None
+        if stale is None:
+            return None
+        self.token_cache.discard(self._credential, stale)
+        # streamed bodies cannot be sent twice
+        if not isinstance(self._credential, PasswordGrant) or document is not data:
+            return None
+        return stale
+
+    def _cached(self, endpoint: str, data: Any, method: str = 'POST'):
+        if self.cache is None:
+            return self._send(endpoint, data, method)
+        if not self.cache.cacheable(endpoint):
+            try:
+                return self._send(endpoint, data, method)
+            finally:
+                self.cache.on_write(endpoint)
+        key = request_key(endpoint, data)
+        hit, value = self.cache.get(key)
+        if hit:
+            return value
+        value = self._send(endpoint, data, method)
+        self.cache.put(key, value)
+        return value
+
+    def _send(self, endpoint: str, data: Any, method: str = 'POST'):
+        # concurrency limit between the cache and the transport
+        if self.concurrency is None:
+            return self._dispatch(endpoint, data, method)
+        waiting = time.perf_counter()
+        with self.concurrency.slot(endpoint):
+            record_phase('queue', waiting)
+            return self._dispatch(endpoint, data, method)
+
+    def _dispatch(self, endpoint: str, data: Any, method: str = 'POST'):
+        # adaptive timeouts and hedging
+        if self.latency is None:
+            return self._request(endpoint, data, method)
+        timeout = self.latency.timeout(endpoint, self.options.timeout)
+        delay = self.latency.hedge_delay(endpoint)
+        if delay is None:
+            return self._timed(endpoint, data, method, timeout)
+        if self._hedge_pool is None:
+            self._hedge_pool = ThreadPoolExecutor(
+                max_workers=2 * self.options.pool_maxsize,
+                thread_name_prefix='pyramid-hedge'
+            )
+        # the copies run in the caller's context to add to its phase timings
+        primary = self._hedge_pool.submit(
+            copy_context().run, self._timed, endpoint, data, method, timeout)
+        if wait([primary], timeout=delay).done:
+            return primary.result()
+        self.latency.hedged(endpoint)
+        backup = self._hedge_pool.submit(
+            copy_context().run, self._timed, endpoint, data, method, timeout)
+        done, pending = wait([primary, backup], return_when=FIRST_COMPLETED)
+        first = done.pop()
+        if first.exception() is not None and pending:
+            # the other copy may still succeed
+            first = pending.pop()
+        if first is backup and backup.exception() is None:
+            self.latency.hedge_won(endpoint)
+        # the losing request runs to completion in the background
+        return first.result()
+
+    def _timed(self, endpoint: str, data: Any, method: str, timeout: Any):
+        start = time.perf_counter()
+        try:
+            value = self._request(endpoint, data, method, timeout)
+        except Timeout:
+            self.latency.timed_out(endpoint, timeout)
+            raise
+        self.latency.observe(endpoint, time.perf_counter() - start)
+        return value
+
+    def _request(self, endpoint: str, data: Any, method: str = 'POST', timeout: Any = None):
         if self.called_endpoints != None:
             self.called_endpoints.add(endpoint)
-        res = requests.request(
-            method=method,
-            url=f'{self.domain}{endpoint}',
-            json=data
-        )
+        start = time.perf_counter()
+        payload, headers, size = self._body(data)
+        sending = time.perf_counter()
+        record_phase('serialize', start)
+        try:
+            res = self.session.request(
+                method=method,
+                url=f'{self.domain}{endpoint}',
+                timeout=timeout or self.options.timeout,
+                data=payload,
+                headers=headers
+            )
+        except RequestException as err:
+            self.metrics.observe(endpoint, time.perf_counter() - start, error=err)
+            raise
+        finally:
+            record_phase('network', sending)
+        received = len(res.content)
+        self.metrics.transferred(
+            endpoint, size or 0, received, _sent_bytes(payload, size), wire_bytes(res, received))
         LOG.debug(f'{endpoint}')
-        LOG.debug(json.dumps(data, indent=2))
+        LOG.debug('%s', LazyJson(data))
         try:
             res.raise_for_status()
         except HTTPError as her:
             LOG.error(her)
             LOG.error(f'error content: {res.text}')
+            self._trace(endpoint, method, res.status_code, start, data, res.text, her)
             raise her
         LOG.debug(f'status -> {res.status_code}')
+        parsing = time.perf_counter()
         try:
             _json = res.json()
-            if 'error' in _json:
-                raise APIException(f'Unexpected error returned from server: {_json.get("error")}')
-            LOG.debug(json.dumps(_json, indent=2))
-            return _json
         except JSONDecodeError:
-            LOG.debug(res.text)
+            LOG.debug('%s', LazyJson(res.text))
+            self._trace(endpoint, method, res.status_code, start, data, res.text)
             return res.text
+        finally:
+            record_phase('parse', parsing)
+        return self._check_json(endpoint, method, res.status_code, start, data, _json)
+
+    def _body(self, data: Any) -> Tuple[Any, Dict[str, str], Optional[int]]:
+        # The body to send, its headers and its size as JSON (None if unknown).
+        # Serialized here rather than through json= to time it apart from the network.
+        headers = {'Content-Type': 'application/json'}
+        if isinstance(data, StreamingJsonBody):
+            payload, size = data, data.len
+        else:
+            payload = json.dumps(data, allow_nan=False).encode('utf-8')
+            size = len(payload)
+        options = self.options
+        if not options.compress_requests or not should_compress(size, options.compress_threshold):
+            return payload, headers, size
+        headers['Content-Encoding'] = GZIP
+        if isinstance(payload, bytes):
+            return compress(payload, options.compress_level), headers, size
+        return GzipStream(payload, options.compress_level), headers, size
+
+    def _check_json(
+        self,
+        endpoint: str,
+        method: str,
+        status: int,
+        start: float,
+        data: Any,
+        _json: Any
+    ) -> Any:
+        if 'error' in _json:
+            err = APIException(f'Unexpected error returned from server: {_json.get("error")}')
+            self._trace(endpoint, method, status, start, data, _json, err)
+            raise err
+        LOG.debug('%s', LazyJson(_json))
+        self._trace(endpoint, method, status, start, data, _json)
+        return _json
+
+    def _trace(
+        self,
+        endpoint: str,
+        method: str,
+        status: int,
+        start: float,
+        data: Any,
+        response: Any,
+        error: BaseException = None
+    ):
+        # every answered call ends here, calls without a response are observed in _request
+        elapsed = time.perf_counter() - start
+        self.metrics.observe(endpoint, elapsed, status, error)
+        if self.tracer is not None:
+            if isinstance(data, StreamingJsonBody):
+                data = data.document
+            self.tracer.record(endpoint, method, status, elapsed, data, response, error)
+
+    def _call_expect(self, ep: str, data: Any, decoder: Callable[[Any], Any]) -> Any:
+        # every typed endpoint goes through here so AsyncAPI only has to override
+        # the transport, not each method. Reads are coalesced here rather than in
+        # _call_api so that concurrent callers also share the decoded result.
+        with self._lifecycle(ep, data):
+            if self.single_flight is None or ep not in READ_ENDPOINTS:
+                return _decode(decoder, self._call_api(ep, data))
+            return self.single_flight.do(
+                ep, (request_key(ep, data), decoder), lambda: _decode(decoder, self._call_api(ep, data)))
 
     def _call_expect_modified(self, ep: str, data: Any) -> ModifiedItemsResult: 
-        res = self._call_api(ep, data)
-        return ModifiedItemsResult(**res['data'])
+        return self._call_expect(ep, data, _one(ModifiedItemsResult))
 
     def _call_expect_query_res(self, ep: str, data: Any) -> List[MaterializedItemObject]:
-        res = self._call_api(ep, data)
-        return [MaterializedItemObject(**i) for i in res['data']]
+        return self._call_expect(ep, data, _many(MaterializedItemObject))
+
+    def _call_expect_many(
+        self,
+        ep: str,
+        data: Any,
+        class_: type,
+        columnar: bool = False,
+        stream: bool = False
+    ) -> Union[List[Any], Table, Iterator[Any]]:
+        # stream=True yields the items while the response is read, see _stream.
+        # columnar=True streams too, into a columnar.Table.
+        if stream and columnar:
+            raise ValueError('stream and columnar cannot be combined')
+        if columnar:
+            return self._stream_table(ep, data, class_)
+        if stream:
+            return self._stream(ep, data, decoder(class_))
+        return self._call_expect(ep, data, _many(class_))
+
+    def _stream_table(self, endpoint: str, data: Any, class_: type) -> Table:
+        # every item goes into per-field columns as it is parsed (its decode phase),
+        # the `data` array is never held as dicts
+        builder = TableBuilder(class_)
+        for _ in self._stream(endpoint, data, builder.add):
+            pass
+        return builder.table()
+
+    def _stream(self, endpoint: str, data: Any, item: Callable[[Dict], Any]) -> Iterator[Any]:
+        # Sends the request on the first next() and decodes the `data` array one
+        # item at a time as chunks arrive. Bypasses the cache, single flight,
+        # hedging and token refresh: the items are neither kept nor replayable.
+        items = self._stream_items(endpoint, data, item)
+        return items if self.hooks is None else self.hooks.stream(endpoint, data, items)
+
+    def _stream_items(
+        self,
+        endpoint: str,
+        data: Any,
+        item: Callable[[Dict], Any]
+    ) -> Iterator[Any]:
+        if self.called_endpoints != None:
+            self.called_endpoints.add(endpoint)
+        start = time.perf_counter()
+        payload, headers, size = self._body(data)
+        sending = time.perf_counter()
+        record_phase('serialize', start)
+        try:
+            res = self.session.request(
+                method='POST',
+                url=f'{self.domain}{endpoint}',
+                timeout=self.options.timeout,
+                data=payload,
+                headers=headers,
+                stream=True
+            )
+        except RequestException as err:
+            self.metrics.observe(endpoint, time.perf_counter() - start, error=err)
+            raise
+        finally:
+            record_phase('network', sending)
+        received = 0
+        try:
+            try:
+                res.raise_for_status()
+            except HTTPError as her:
+                received = len(res.content)
+                LOG.error(her)
+                LOG.error(f'error content: {res.text}')
+                self._trace(endpoint, 'POST', res.status_code, start, data, res.text, her)
+                raise her
+            parser = JsonArrayParser()
+            chunks = res.iter_content(RESPONSE_CHUNK_SIZE)
+            while 'error' not in parser.fields:
+                reading = time.perf_counter()
+                chunk = next(chunks, None)
+                record_phase('network', reading)
+                if chunk is None:
+                    break
+                received += len(chunk)
+                for value in _parse(parser.feed, chunk):
+                    yield _decode(item, value)
+            if 'error' not in parser.fields:
+                for value in _parse(parser.close):
+                    yield _decode(item, value)
+            # raises on an error payload, traces the call otherwise
+            self._check_json(
+                endpoint, 'POST', res.status_code, start, data,
+                {**parser.fields, 'data': f'<{parser.items} items streamed>'})
+        finally:
+            res.close()
+            self.metrics.transferred(
+                endpoint, size or 0, received, _sent_bytes(payload, size), wire_bytes(res, received))
+    ##
+    # --- Bulk ---
+    ##
+
+    def bulk(
+        self,
+        method: Union[str, Callable],
+        args: Iterable[Any],
+        workers: int = DEFAULT_WORKERS,
+        ordered: bool = True
+    ) -> Iterator[BulkResult]:
+        # Calls `method` (an API method or its name) once per item of `args` on a
+        # bounded thread pool, ie api.bulk(api.createUserDb, users, workers=16).
+        # Yields a BulkResult per item in input order, or completion order when
+        # ordered=False; a failing item never aborts the batch.
+        fn = getattr(self, method) if isinstance(method, str) else method
+        if workers > self.options.pool_maxsize:
+            LOG.warning(
+                f'bulk workers ({workers}) exceed pool_maxsize ({self.options.pool_maxsize}),'
+                ' extra connections will not be kept alive')
+        return run_bulk(fn, args, workers, ordered)
+
+    def map(
+        self,
+        method: Union[str, Callable],
+        args: Iterable[Any],
+        workers: int = DEFAULT_WORKERS,
+        ordered: bool = True,
+        return_exceptions: bool = False
+    ) -> Iterator[Any]:
+        # Like bulk but yields the values. Raises the first failure unless
+        # return_exceptions, in which case the exception is yielded in its place.
+        for res in self.bulk(method, args, workers, ordered):
+            if res.error is not None and not return_exceptions:
+                raise res.error
+            yield res.value if res.ok else res.error
+
     ##
     # --- Utils ---
     ##
@@ -137,22 +772,29 @@ class API:
     def __ignore_self(self, locals: Dict):
         return {k:v for k, v in locals.items() if k != 'self'}
 
-    def __ignore_nulls(self, d: Dict):
-        return {k: v for k, v in d.items() if v != None}
-
     ##
     # --- Access ---
     ##
 
     def getUsersByName(self, userName) -> List[User]:
-        res = self._call_api(
+        return self._call_expect(
             '/API2/access/getUsersByName',
             {
                 'auth': self.token,
                 'userName': userName
-            }
+            },
+            _many(User)
+        )
+
+    def getRolesByName(self, roleName: str) -> List[Role]:
+        return self._call_expect(
+            '/API2/access/getRolesByName',
+            {
+                'auth': self.token,
+                'roleName': roleName
+            },
+            _many(Role)
         )
-        return [User(**i) for i in res['data']]
 
     ##
     # --- Auth ---
@@ -172,6 +814,8 @@ class API:
             )
         except HTTPError as err:
             raise APIException('Invalid Credentials') from err
+        if self.token_cache is not None:
+            self.token_cache.put(credential, self.token)
 
     def validate_grant(self, credential: TokenGrant):
         self.domain = credential.domain
@@ -180,31 +824,33 @@ class API:
             self.getMe()
         except HTTPError as err:
             raise APIException('Invalid Token') from err
+        if self.token_cache is not None:
+            self.token_cache.put(credential, self.token)
 
     ##
     # --- Identity ---
     ##
 
     def getMe(self) -> User: # user_id
-        res = self._call_api(
+        return self._call_expect(
             '/API2/access/getMe',
             {
                 'auth': self.token
-            })
-        return User(**res['data'])
+            },
+            _one(User))
 
     ##
     # --- Notifications ---
     ##
 
     def getNotificationIndicators(self, user_id: str) -> NotificationIndicatorsResult:
-        res = self._call_api(
+        return self._call_expect(
             '/API2/notification/getNotificationIndicators',
             {
                 'auth': self.token,
                 'userId': user_id
-            })
-        return NotificationIndicatorsResult(**res['data'])
+            },
+            _one(NotificationIndicatorsResult))
 
     ##
     # --- Content ---
@@ -214,47 +860,52 @@ class API:
         return self._call_expect_modified(
             '/API2/content/createNewFolder', {
                 'auth': self.token,
-                'folderTenantObject': self.__ignore_nulls(asdict(new_folder))
+                'folderTenantObject': self._encode(new_folder)
             }
         )
 
 
-    def findContentItem(self, params: SearchParams) -> List[ContentItem]:
-        res = self._call_api(
+    def findContentItem(
+        self,
+        params: SearchParams,
+        columnar: bool = False,
+        stream: bool = False
+    ) -> Union[List[ContentItem], Table, Iterator[ContentItem]]:
+        return self._call_expect_many(
             '/API2/content/findContentItem',
             {
                 'auth': self.token,
-                'searchParams': self.__ignore_nulls(asdict(params))
-            })
-        return [ContentItem(**i) for i in res['data']]
+                'searchParams': self._encode(params)
+            },
+            ContentItem, columnar, stream)
         
 
     def getUserPublicRootFolder(self, user_id: str) -> ContentItem:
-        res = self._call_api(
+        return self._call_expect(
             '/API2/content/getUserPublicRootFolder',
             {
                 'auth': self.token,
                 'userId': user_id
-            })
-        return ContentItem(**res['data'])
+            },
+            _one(ContentItem))
 
     def getPrivateRootFolder(self, user_id: str) -> ContentItem:
-        res = self._call_api(
+        return self._call_expect(
             '/API2/content/getPrivateRootFolder',
             {
                 'auth': self.token,
                 'userId': user_id
-            })
-        return ContentItem(**res['data'])
+            },
+            _one(ContentItem))
 
     def getPrivateFolderForUser(self, user_id: str) -> ContentItem:
-        res = self._call_api(
+        return self._call_expect(
             '/API2/content/getPrivateFolderForUser',
             {
                 'auth': self.token,
                 'userId': user_id
-            })
-        return ContentItem(**res['data'])
+            },
+            _one(ContentItem))
 
     def getPublicOrGroupFolderByTenantId(
         self,
@@ -262,7 +913,7 @@ class API:
         rootFolderType: ValidRootFolderType = ValidRootFolderType.public
     ) -> ContentItem:
 
-        res = self._call_api(
+        return self._call_expect(
             '/API2/content/getPublicOrGroupFolderByTenantId',
             {
                 'auth': self.token,
@@ -270,37 +921,49 @@ class API:
                     'validRootFolderType': rootFolderType,
                     'tenantId': tenantId
                 }
-            })
-        return ContentItem(**res['data'])
+            },
+            _one(ContentItem))
 
     def getUserGroupRootFolder(self, user_id: str) -> ContentItem:
-        res = self._call_api(
+        return self._call_expect(
             '/API2/content/getUserGroupRootFolder',
             {
                 'auth': self.token,
                 'userId': user_id
-            })
-        return ContentItem(**res['data'])
+            },
+            _one(ContentItem))
 
-    def getFolderItems(self, user_id: str, folder_id) -> List[ContentItem]:
-        res = self._call_api(
+    def getFolderItems(
+        self,
+        user_id: str,
+        folder_id,
+        columnar: bool = False,
+        stream: bool = False
+    ) -> Union[List[ContentItem], Table, Iterator[ContentItem]]:
+        return self._call_expect_many(
             '/API2/content/getFolderItems',
             {
                 'auth': self.token,
                 'userId': user_id,
                 'folderId': folder_id
-        })
-        return [ContentItem(**i) for i in res['data']]
+        },
+        ContentItem, columnar, stream)
 
     
     def importContent(self, obj: PieApiObject) -> ImportApiResultObject:
-        res = self._call_api(
-            '/API2/content/importContent', {
-                'auth': self.token,
-                'pieApiObject': self.__ignore_nulls(asdict(obj))
-            }
+        # fileZippedData may be a PieFile to stream the upload from disk, encode
+        # does not copy it
+        body = {
+            'auth': self.token,
+            'pieApiObject': self._encode(obj)
+        }
+        if isinstance(obj.fileZippedData, PieFile):
+            body = StreamingJsonBody(body)
+        return self._call_expect(
+            '/API2/content/importContent',
+            body,
+            _one(ImportApiResultObject)
         )
-        return ImportApiResultObject(**res['data'])
 
     ##
     # --- Management ---
@@ -317,18 +980,18 @@ class API:
             '/API2/access/createTenant',
             {
                 'auth': self.token,
-                'tenant': asdict(tenant)
+                'tenant': self._encode(tenant, drop_nulls=False)
         })
 
 
     def getTenantByName(self, name: str) -> TenantData:
-        res = self._call_api(
+        return self._call_expect(
             '/API2/access/getTenantByName',
             {
                 'auth': self.token,
                 'tenantName': name
-        })
-        return TenantData(**res['data'])
+        },
+        _one(TenantData))
 
     def deleteTenants(
         self,
@@ -358,7 +1021,7 @@ class API:
             '/API2/access/createRole',
             {
                 'auth': self.token,
-                'roleData': asdict(role)
+                'roleData': self._encode(role, drop_nulls=False)
             }
         )
 
@@ -370,7 +1033,7 @@ class API:
             '/API2/access/createUserDb',
             {
                 'auth': self.token,
-                'user': self.__ignore_nulls(asdict(user))
+                'user': self._encode(user)
         })
 
 
@@ -380,7 +1043,7 @@ class API:
             '/API2/dataSources/createDataServer',
             {
                 'auth': self.token,
-                'serverData': self.__ignore_nulls(asdict(server))
+                'serverData': self._encode(server)
         })
 
     def addRoleToServer(self, server_id: str, role_id: str, access_type: AccessType) -> ModifiedItemsResult:
@@ -470,23 +1133,32 @@ class API:
         })
 
     
-    def getDataSourcesByTenant(self, tenantId: str) -> List[MaterializedItemObject]:
-        res = self._call_api(
+    def getDataSourcesByTenant(
+        self,
+        tenantId: str,
+        columnar: bool = False,
+        stream: bool = False
+    ) -> Union[List[MaterializedItemObject], Table, Iterator[MaterializedItemObject]]:
+        return self._call_expect_many(
             '/API2/dataSources/getDataSourcesByTenant',
             {
                 'auth': self.token,
                 'tenantId': tenantId
-        })
-        return [MaterializedItemObject(**i) for i in res['data']]
+        },
+        MaterializedItemObject, columnar, stream)
     
 
-    def getAllConnectionStrings(self) -> List[ConnectionStringProperties]:
-        res = self._call_api(
+    def getAllConnectionStrings(
+        self,
+        columnar: bool = False,
+        stream: bool = False
+    ) -> Union[List[ConnectionStringProperties], Table, Iterator[ConnectionStringProperties]]:
+        return self._call_expect_many(
             '/API2/dataSources/getAllConnectionStrings',
             {
                 'auth': self.token
-        })
-        return [ConnectionStringProperties(**i) for i in res['data']]
+        },
+        ConnectionStringProperties, columnar, stream)
     
     def getItemConnectionString(
         self,
@@ -494,7 +1166,7 @@ class API:
         itemType: ContentItemObjectType,
     ) -> List[ConnectionStringProperties]:
 
-        res = self._call_api(
+        return self._call_expect(
             '/API2/dataSources/getItemConnectionString',
             {
                 'auth': self.token,
@@ -502,8 +1174,8 @@ class API:
                     'itemId': itemId,
                     'itemTypeObject': itemType
                 }
-        })
-        return [ConnectionStringProperties(**i) for i in res['data']]
+        },
+        _many(ConnectionStringProperties))
 
 
     def findServerByName(self, name: str, query_type: SearchMatchType = 1
@@ -534,14 +1206,17 @@ class API:
         }
         if roleAssignmentType != 2:
             del body['rolesIds']
-
-        res = self._call_api(
-            '/API2/dataSources/importModel', {
-                'modelApiObject': body,
-                'auth': self.token
-            }
+        body = {
+            'modelApiObject': body,
+            'auth': self.token
+        }
+        if isinstance(pieObj, PieFile):
+            body = StreamingJsonBody(body)
+        return self._call_expect(
+            '/API2/dataSources/importModel',
+            body,
+            _data
         )
-        return res['data']
 
 
     def recognizeDataBase(self, server_id: str, db_name: str) -> ModifiedItemsResult:
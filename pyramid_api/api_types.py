@@ -181,6 +181,15 @@ class ItemId(DataClassJsonMixin):
     id: str
     name: str = None
 
+    # modifiedList used to hold plain dicts, keep `item.get('id')` working
+    def get(self, key: str, default: Any = None) -> Any:
+        return getattr(self, key) if key in ('id', 'name') else default
+
+    def __getitem__(self, key: str) -> Any:
+        if key not in ('id', 'name'):
+            raise KeyError(key)
+        return getattr(self, key)
+
 
 @dataclass
 class Role(DataClassJsonMixin):
@@ -0,0 +1,569 @@
+import asyncio
+from collections import deque
+import json
+from json.decoder import JSONDecodeError
+import logging
+import time
+from typing import (
+    Any,
+    AsyncIterator,
+    Callable,
+    Dict,
+    Iterable,
+    Optional,
+    Tuple,
+    Union
+)
+
+from requests import Response
+from requests.exceptions import HTTPError
+
+try:
+    import aiohttp
+except ImportError:  # optional, only needed for AsyncAPI
+    aiohttp = None
+
+from .api import (
+    API,
+    APIException,
+    ConnectionOptions,
+    Grant,
+    PasswordGrant,
+    TokenGrant,
+    _decode,
+    _parse
+)
+from .bulk import (
+    BulkResult,
+    _invoke
+)
+from .cache import (
+    ResponseCache,
+    as_cache,
+    request_key
+)
+from .latency import (
+    LatencyPolicy,
+    as_latency_policy
+)
+from .token_cache import (
+    TokenCache,
+    as_token_cache
+)
+from .columnar import (
+    Table,
+    TableBuilder
+)
+from .compression import (
+    GZIP,
+    GzipStream,
+    compress,
+    should_compress
+)
+from .concurrency import (
+    ConcurrencyController,
+    as_concurrency_controller
+)
+from .endpoints import READ_ENDPOINTS
+from .hooks import (
+    CallTiming,
+    Hooks,
+    as_hooks,
+    record_phase
+)
+from .metrics import (
+    MetricsRegistry,
+    as_metrics
+)
+from .singleflight import (
+    SingleFlight,
+    as_single_flight
+)
+from .streaming import (
+    RESPONSE_CHUNK_SIZE,
+    JsonArrayParser,
+    StreamingJsonBody
+)
+from .tracing import (
+    LazyJson,
+    Tracer
+)
+
+LOG = logging.getLogger(__name__)
+
+DEFAULT_MAX_CONCURRENCY = 100  # keep in step with Grant.get_async_api
+
+
+async def _read_async(body: Iterable[bytes]) -> AsyncIterator[bytes]:
+    # file reads (and compression) happen off the event loop
+    loop = asyncio.get_running_loop()
+    chunks = iter(body)
+    while True:
+        chunk = await loop.run_in_executor(None, next, chunks, None)
+        if chunk is None:
+            return
+        yield chunk
+
+
+class _AsyncBody:
+    # a streamed request body, iterated off the event loop by aiohttp; keeps the
+    # body around to read GzipStream.size once sent
+
+    def __init__(self, body: Iterable[bytes]):
+        self.body = body
+
+    def __aiter__(self) -> AsyncIterator[bytes]:
+        return _read_async(self.body)
+
+
+def _sent_bytes(payload: Any, size: Optional[int]) -> int:
+    if isinstance(payload, bytes):
+        return len(payload)
+    if isinstance(payload, _AsyncBody) and isinstance(payload.body, GzipStream):
+        return payload.body.size
+    return size or 0
+
+
+class AsyncAPI(API):
+    # Same method surface as API, but every endpoint method returns an awaitable
+    # (stream=True list methods an async iterator) and all calls share one aiohttp
+    # session. In flight requests are capped by a semaphore of `max_concurrency`.
+    #
+    #   api = await PasswordGrant(domain, user, pw).get_async_api(max_concurrency=200)
+    #   folders = await asyncio.gather(*[api.getFolderItems(uid, f) for f in ids])
+
+    def __init__(
+        self,
+        credential: Grant,
+        options: ConnectionOptions = None,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+        client_session: 'aiohttp.ClientSession' = None,
+        cache: Union[bool, ResponseCache] = None,
+        tracer: Tracer = None,
+        latency: Union[bool, LatencyPolicy] = None,
+        token_cache: Union[bool, str, TokenCache] = None,
+        single_flight: Union[bool, SingleFlight] = None,
+        concurrency: Union[bool, ConcurrencyController] = None,
+        metrics: MetricsRegistry = None,
+        hooks: Union[Hooks, Callable[[CallTiming], Any]] = None
+    ):
+        if aiohttp is None:
+            raise ImportError('AsyncAPI requires aiohttp, `pip install aiohttp`')
+        if LOG.getEffectiveLevel() is logging.DEBUG:
+            self.called_endpoints = set()
+        self.options = options or ConnectionOptions()
+        self.domain = credential.domain
+        self.max_concurrency = max_concurrency
+        self.session = client_session
+        self._owns_session = client_session is None
+        self._semaphore = None
+        self.cache = as_cache(cache)
+        self.tracer = tracer
+        self.latency = as_latency_policy(latency)
+        self.token_cache = as_token_cache(token_cache)
+        self.single_flight = as_single_flight(single_flight)
+        self.concurrency = as_concurrency_controller(concurrency)
+        self.metrics = as_metrics(metrics)
+        self.hooks = as_hooks(hooks)
+        self._credential = credential
+        self._auth_lock = None
+
+    @classmethod
+    async def create(
+        cls,
+        credential: Grant,
+        options: ConnectionOptions = None,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+        client_session: 'aiohttp.ClientSession' = None,
+        cache: Union[bool, ResponseCache] = None,
+        tracer: Tracer = None,
+        latency: Union[bool, LatencyPolicy] = None,
+        token_cache: Union[bool, str, TokenCache] = None,
+        single_flight: Union[bool, SingleFlight] = None,
+        concurrency: Union[bool, ConcurrencyController] = None,
+        metrics: MetricsRegistry = None,
+        hooks: Union[Hooks, Callable[[CallTiming], Any]] = None
+    ) -> 'AsyncAPI':
+        api = cls(
+            credential, options, max_concurrency, client_session, cache=cache, tracer=tracer,
+            latency=latency, token_cache=token_cache, single_flight=single_flight,
+            concurrency=concurrency, metrics=metrics, hooks=hooks)
+        try:
+            if api.options.warm_up and api.domain:
+                await api.warm_up(api.options.warm_up)
+            cached = api._cached_token(credential)
+            if cached is not None:
+                api.token = cached
+            elif isinstance(credential, PasswordGrant):
+                await api.authenticate(credential)
+            elif isinstance(credential, TokenGrant):
+                await api.validate_grant(credential)
+        except BaseException:
+            await api.close()
+            raise
+        return api
+
+    async def __aenter__(self) -> 'AsyncAPI':
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    def __enter__(self):
+        raise TypeError('use `async with` on AsyncAPI')
+
+    async def close(self):
+        if self._owns_session and self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    def _get_session(self) -> 'aiohttp.ClientSession':
+        # created lazily so that they belong to the running loop
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._auth_lock = asyncio.Lock()
+        if self.session is None:
+            self.session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.max_concurrency),
+                timeout=aiohttp.ClientTimeout(
+                    sock_connect=self.options.connect_timeout,
+                    sock_read=self.options.read_timeout
+                ),
+                headers={'Accept-Encoding': self.options.accept_encoding or 'identity'}
+            )
+        return self.session
+
+    async def warm_up(self, connections: int = 1) -> int:
+        session = self._get_session()
+
+        async def _open():
+            try:
+                async with session.head(self.domain, allow_redirects=False):
+                    return True
+            except aiohttp.ClientError as err:
+                LOG.debug(f'warm up failed: {err}')
+                return False
+        return sum(await asyncio.gather(*[_open() for _ in range(connections)]))
+
+    async def _call_api(self, endpoint: str, data: Any, method: str = 'POST'):
+        with self._lifecycle(endpoint, data):
+            try:
+                return await self._cached(endpoint, data, method)
+            except HTTPError as err:
+                stale = self._stale_token(endpoint, data, err)
+                if stale is None:
+                    raise
+            async with self._auth_lock:
+                if self.token == stale:
+                    await self.authenticate(self._credential)
+            return await self._cached(endpoint, {**data, 'auth': self.token}, method)
+
+    async def _cached(self, endpoint: str, data: Any, method: str = 'POST'):
+        if self.cache is None:
+            return await self._send(endpoint, data, method)
+        if not self.cache.cacheable(endpoint):
+            try:
+                return await self._send(endpoint, data, method)
+            finally:
+                self.cache.on_write(endpoint)
+        key = request_key(endpoint, data)
+        hit, value = self.cache.get(key)
+        if hit:
+            return value
+        value = await self._send(endpoint, data, method)
+        self.cache.put(key, value)
+        return value
+
+    async def _send(self, endpoint: str, data: Any, method: str = 'POST'):
+        if self.concurrency is None:
+            return await self._dispatch(endpoint, data, method)
+        waiting = time.perf_counter()
+        async with self.concurrency.slot_async(endpoint):
+            record_phase('queue', waiting)
+            return await self._dispatch(endpoint, data, method)
+
+    async def _dispatch(self, endpoint: str, data: Any, method: str = 'POST'):
+        if self.latency is None:
+            return await self._request(endpoint, data, method)
+        timeout = self.latency.timeout(endpoint, self.options.timeout)
+        delay = self.latency.hedge_delay(endpoint)
+        if delay is None:
+            return await self._timed(endpoint, data, method, timeout)
+        primary = asyncio.ensure_future(self._timed(endpoint, data, method, timeout))
+        done, _ = await asyncio.wait([primary], timeout=delay)
+        if done:
+            return primary.result()
+        self.latency.hedged(endpoint)
+        backup = asyncio.ensure_future(self._timed(endpoint, data, method, timeout))
+        done, pending = await asyncio.wait([primary, backup], return_when=asyncio.FIRST_COMPLETED)
+        first = done.pop()
+        if first.exception() is not None and pending:
+            first = pending.pop()
+            await asyncio.wait([first])
+        else:
+            # unlike threads the loser can be cancelled
+            for task in pending:
+                task.cancel()
+        if first is backup and backup.exception() is None:
+            self.latency.hedge_won(endpoint)
+        return first.result()
+
+    async def _timed(self, endpoint: str, data: Any, method: str, timeout: Any):
+        start = time.perf_counter()
+        try:
+            value = await self._request(endpoint, data, method, timeout)
+        except asyncio.TimeoutError:
+            self.latency.timed_out(endpoint, timeout)
+            raise
+        self.latency.observe(endpoint, time.perf_counter() - start)
+        return value
+
+    async def _request(self, endpoint: str, data: Any, method: str = 'POST', timeout: Any = None):
+        if self.called_endpoints is not None:
+            self.called_endpoints.add(endpoint)
+        session = self._get_session()
+        url = f'{self.domain}{endpoint}'
+        start = time.perf_counter()
+        payload, headers, size = await self._body_async(data)
+        body = {'data': payload, 'headers': headers}
+        if timeout is not None:
+            connect, read = timeout
+            body['timeout'] = aiohttp.ClientTimeout(sock_connect=connect, sock_read=read)
+        sending = time.perf_counter()
+        record_phase('serialize', start)
+        try:
+            async with self._semaphore:
+                record_phase('queue', sending)
+                sending = time.perf_counter()
+                async with session.request(method, url, **body) as res:
+                    status, reason = res.status, res.reason
+                    received = len(await res.read())
+                    received_wire = getattr(res.content, 'total_raw_bytes', received)
+                    text = await res.text()
+        except (aiohttp.ClientError, asyncio.TimeoutError) as err:
+            self.metrics.observe(endpoint, time.perf_counter() - start, error=err)
+            raise
+        finally:
+            record_phase('network', sending)
+        self.metrics.transferred(
+            endpoint, size or 0, received, _sent_bytes(payload, size), received_wire)
+        LOG.debug(f'{endpoint}')
+        LOG.debug('%s', LazyJson(data))
+        if status >= 400:
+            # same exception type as the blocking client so callers can share handlers
+            response = Response()
+            response.status_code, response.reason, response.url = status, reason, url
+            her = HTTPError(f'{status} Error: {reason} for url: {url}', response=response)
+            LOG.error(her)
+            LOG.error(f'error content: {text}')
+            self._trace(endpoint, method, status, start, data, text, her)
+            raise her
+        LOG.debug(f'status -> {status}')
+        parsing = time.perf_counter()
+        try:
+            _json = json.loads(text)
+        except JSONDecodeError:
+            LOG.debug('%s', LazyJson(text))
+            self._trace(endpoint, method, status, start, data, text)
+            return text
+        finally:
+            record_phase('parse', parsing)
+        return self._check_json(endpoint, method, status, start, data, _json)
+
+    def _stream(self, endpoint: str, data: Any, item: Callable[[Dict], Any]) -> AsyncIterator[Any]:
+        # async generator twin of API._stream, holds a semaphore slot until exhausted
+        items = self._stream_items(endpoint, data, item)
+        return items if self.hooks is None else self.hooks.stream_async(endpoint, data, items)
+
+    async def _stream_items(
+        self,
+        endpoint: str,
+        data: Any,
+        item: Callable[[Dict], Any]
+    ) -> AsyncIterator[Any]:
+        if self.called_endpoints is not None:
+            self.called_endpoints.add(endpoint)
+        session = self._get_session()
+        url = f'{self.domain}{endpoint}'
+        start = time.perf_counter()
+        payload, headers, size = await self._body_async(data)
+        record_phase('serialize', start)
+        received = received_wire = 0
+        try:
+            waiting = time.perf_counter()
+            async with self._semaphore:
+                record_phase('queue', waiting)
+                sending = time.perf_counter()
+                async with session.request('POST', url, data=payload, headers=headers) as res:
+                    record_phase('network', sending)
+                    if res.status >= 400:
+                        text = await res.text()
+                        received = len(text)
+                        response = Response()
+                        response.status_code = res.status
+                        response.reason, response.url = res.reason, url
+                        her = HTTPError(
+                            f'{res.status} Error: {res.reason} for url: {url}', response=response)
+                        LOG.error(her)
+                        LOG.error(f'error content: {text}')
+                        self._trace(endpoint, 'POST', res.status, start, data, text, her)
+                        raise her
+                    parser = JsonArrayParser()
+                    while 'error' not in parser.fields:
+                        reading = time.perf_counter()
+                        chunk = await res.content.read(RESPONSE_CHUNK_SIZE)
+                        record_phase('network', reading)
+                        if not chunk:
+                            break
+                        received += len(chunk)
+                        for value in _parse(parser.feed, chunk):
+                            yield _decode(item, value)
+                    received_wire = getattr(res.content, 'total_raw_bytes', received)
+                    if 'error' not in parser.fields:
+                        for value in _parse(parser.close):
+                            yield _decode(item, value)
+                    self._check_json(
+                        endpoint, 'POST', res.status, start, data,
+                        {**parser.fields, 'data': f'<{parser.items} items streamed>'})
+        except (aiohttp.ClientError, asyncio.TimeoutError) as err:
+            self.metrics.observe(endpoint, time.perf_counter() - start, error=err)
+            raise
+        finally:
+            self.metrics.transferred(
+                endpoint, size or 0, received, _sent_bytes(payload, size),
+                received_wire or received)
+
+    async def _stream_table(self, endpoint: str, data: Any, class_: type) -> Table:
+        # async twin of API._stream_table
+        builder = TableBuilder(class_)
+        async for _ in self._stream(endpoint, data, builder.add):
+            pass
+        return builder.table()
+
+    async def _body_async(self, data: Any) -> Tuple[Any, Dict[str, str], Optional[int]]:
+        # API._body for aiohttp: files are read and large bodies compressed in the
+        # default executor, streamed bodies are sent as async iterators
+        headers = {'Content-Type': 'application/json'}
+        if isinstance(data, StreamingJsonBody):
+            payload, size = data, data.len
+        else:
+            # encoded here rather than by aiohttp to know its size
+            payload = json.dumps(data, allow_nan=False).encode('utf-8')
+            size = len(payload)
+        options = self.options
+        if options.compress_requests and should_compress(size, options.compress_threshold):
+            headers['Content-Encoding'] = GZIP
+            if isinstance(payload, bytes):
+                loop = asyncio.get_running_loop()
+                return await loop.run_in_executor(
+                    None, compress, payload, options.compress_level), headers, size
+            payload = GzipStream(payload, options.compress_level)
+        elif isinstance(payload, bytes):
+            return payload, headers, size
+        elif size is not None:
+            headers['Content-Length'] = str(size)
+        return _AsyncBody(payload), headers, size
+
+    async def _call_expect(self, ep: str, data: Any, decoder: Callable[[Dict], Any]) -> Any:
+        async def call():
+            return _decode(decoder, await self._call_api(ep, data))
+        with self._lifecycle(ep, data):
+            if self.single_flight is None or ep not in READ_ENDPOINTS:
+                return await call()
+            return await self.single_flight.do_async(ep, (request_key(ep, data), decoder), call)
+
+    ##
+    # --- Bulk ---
+    ##
+
+    async def bulk(
+        self,
+        method: Union[str, Callable],
+        args: Iterable[Any],
+        workers: int = None,
+        ordered: bool = True
+    ) -> AsyncIterator[BulkResult]:
+        # async generator twin of API.bulk, `workers` defaults to max_concurrency
+        fn = getattr(self, method) if isinstance(method, str) else method
+        workers = workers or self.max_concurrency
+        args_ = iter(enumerate(args))
+        pending: Dict[asyncio.Task, tuple] = {}
+        queued = deque()
+
+        async def _run(args):
+            return await _invoke(fn, args)
+
+        def fill():
+            for index, item in args_:
+                task = asyncio.ensure_future(_run(item))
+                pending[task] = (index, item)
+                if ordered:
+                    queued.append(task)
+                if len(pending) >= workers:
+                    return
+
+        def result(task, index, item):
+            if task.exception() is not None:
+                return BulkResult(index, item, error=task.exception())
+            return BulkResult(index, item, task.result())
+
+        try:
+            fill()
+            while pending:
+                if ordered:
+                    task = queued.popleft()
+                    await asyncio.wait([task])
+                    done = [task]
+                else:
+                    done, _ = await asyncio.wait(list(pending), return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    index, item = pending.pop(task)
+                    yield result(task, index, item)
+                fill()
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def map(
+        self,
+        method: Union[str, Callable],
+        args: Iterable[Any],
+        workers: int = None,
+        ordered: bool = True,
+        return_exceptions: bool = False
+    ) -> AsyncIterator[Any]:
+        async for res in self.bulk(method, args, workers, ordered):
+            if res.error is not None and not return_exceptions:
+                raise res.error
+            yield res.value if res.ok else res.error
+
+    ##
+    # --- Auth ---
+    ##
+
+    async def authenticate(self, credential: PasswordGrant):
+        self.domain = credential.domain
+        try:
+            self.token = await self._call_api(
+                '/API2/auth/authenticateUser',
+                {
+                    'data': {
+                        'userName': credential.username,
+                        'password': credential.password
+                    }
+                }
+            )
+        except HTTPError as err:
+            raise APIException('Invalid Credentials') from err
+        if self.token_cache is not None:
+            self.token_cache.put(credential, self.token)
+
+    async def validate_grant(self, credential: TokenGrant):
+        self.domain = credential.domain
+        self.token = credential.token
+        try:
+            await self.getMe()
+        except HTTPError as err:
+            raise APIException('Invalid Token') from err
+        if self.token_cache is not None:
+            self.token_cache.put(credential, self.token)
@@ -0,0 +1,95 @@
+from collections import deque
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Future,
+    ThreadPoolExecutor,
+    wait
+)
+from dataclasses import dataclass
+from typing import (
+    Any,
+    Callable,
+    Deque,
+    Dict,
+    Iterable,
+    Iterator,
+    Optional,
+    Tuple
+)
+
+DEFAULT_WORKERS = 8
+
+
+@dataclass
+class BulkResult:
+    index: int  # position in the input iterable
+    args: Any
+    value: Any = None
+    error: Optional[Exception] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+def _invoke(fn: Callable, args: Any) -> Any:
+    # tuple -> positional, dict -> keyword, anything else is the single argument
+    if isinstance(args, tuple):
+        return fn(*args)
+    if isinstance(args, dict):
+        return fn(**args)
+    return fn(args)
+
+
+def _result(future: Future, index: int, args: Any) -> BulkResult:
+    try:
+        return BulkResult(index, args, future.result())
+    except Exception as err:
+        return BulkResult(index, args, error=err)
+
+
+def run_bulk(
+    fn: Callable,
+    arg_iter: Iterable[Any],
+    workers: int = DEFAULT_WORKERS,
+    ordered: bool = True,
+    max_pending: int = None
+) -> Iterator[BulkResult]:
+    # Runs fn over arg_iter on a bounded thread pool. At most `max_pending` calls
+    # are submitted ahead of the consumer, so arg_iter is pulled lazily and can be
+    # arbitrarily long. Failures are captured per item on BulkResult.error.
+    max_pending = max_pending or workers * 2
+    args_ = iter(enumerate(arg_iter))
+    pool = ThreadPoolExecutor(max_workers=workers)
+    queued: Deque[Future] = deque()
+    meta: Dict[Future, Tuple[int, Any]] = {}
+
+    def fill():
+        while len(meta) < max_pending:
+            try:
+                index, args = next(args_)
+            except StopIteration:
+                return
+            future = pool.submit(_invoke, fn, args)
+            meta[future] = (index, args)
+            if ordered:
+                queued.append(future)
+
+    try:
+        fill()
+        while meta:
+            if ordered:
+                future = queued.popleft()
+                wait([future])
+                done = [future]
+            else:
+                done, _ = wait(list(meta), return_when=FIRST_COMPLETED)
+            for future in done:
+                index, args = meta.pop(future)
+                yield _result(future, index, args)
+            fill()
+    finally:
+        # consumer stopped early, drop whatever has not started yet
+        for future in meta:
+            future.cancel()
+        pool.shutdown(wait=True)
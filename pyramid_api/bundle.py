@@ -0,0 +1,417 @@
+import argparse
+import gzip
+import json
+import logging
+import mmap
+import os
+from typing import (
+    Any,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple
+)
+import zlib
+
+try:
+    import zstandard
+except ImportError:  # optional, only needed for .zst bundles
+    zstandard = None
+
+from .codecs import decoder
+from .helper_types import WrappedType
+
+LOG = logging.getLogger(__name__)
+
+# Many WrappedType records in one JSON Lines file, plain, gzip or zstd, next to a
+# `<bundle>.idx` offset index of every record's className and metaData.name.
+# Compressed bundles are written in independently compressed blocks (gzip members
+# / zstd frames), so the file is still an ordinary .jsonl.gz / .jsonl.zst, and a
+# record is read by decompressing its block only. The data file is mmapped and
+# nothing is parsed before it is asked for. A missing or stale index is rebuilt
+# by scanning the file, which also indexes bundles written by other tools.
+#
+#   with BundleWriter('acme.jsonl.zst') as out:
+#       for path_ in glob.glob('acme/*.json'):
+#           out.write(WrappedType.createFromFile(path_))
+#
+#   bundle = BundleReader('acme.jsonl.zst')
+#   bundle.get('User', 'bob').to_instance()
+#   for wrapped in bundle.find(className='Server'):
+#       ...
+#
+#   python -m pyramid_api.bundle pack acme.jsonl.gz acme/*.json
+#   python -m pyramid_api.bundle ls acme.jsonl.gz
+
+GZIP = 'gzip'
+ZSTD = 'zstd'
+COMPRESSIONS = (None, GZIP, ZSTD)
+
+DEFAULT_BLOCK_SIZE = 256 << 10  # uncompressed bytes per compressed block
+DEFAULT_LEVELS = {GZIP: 6, ZSTD: 3}
+
+INDEX_SUFFIX = '.idx'
+INDEX_VERSION = 1
+SCAN_CHUNK_SIZE = 1 << 16
+
+# (className, metaData.name, block, offset, length); offsets are into the
+# decompressed block, or into the file (block -1) for plain bundles
+Entry = Tuple[Optional[str], Optional[str], int, int, int]
+
+
+def compression_of(path_: str) -> Optional[str]:
+    # by file suffix
+    if path_.endswith('.gz'):
+        return GZIP
+    if path_.endswith('.zst'):
+        return ZSTD
+    return None
+
+
+def _require_zstd():
+    if zstandard is None:
+        raise ImportError('zstd bundles require zstandard, `pip install zstandard`')
+
+
+def _compress(data: bytes, compression: str, level: int) -> bytes:
+    if compression == GZIP:
+        return gzip.compress(data, compresslevel=level, mtime=0)
+    return zstandard.ZstdCompressor(level=level).compress(data)
+
+
+def _decompressor(compression: str) -> Any:
+    # an object with decompress(), eof and unused_data for one member / frame
+    if compression == GZIP:
+        return zlib.decompressobj(31)
+    return zstandard.ZstdDecompressor().decompressobj()
+
+
+def _decompress(data: bytes, compression: str) -> bytes:
+    # every member / frame of `data`
+    out = []
+    while data:
+        d = _decompressor(compression)
+        out.append(d.decompress(data))
+        data = d.unused_data if d.eof else b''
+    return b''.join(out)
+
+
+def _record_key(record: Dict[str, Any]) -> Tuple[Optional[str], Optional[str]]:
+    meta = record.get('metaData') or {}
+    return record.get('className'), meta.get('name')
+
+
+def _as_record(obj: Any) -> Dict[str, Any]:
+    # a WrappedType, an api_types instance or an already encoded dict
+    if isinstance(obj, dict):
+        return obj
+    if not isinstance(obj, WrappedType):
+        obj = WrappedType.create(obj)
+    return obj.to_dict()
+
+
+##
+# --- Writing ---
+##
+
+class BundleWriter:
+    # Streams records to `path_`, at most one block is held in memory. The index
+    # is written on close.
+
+    def __init__(
+        self,
+        path_: str,
+        compression: Optional[str] = '',
+        level: int = None,
+        block_size: int = DEFAULT_BLOCK_SIZE
+    ):
+        # compression '' picks it from the suffix
+        self.path = path_
+        self.compression = compression_of(path_) if compression == '' else compression
+        if self.compression not in COMPRESSIONS:
+            raise ValueError(f'unknown compression {self.compression}, expected one of {COMPRESSIONS}')
+        if self.compression == ZSTD:
+            _require_zstd()
+        self.level = level if level is not None else DEFAULT_LEVELS.get(self.compression)
+        self.block_size = block_size
+        self.entries: List[Entry] = []
+        self.blocks: List[Tuple[int, int]] = []  # (offset, length) in the file
+        self._block: List[bytes] = []
+        self._block_len = 0
+        self._offset = 0
+        self._file = open(path_, 'wb')
+
+    def write(self, obj: Any) -> int:
+        # returns the record's position in the bundle
+        record = _as_record(obj)
+        line = json.dumps(record, separators=(',', ':')).encode('utf-8') + b'\n'
+        class_name, name = _record_key(record)
+        if self.compression is None:
+            self.entries.append((class_name, name, -1, self._offset, len(line) - 1))
+            self._file.write(line)
+            self._offset += len(line)
+        else:
+            self.entries.append((class_name, name, len(self.blocks), self._block_len, len(line) - 1))
+            self._block.append(line)
+            self._block_len += len(line)
+            if self._block_len >= self.block_size:
+                self._flush()
+        return len(self.entries) - 1
+
+    def write_all(self, objs: Iterable[Any]) -> int:
+        for obj in objs:
+            self.write(obj)
+        return len(self.entries)
+
+    def _flush(self):
+        if not self._block:
+            return
+        data = _compress(b''.join(self._block), self.compression, self.level)
+        self._file.write(data)
+        self.blocks.append((self._offset, len(data)))
+        self._offset += len(data)
+        self._block, self._block_len = [], 0
+
+    def close(self):
+        if self._file.closed:
+            return
+        self._flush()
+        self._file.close()
+        _write_index(self.path, self.compression, self._offset, self.blocks, self.entries)
+
+    def __enter__(self) -> 'BundleWriter':
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _write_index(path_: str, compression: Optional[str], size: int, blocks, entries):
+    index = {
+        'version': INDEX_VERSION,
+        'compression': compression,
+        'size': size,
+        'blocks': blocks,
+        'entries': entries
+    }
+    with open(path_ + INDEX_SUFFIX, 'w') as f:
+        json.dump(index, f, separators=(',', ':'))
+
+
+def write_bundle(path_: str, objs: Iterable[Any], **kwargs) -> int:
+    # kwargs are BundleWriter's, returns the number of records
+    with BundleWriter(path_, **kwargs) as out:
+        return out.write_all(objs)
+
+
+def pack(paths: Iterable[str], path_: str, **kwargs) -> int:
+    # WrappedType.to_file files -> one bundle
+    def records():
+        for file_path in paths:
+            with open(file_path, 'r') as f:
+                yield json.load(f)
+    return write_bundle(path_, records(), **kwargs)
+
+
+##
+# --- Reading ---
+##
+
+class BundleReader:
+    # Random and streaming access to a bundle. Decompressed blocks are cached one
+    # at a time, so iterating in order decompresses every block once.
+
+    def __init__(self, path_: str, use_mmap: bool = True, compression: Optional[str] = ''):
+        self.path = path_
+        self._file = open(path_, 'rb')
+        size = os.fstat(self._file.fileno()).st_size
+        self._data: Any = None
+        if use_mmap and size:
+            self._data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.size = size
+        self._cached: Tuple[int, bytes] = (-1, b'')
+        self._by_key: Optional[Dict[Tuple[Optional[str], Optional[str]], List[int]]] = None
+        index = self._read_index()
+        if index is None:
+            compression = compression_of(path_) if compression == '' else compression
+            index = self._scan(compression)
+            _write_index(path_, compression, size, index['blocks'], index['entries'])
+        self.compression: Optional[str] = index['compression']
+        if self.compression == ZSTD:
+            _require_zstd()
+        self.blocks: List[Tuple[int, int]] = [tuple(b) for b in index['blocks']]
+        self.entries: List[Entry] = [tuple(e) for e in index['entries']]
+        self._decode = decoder(WrappedType)
+
+    def _read_index(self) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self.path + INDEX_SUFFIX, 'r') as f:
+                index = json.load(f)
+        except FileNotFoundError:
+            return None
+        except ValueError:
+            LOG.warning(f'{self.path}{INDEX_SUFFIX} is corrupt, rebuilding it')
+            return None
+        if index.get('version') != INDEX_VERSION or index.get('size') != self.size:
+            LOG.warning(f'{self.path}{INDEX_SUFFIX} does not match {self.path}, rebuilding it')
+            return None
+        return index
+
+    def _read(self, offset: int, length: int) -> bytes:
+        if self._data is not None:
+            return self._data[offset:offset + length]
+        self._file.seek(offset)
+        return self._file.read(length)
+
+    def _chunks(self, offset: int) -> Iterator[bytes]:
+        while offset < self.size:
+            chunk = self._read(offset, SCAN_CHUNK_SIZE)
+            offset += len(chunk)
+            yield chunk
+
+    def _scan(self, compression: Optional[str]) -> Dict[str, Any]:
+        # index of a bundle without one: line offsets, and for compressed files
+        # the member / frame boundaries, each member becoming a block
+        LOG.info(f'indexing {self.path}')
+        entries: List[Entry] = []
+        if compression is None:
+            offset = 0
+            for line in self._lines(self._chunks(0)):
+                entries.append((*_record_key(json.loads(line)), -1, offset, len(line)))
+                offset += len(line) + 1
+            return {'compression': None, 'blocks': [], 'entries': entries}
+        if compression == ZSTD:
+            _require_zstd()
+        blocks = []
+        offset = 0
+        while offset < self.size:
+            # members up to one ending a line, other writers may split records
+            parts, consumed, last = [], 0, b''
+            while offset + consumed < self.size and not last.endswith(b'\n'):
+                d = _decompressor(compression)
+                for chunk in self._chunks(offset + consumed):
+                    parts.append(d.decompress(chunk))
+                    last = parts[-1] or last
+                    consumed += len(chunk)
+                    if d.eof:
+                        consumed -= len(d.unused_data)
+                        break
+            block = len(blocks)
+            blocks.append((offset, consumed))
+            start = 0
+            for line in b''.join(parts).split(b'\n'):
+                if line.strip():
+                    entries.append((*_record_key(json.loads(line)), block, start, len(line)))
+                start += len(line) + 1
+            offset += consumed
+        return {'compression': compression, 'blocks': blocks, 'entries': entries}
+
+    @staticmethod
+    def _lines(chunks: Iterable[bytes]) -> Iterator[bytes]:
+        rest = b''
+        for chunk in chunks:
+            lines = (rest + chunk).split(b'\n')
+            rest = lines.pop()
+            yield from lines
+        if rest:
+            yield rest
+
+    def _block(self, block: int) -> bytes:
+        cached, data = self._cached
+        if cached != block:
+            offset, length = self.blocks[block]
+            data = _decompress(self._read(offset, length), self.compression)
+            self._cached = (block, data)
+        return data
+
+    def raw_bytes(self, i: int) -> bytes:
+        _, _, block, offset, length = self.entries[i]
+        if block < 0:
+            return self._read(offset, length)
+        return self._block(block)[offset:offset + length]
+
+    def raw(self, i: int) -> Dict[str, Any]:
+        # the record as a dict, ie for WrappedTemplate(bundle.raw(i))
+        return json.loads(self.raw_bytes(i))
+
+    def __getitem__(self, i: int) -> WrappedType:
+        return self._decode(self.raw(i))
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __iter__(self) -> Iterator[WrappedType]:
+        for i in range(len(self.entries)):
+            yield self[i]
+
+    def classes(self) -> Dict[str, int]:
+        # className -> records
+        counts: Dict[str, int] = {}
+        for class_name, *_ in self.entries:
+            counts[class_name] = counts.get(class_name, 0) + 1
+        return counts
+
+    def positions(self, className: str = None, name: str = None) -> List[int]:
+        # positions of the records matching, from the index alone
+        if className is not None and name is not None:
+            if self._by_key is None:
+                by_key: Dict[Tuple[Optional[str], Optional[str]], List[int]] = {}
+                for i, (class_name, name_, *_) in enumerate(self.entries):
+                    by_key.setdefault((class_name, name_), []).append(i)
+                self._by_key = by_key
+            return self._by_key.get((className, name), [])
+        return [
+            i for i, (class_name, name_, *_) in enumerate(self.entries)
+            if (className is None or class_name == className) and (name is None or name_ == name)]
+
+    def find(self, className: str = None, name: str = None) -> Iterator[WrappedType]:
+        for i in self.positions(className, name):
+            yield self[i]
+
+    def get(self, className: str, name: str) -> WrappedType:
+        positions = self.positions(className, name)
+        if not positions:
+            raise KeyError((className, name))
+        return self[positions[0]]
+
+    def close(self):
+        if self._data is not None:
+            self._data.close()
+            self._data = None
+        self._file.close()
+
+    def __enter__(self) -> 'BundleReader':
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='WrappedType bundles')
+    commands = parser.add_subparsers(dest='command', required=True)
+    pack_ = commands.add_parser('pack', help='bundle WrappedType files')
+    pack_.add_argument('bundle')
+    pack_.add_argument('files', nargs='+')
+    pack_.add_argument('--level', type=int)
+    pack_.add_argument('--block-size', type=int, default=DEFAULT_BLOCK_SIZE)
+    ls = commands.add_parser('ls', help='list the records of a bundle')
+    ls.add_argument('bundle')
+    ls.add_argument('--class', dest='class_name')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    if args.command == 'pack':
+        count = pack(args.files, args.bundle, level=args.level, block_size=args.block_size)
+        LOG.info(f'{count} records written to {args.bundle}')
+        return
+    with BundleReader(args.bundle) as bundle:
+        for i in bundle.positions(args.class_name):
+            class_name, name = bundle.entries[i][:2]
+            print(f'{i}\t{class_name}\t{name or ""}')
+
+
+if __name__ == '__main__':
+    main()
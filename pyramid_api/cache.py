@@ -0,0 +1,128 @@
+from collections import (
+    Counter,
+    OrderedDict
+)
+import json
+import threading
+import time
+from typing import (
+    Any,
+    Dict,
+    Iterable,
+    Optional,
+    Tuple
+)
+
+from . import endpoints as ep
+
+# Read-through cache for idempotent lookups, consulted by API._call_api. Entries
+# are keyed by endpoint + request body (which includes the auth token, so users
+# never see each other's answers), expire per endpoint TTL and are evicted least
+# recently used past `max_size`. Writes drop the reads listed in
+# endpoints.INVALIDATES. Cached responses are shared, treat results as read-only.
+
+DEFAULT_TTLS: Dict[str, float] = {
+    ep.GET_ME: 300,
+    ep.GET_TENANT_BY_NAME: 300,
+    ep.GET_USERS_BY_NAME: 60,
+    ep.FIND_SERVER_BY_NAME: 60,
+    ep.GET_ALL_CONNECTION_STRINGS: 60,
+    ep.GET_USER_PUBLIC_ROOT_FOLDER: 600,
+    ep.GET_PRIVATE_ROOT_FOLDER: 600,
+    ep.GET_PRIVATE_FOLDER_FOR_USER: 600,
+    ep.GET_USER_GROUP_ROOT_FOLDER: 600,
+    ep.GET_PUBLIC_OR_GROUP_FOLDER_BY_TENANT_ID: 600,
+}
+
+DEFAULT_MAX_SIZE = 1024
+
+Key = Tuple[str, str]
+
+
+def request_key(endpoint: str, data: Any) -> Key:
+    # key order of the body must not matter
+    return (endpoint, json.dumps(data, sort_keys=True, separators=(',', ':'), default=str))
+
+
+class ResponseCache:
+
+    def __init__(
+        self,
+        ttls: Dict[str, float] = None,
+        max_size: int = DEFAULT_MAX_SIZE,
+        clock=time.monotonic
+    ):
+        self.ttls = dict(DEFAULT_TTLS if ttls is None else ttls)
+        self.max_size = max_size
+        self.hits: Counter = Counter()
+        self.misses: Counter = Counter()
+        self.evictions = 0
+        self._clock = clock
+        self._entries: 'OrderedDict[Key, Tuple[float, Any]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def cacheable(self, endpoint: str) -> bool:
+        return endpoint in self.ttls
+
+    def get(self, key: Key) -> Tuple[bool, Optional[Any]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires, value = entry
+                if expires > self._clock():
+                    self._entries.move_to_end(key)
+                    self.hits[key[0]] += 1
+                    return True, value
+                del self._entries[key]
+            self.misses[key[0]] += 1
+            return False, None
+
+    def put(self, key: Key, value: Any):
+        with self._lock:
+            self._entries[key] = (self._clock() + self.ttls[key[0]], value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, endpoints: Iterable[str] = None):
+        # drop entries for the given endpoints, or everything
+        with self._lock:
+            if endpoints is None:
+                self._entries.clear()
+                return
+            endpoints = set(endpoints)
+            for key in [k for k in self._entries if k[0] in endpoints]:
+                del self._entries[key]
+
+    def on_write(self, endpoint: str):
+        if endpoint in ep.INVALIDATES:
+            affected = ep.INVALIDATES[endpoint]
+            if affected:
+                self.invalidate(affected)
+        elif endpoint not in ep.READ_ENDPOINTS:
+            self.invalidate()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'size': len(self._entries),
+            'hits': sum(self.hits.values()),
+            'misses': sum(self.misses.values()),
+            'evictions': self.evictions,
+            'by_endpoint': {
+                e: {'hits': self.hits[e], 'misses': self.misses[e]}
+                for e in sorted(set(self.hits) | set(self.misses))
+            }
+        }
+
+
+def as_cache(cache: Any) -> Optional[ResponseCache]:
+    # True -> default cache, None / False -> no cache
+    if cache is True:
+        return ResponseCache()
+    if cache is None or cache is False:
+        return None
+    return cache
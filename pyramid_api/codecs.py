@@ -0,0 +1,188 @@
+from dataclasses import (
+    MISSING,
+    fields,
+    is_dataclass
+)
+from enum import IntEnum
+from functools import lru_cache
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Type,
+    TypeVar,
+    Union,
+    get_type_hints
+)
+
+# Compiled wire codecs for the api_types dataclasses. decoder(cls) generates, once
+# per class, a function that builds an instance straight from a response dict:
+# unknown keys are ignored, IntEnum fields become members (unknown values are kept
+# as plain ints) and nested dataclasses / lists of them are decoded recursively.
+# encoder(cls) is the reverse for request bodies, a single pass replacing
+# asdict(): values are not copied, only nested dataclasses become dicts.
+
+T = TypeVar('T')
+
+_MISSING = object()
+
+
+def _unwrap_optional(type_: Any) -> Any:
+    if getattr(type_, '__origin__', None) is Union:
+        args = [a for a in type_.__args__ if a is not type(None)]
+        if len(args) == 1:
+            return args[0]
+    return type_
+
+
+def _enum_converter(enum_: Type[IntEnum]) -> Callable[[Any], Any]:
+    members = enum_._value2member_map_
+
+    def convert(value):
+        return members.get(value, value)
+    convert.members = members
+    return convert
+
+
+def _converter(type_: Any) -> Callable[[Any], Any]:
+    # None means the value is stored as is
+    type_ = _unwrap_optional(type_)
+    if isinstance(type_, type) and issubclass(type_, IntEnum):
+        return _enum_converter(type_)
+    if is_dataclass(type_):
+        return decoder(type_)
+    if getattr(type_, '__origin__', None) in (list, List):
+        item = _converter(type_.__args__[0]) if getattr(type_, '__args__', None) else None
+        if item is None:
+            return None
+        return lambda values: [item(v) for v in values]
+    return None
+
+
+@lru_cache(maxsize=None)
+def decoder(cls: Type[T]) -> Callable[[Dict[str, Any]], T]:
+    hints = get_type_hints(cls)
+    env: Dict[str, Any] = {'_cls': cls, '_new': object.__new__, '_M': _MISSING}
+    lines = []
+    for f in fields(cls):
+        name = f.name
+        attr = f'o.{name}'
+        # required fields the server left out become None
+        default = 'None'
+        if f.default is not MISSING and f.default is not None:
+            env[f'_d_{name}'] = f.default
+            default = f'_d_{name}'
+        convert = _converter(hints[name])
+        if f.default_factory is not MISSING:
+            env[f'_f_{name}'] = f.default_factory
+            default = f'_f_{name}()'
+            if convert is None:
+                lines.append(f'{attr} = _get({name!r}) if {name!r} in d else {default}')
+                continue
+        if convert is None:
+            lines.append(f'{attr} = _get({name!r}, {default})')
+        elif hasattr(convert, 'members'):
+            # enums are a plain dict lookup, inlined as they are the common case
+            env[f'_m_{name}'] = convert.members
+            if default.endswith('()'):
+                lines.append(f'v = _get({name!r}, _M)')
+                lines.append(f'{attr} = {default} if v is _M else _m_{name}.get(v, v)')
+            else:
+                lines.append(f'v = _get({name!r}, {default})')
+                lines.append(f'{attr} = _m_{name}.get(v, v)')
+        else:
+            env[f'_c_{name}'] = convert
+            lines.append(f'v = _get({name!r}, _M)')
+            lines.append(
+                f'{attr} = {default} if v is _M else (None if v is None else _c_{name}(v))')
+    if hasattr(cls, '__post_init__'):
+        lines.append('o.__post_init__()')
+    # attributes are set one by one, bypassing __init__, which keeps the
+    # instances on the class's shared-key __dict__ layout and ignores unknown keys
+    source = '\n    '.join([
+        'def decode(d):',
+        '_get = d.get',
+        'o = _new(_cls)',
+        *lines,
+        'return o'
+    ])
+    exec(source, env)
+    decode = env['decode']
+    decode.__qualname__ = f'decoder.<{cls.__qualname__}>'
+    return decode
+
+
+def decode(cls: Type[T], data: Dict[str, Any]) -> T:
+    return decoder(cls)(data)
+
+
+def decode_list(cls: Type[T], items: Iterable[Dict[str, Any]]) -> List[T]:
+    return list(map(decoder(cls), items))
+
+
+##
+# --- Encoding ---
+##
+
+def _encode_converter(type_: Any) -> Callable[[Any], Any]:
+    # None means the value is sent as is, IntEnum members serialize as ints
+    type_ = _unwrap_optional(type_)
+    if is_dataclass(type_):
+        # nested objects keep their nulls, as they did with asdict()
+        return encoder(type_, drop_nulls=False)
+    if getattr(type_, '__origin__', None) in (list, List):
+        item = _encode_converter(type_.__args__[0]) if getattr(type_, '__args__', None) else None
+        if item is None:
+            return None
+        return lambda values: [item(v) for v in values]
+    return None
+
+
+@lru_cache(maxsize=None)
+def encoder(cls: Type[T], drop_nulls: bool = True) -> Callable[[T], Dict[str, Any]]:
+    # drop_nulls leaves out top level fields that are None, the server then
+    # applies its own defaults
+    hints = get_type_hints(cls)
+    env: Dict[str, Any] = {}
+    lines = []
+    items = []
+    for f in fields(cls):
+        name = f.name
+        convert = _encode_converter(hints[name])
+        if convert is not None:
+            env[f'_c_{name}'] = convert
+        if not drop_nulls:
+            value = f'o.{name}' if convert is None else \
+                f'None if o.{name} is None else _c_{name}(o.{name})'
+            items.append(f'{name!r}: {value}')
+            continue
+        lines.append(f'v = o.{name}')
+        lines.append(f'if v is not None: d[{name!r}] = {"v" if convert is None else f"_c_{name}(v)"}')
+    if drop_nulls:
+        body = ['d = {}', *lines, 'return d']
+    else:
+        body = ['return {' + ', '.join(items) + '}']
+    source = '\n    '.join(['def encode(o):', *body])
+    exec(source, env)
+    encode = env['encode']
+    encode.__qualname__ = f'encoder.<{cls.__qualname__}>'
+    return encode
+
+
+def encode(obj: Any, drop_nulls: bool = True) -> Dict[str, Any]:
+    return encoder(type(obj), drop_nulls)(obj)
+
+
+def encode_list(objs: Iterable[Any], drop_nulls: bool = True) -> List[Dict[str, Any]]:
+    # batch encoder, the generated function is looked up once per class
+    # rather than once per object
+    out = []
+    cls = encode_ = None
+    for obj in objs:
+        if type(obj) is not cls:
+            cls = type(obj)
+            encode_ = encoder(cls, drop_nulls)
+        out.append(encode_(obj))
+    return out
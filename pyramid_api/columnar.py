@@ -0,0 +1,148 @@
+from array import array
+from dataclasses import fields
+from functools import lru_cache
+import math
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Sequence,
+    TYPE_CHECKING,
+    Tuple,
+    Type,
+    get_type_hints
+)
+
+try:
+    import numpy as np
+except ImportError:  # optional, typed arrays from the stdlib are used instead
+    np = None
+
+from .codecs import _unwrap_optional
+
+if TYPE_CHECKING:
+    import pandas
+
+# Column oriented results for large listings. Instead of one dataclass instance
+# per row, every field of the row type becomes one column: NumPy arrays when
+# NumPy is installed, `array.array` otherwise, and plain lists for strings and
+# other objects. Integer columns that contain nulls are stored as floats with NaN.
+#
+# Listings requested with columnar=True are streamed, each item goes into the
+# columns as it is parsed.
+#
+#   table = api.findContentItem(params, columnar=True)
+#   table['caption'], len(table), table.to_pandas()
+
+INT, FLOAT, BOOL, OBJECT = 'int', 'float', 'bool', 'object'
+
+
+def _kind(type_: Any) -> str:
+    type_ = _unwrap_optional(type_)
+    if type_ is bool:
+        return BOOL
+    if isinstance(type_, type) and issubclass(type_, int):  # IntEnum too
+        return INT
+    if type_ is float:
+        return FLOAT
+    return OBJECT
+
+
+def _column(values: List[Any], kind: str, use_numpy: bool) -> Sequence:
+    has_null = None in values
+    if kind == INT and has_null:
+        kind, values = FLOAT, [math.nan if v is None else v for v in values]
+    if kind == OBJECT or (kind == BOOL and has_null):
+        return values
+    try:
+        if use_numpy:
+            dtype = {INT: np.int64, FLOAT: np.float64, BOOL: np.bool_}[kind]
+            return np.array(values, dtype=dtype)
+        return array({INT: 'q', FLOAT: 'd', BOOL: 'b'}[kind], values)
+    except (TypeError, ValueError, OverflowError):
+        # the server sent something other than the declared type
+        return values
+
+
+class Table:
+
+    def __init__(self, columns: Dict[str, Sequence], length: int):
+        self.columns = columns
+        self.length = length
+
+    def __len__(self) -> int:
+        return self.length
+
+    def __getitem__(self, name: str) -> Sequence:
+        return self.columns[name]
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.columns
+
+    def __repr__(self) -> str:
+        names = ', '.join(self.columns)
+        return f'<Table {self.length} rows x {len(self.columns)} columns: {names}>'
+
+    @property
+    def names(self) -> List[str]:
+        return list(self.columns)
+
+    def row(self, index: int) -> Dict[str, Any]:
+        return {name: column[index] for name, column in self.columns.items()}
+
+    def rows(self) -> Iterator[Dict[str, Any]]:
+        for i in range(self.length):
+            yield self.row(i)
+
+    def to_pandas(self) -> 'pandas.DataFrame':
+        import pandas
+        return pandas.DataFrame({name: column for name, column in self.columns.items()})
+
+
+@lru_cache(maxsize=None)
+def _layout(cls: Type) -> Tuple[Tuple[str, str], ...]:
+    hints = get_type_hints(cls)
+    return tuple((f.name, _kind(hints[f.name])) for f in fields(cls))
+
+
+class TableBuilder:
+    # Per-field columns filled one response item at a time, so a listing can go
+    # straight from the streaming parser into columns (API._stream_table) without
+    # the whole `data` array of dicts being held first.
+
+    def __init__(self, cls: Type, use_numpy: bool = None):
+        self.use_numpy = np is not None if use_numpy is None else use_numpy
+        self.layout = _layout(cls)
+        self.values: Dict[str, List[Any]] = {name: [] for name, _ in self.layout}
+        self._appends = tuple((name, self.values[name].append) for name in self.values)
+        self.length = 0
+
+    def add(self, item: Dict[str, Any]):
+        get = item.get
+        for name, append in self._appends:
+            append(get(name))
+        self.length += 1
+
+    def table(self) -> Table:
+        return Table({
+            name: _column(self.values[name], kind, self.use_numpy) for name, kind in self.layout
+        }, self.length)
+
+
+def to_table(cls: Type, items: Iterable[Dict[str, Any]], use_numpy: bool = None) -> Table:
+    # one pass over the raw response dicts, no row objects are built
+    builder = TableBuilder(cls, use_numpy)
+    for item in items:
+        builder.add(item)
+    return builder.table()
+
+
+@lru_cache(maxsize=None)
+def columns_of(cls: Type) -> Callable[[Dict], Table]:
+    # decoder of a parsed response, the columnar counterpart of api._many
+    def decode(res: Dict) -> Table:
+        return to_table(cls, res['data'])
+    return decode
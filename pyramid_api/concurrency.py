@@ -0,0 +1,260 @@
+import asyncio
+from collections import deque
+from contextlib import (
+    asynccontextmanager,
+    contextmanager
+)
+from dataclasses import dataclass
+import threading
+import time
+from typing import (
+    Any,
+    AsyncIterator,
+    Deque,
+    Dict,
+    Iterator,
+    List,
+    Optional
+)
+
+from requests.exceptions import HTTPError
+
+# AIMD (additive increase, multiplicative decrease) limit on the calls in flight
+# per endpoint, consulted by API._send. Callers over the limit wait for a slot.
+#
+#  - every healthy response while the limit is in use adds `increase / limit`,
+#    so the limit grows by about `increase` per round of calls
+#  - an overload signal multiplies it by `decrease`: a 5xx / 429, a timeout or a
+#    connection error, or a latency EWMA above `latency_tolerance` x the fastest
+#    EWMA seen. Only calls sent after the previous decrease can trigger the next,
+#    so one burst of failures halves the limit once, not once per call.
+#
+# Other errors (4xx, error payloads) say nothing about load and are ignored.
+#
+#   api = grant.get_api(concurrency=ConcurrencyController(max_limit=64))
+#   list(api.bulk(api.createUserDb, users, workers=64))
+#   api.concurrency.limit('/API2/access/createUserDb'), api.concurrency.history(...)
+
+DEFAULT_INITIAL_LIMIT = 4
+DEFAULT_MAX_LIMIT = 64
+DEFAULT_HISTORY = 1000
+
+OVERLOAD_STATUSES = (429,)
+
+
+def overloaded(error: Optional[BaseException]) -> bool:
+    if error is None:
+        return False
+    if isinstance(error, HTTPError):
+        status = getattr(error.response, 'status_code', None)
+        return status is None or status >= 500 or status in OVERLOAD_STATUSES
+    # timeouts and connection errors of requests and aiohttp are all OSErrors
+    return isinstance(error, (OSError, asyncio.TimeoutError))
+
+
+@dataclass
+class LimitChange:
+    at: float  # time.time()
+    limit: int
+    reason: str  # 'increase', 'error' or 'latency'
+
+
+class _Endpoint:
+
+    def __init__(self, limit: float, history: int):
+        self.limit = limit
+        self.in_flight = 0
+        self.ewma: Optional[float] = None
+        self.fastest: Optional[float] = None
+        self.last_decrease = 0.0
+        self.history: Deque[LimitChange] = deque(maxlen=history)
+        self.async_waiters: Deque[asyncio.Future] = deque()
+
+
+class ConcurrencyController:
+
+    def __init__(
+        self,
+        initial_limit: int = DEFAULT_INITIAL_LIMIT,
+        min_limit: int = 1,
+        max_limit: int = DEFAULT_MAX_LIMIT,
+        increase: float = 1.0,
+        decrease: float = 0.5,
+        latency_tolerance: float = 2.0,
+        smoothing: float = 0.2,
+        history: int = DEFAULT_HISTORY
+    ):
+        self.initial_limit = initial_limit
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.increase = increase
+        self.decrease = decrease
+        self.latency_tolerance = latency_tolerance
+        self.smoothing = smoothing
+        self.history_size = history
+        self._endpoints: Dict[str, _Endpoint] = {}
+        self._lock = threading.Lock()
+        self._cond = threading.Condition(self._lock)
+
+    def _state(self, endpoint: str) -> _Endpoint:
+        state = self._endpoints.get(endpoint)
+        if state is None:
+            state = self._endpoints[endpoint] = _Endpoint(self.initial_limit, self.history_size)
+        return state
+
+    ##
+    # --- Slots ---
+    ##
+
+    def acquire(self, endpoint: str) -> float:
+        # blocks until a slot is free, returns the start time to pass to release
+        with self._cond:
+            state = self._state(endpoint)
+            while state.in_flight >= int(state.limit):
+                self._cond.wait()
+            state.in_flight += 1
+        return time.monotonic()
+
+    async def acquire_async(self, endpoint: str) -> float:
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._lock:
+                state = self._state(endpoint)
+                if state.in_flight < int(state.limit):
+                    state.in_flight += 1
+                    return time.monotonic()
+                waiter = loop.create_future()
+                state.async_waiters.append(waiter)
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                with self._lock:
+                    if waiter in state.async_waiters:
+                        state.async_waiters.remove(waiter)
+                    elif waiter.done() and not waiter.cancelled():
+                        # woken and cancelled at once, hand the wake up on
+                        self._wake(state)
+                raise
+
+    def release(self, endpoint: str, started: float, error: BaseException = None):
+        elapsed = time.monotonic() - started
+        with self._cond:
+            state = self._state(endpoint)
+            busy = state.in_flight >= int(state.limit)
+            state.in_flight -= 1
+            self._adjust(state, started, elapsed, error, busy)
+            self._cond.notify_all()
+            self._wake(state)
+
+    @contextmanager
+    def slot(self, endpoint: str) -> Iterator[None]:
+        started = self.acquire(endpoint)
+        try:
+            yield
+        except BaseException as err:
+            self.release(endpoint, started, err)
+            raise
+        self.release(endpoint, started)
+
+    @asynccontextmanager
+    async def slot_async(self, endpoint: str) -> AsyncIterator[None]:
+        started = await self.acquire_async(endpoint)
+        try:
+            yield
+        except BaseException as err:
+            self.release(endpoint, started, err)
+            raise
+        self.release(endpoint, started)
+
+    def _wake(self, state: _Endpoint):
+        free = int(state.limit) - state.in_flight
+        while free > 0 and state.async_waiters:
+            waiter = state.async_waiters.popleft()
+            waiter.get_loop().call_soon_threadsafe(_resolve, waiter)
+            free -= 1
+
+    ##
+    # --- AIMD ---
+    ##
+
+    def _adjust(
+        self,
+        state: _Endpoint,
+        started: float,
+        elapsed: float,
+        error: Optional[BaseException],
+        busy: bool
+    ):
+        if overloaded(error):
+            self._decrease(state, started, 'error')
+            return
+        if error is not None:
+            return
+        a = self.smoothing
+        state.ewma = elapsed if state.ewma is None else a * elapsed + (1 - a) * state.ewma
+        state.fastest = state.ewma if state.fastest is None else min(state.fastest, state.ewma)
+        if state.ewma > self.latency_tolerance * state.fastest:
+            self._decrease(state, started, 'latency')
+        elif busy and state.limit < self.max_limit:
+            # only grow a limit that is actually holding callers back
+            before = int(state.limit)
+            state.limit = min(self.max_limit, state.limit + self.increase / state.limit)
+            if int(state.limit) != before:
+                self._record(state, 'increase')
+
+    def _decrease(self, state: _Endpoint, started: float, reason: str):
+        if started < state.last_decrease:
+            return
+        state.last_decrease = time.monotonic()
+        before = int(state.limit)
+        state.limit = max(self.min_limit, state.limit * self.decrease)
+        if reason == 'latency':
+            # the slower latency is the new normal at the lower limit
+            state.fastest = state.ewma
+        if int(state.limit) != before:
+            self._record(state, reason)
+
+    def _record(self, state: _Endpoint, reason: str):
+        state.history.append(LimitChange(time.time(), int(state.limit), reason))
+
+    ##
+    # --- Introspection ---
+    ##
+
+    def limit(self, endpoint: str) -> int:
+        with self._lock:
+            return int(self._state(endpoint).limit)
+
+    def in_flight(self, endpoint: str) -> int:
+        with self._lock:
+            return self._state(endpoint).in_flight
+
+    def history(self, endpoint: str) -> List[LimitChange]:
+        with self._lock:
+            return list(self._state(endpoint).history)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                endpoint: {
+                    'limit': int(state.limit),
+                    'in_flight': state.in_flight,
+                    'latency': state.ewma,
+                    'changes': len(state.history)
+                }
+                for endpoint, state in sorted(self._endpoints.items())
+            }
+
+
+def _resolve(waiter: asyncio.Future):
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+def as_concurrency_controller(concurrency: Any) -> Optional[ConcurrencyController]:
+    # True -> default limits, None / False -> no limit besides the pool size
+    if concurrency is True:
+        return ConcurrencyController()
+    if concurrency is None or concurrency is False:
+        return None
+    return concurrency
@@ -0,0 +1,113 @@
+from collections import deque
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    ThreadPoolExecutor,
+    wait
+)
+import logging
+from typing import (
+    Deque,
+    Iterable,
+    Iterator,
+    Tuple,
+    Union
+)
+
+from .api import API
+from .api_types import (
+    ContentItem,
+    ContentType,
+    ValidRootFolderType
+)
+from .bulk import DEFAULT_WORKERS
+
+LOG = logging.getLogger(__name__)
+
+# Breadth first crawl of a folder tree, expanding up to `workers` folders at once
+# through API.getFolderItems and streaming every ContentItem found.
+#
+#   for item in crawl_folders(api, me.id, content_types=[ContentType.datadiscovery]):
+#       ...
+#   # the whole public tree of a tenant rather than the user's view of it
+#   for item in crawl_folders(api, me.id, ValidRootFolderType.public, tenant_id=tenant_id):
+#       ...
+
+DEFAULT_MAX_FRONTIER = 10000
+
+ROOT_GETTERS = {
+    ValidRootFolderType.public: 'getUserPublicRootFolder',
+    ValidRootFolderType.private: 'getPrivateRootFolder',
+    ValidRootFolderType.group: 'getUserGroupRootFolder',
+}
+TENANT_ROOT_TYPES = (ValidRootFolderType.public, ValidRootFolderType.group)
+
+
+def resolve_root(
+    api: API,
+    user_id: str,
+    root: Union[ContentItem, ValidRootFolderType, str],
+    tenant_id: str = None
+) -> str:
+    # a folder item, a folder id, or a root folder by type: the user's, or with
+    # tenant_id the tenant's public / group root (getPublicOrGroupFolderByTenantId)
+    if isinstance(root, ContentItem):
+        return root.id
+    if isinstance(root, ValidRootFolderType):
+        if tenant_id is None:
+            return getattr(api, ROOT_GETTERS[root])(user_id).id
+        if root not in TENANT_ROOT_TYPES:
+            raise ValueError(
+                f'{root.name} has no tenant root folder, expected one of {TENANT_ROOT_TYPES}')
+        return api.getPublicOrGroupFolderByTenantId(tenant_id, root).id
+    return root
+
+
+def crawl_folders(
+    api: API,
+    user_id: str,
+    root: Union[ContentItem, ValidRootFolderType, str] = ValidRootFolderType.public,
+    max_depth: int = None,
+    content_types: Iterable[ContentType] = None,
+    workers: int = DEFAULT_WORKERS,
+    max_frontier: int = DEFAULT_MAX_FRONTIER,
+    tenant_id: str = None
+) -> Iterator[ContentItem]:
+    # Items directly in the root are depth 1, max_depth=1 lists only the root.
+    # content_types filters what is yielded, folders are always expanded.
+    # At most `max_frontier` folders wait to be expanded. While the frontier is
+    # full, finished listings are held and only taken in as it drains, so memory
+    # stays bounded (about `workers` listings on top) and nothing is skipped.
+    # Every folder has one parent, so none is found twice and nothing else is kept.
+    wanted = set(content_types) if content_types else None
+    max_frontier = max(1, max_frontier)
+    root_id = resolve_root(api, user_id, root, tenant_id)
+    frontier: Deque[Tuple[str, int]] = deque([(root_id, 1)])
+    held: Deque[Tuple[int, Iterator[ContentItem]]] = deque()  # (depth, rest of a listing)
+    pool = ThreadPoolExecutor(max_workers=workers)
+    in_flight = {}
+    try:
+        while frontier or in_flight or held:
+            while frontier and len(in_flight) < workers:
+                folder_id, depth = frontier.popleft()
+                future = pool.submit(api.getFolderItems, user_id, folder_id)
+                in_flight[future] = depth
+            if not held or len(frontier) >= max_frontier:
+                done, _ = wait(list(in_flight), return_when=FIRST_COMPLETED)
+                for future in done:
+                    held.append((in_flight.pop(future), iter(future.result())))
+            while held and len(frontier) < max_frontier:
+                depth, items = held[0]
+                for item in items:
+                    expand = max_depth is None or depth < max_depth
+                    if item.contentType == ContentType.folder and expand:
+                        frontier.append((item.id, depth + 1))
+                    if wanted is None or item.contentType in wanted:
+                        yield item
+                    if len(frontier) >= max_frontier:
+                        break
+                else:
+                    held.popleft()
+    finally:
+        for future in in_flight:
+            future.cancel()
+        pool.shutdown(wait=True)
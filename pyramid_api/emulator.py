@@ -0,0 +1,1045 @@
+import argparse
+from collections import Counter
+import gzip
+from http.server import (
+    BaseHTTPRequestHandler,
+    ThreadingHTTPServer
+)
+import itertools
+import json
+import logging
+import math
+import random
+import threading
+import time
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    Union
+)
+import zlib
+
+from . import endpoints as ep
+from .api_types import (
+    ContentType,
+    MaterializedItemType,
+    SearchMatchType,
+    ValidRootFolderType
+)
+
+LOG = logging.getLogger(__name__)
+
+# Local stand-in for a Pyramid server: the /API2 endpoints API calls, served over
+# HTTP from in-memory state, with configurable latency, bandwidth and injected
+# faults. Like the real server it takes gzip / deflate request bodies and gzips
+# larger responses for clients that accept it. Seeded
+# users and content are computed from their ids instead of stored, so millions of
+# them cost no memory and any of them can still be looked up, listed or searched.
+#
+#   with Emulator(latency=LogNormal(0.02, 0.5), faults={'*': Fault(0.01)}) as emu:
+#       seed(emu.state, tenants=2, users=1_000_000, items=5_000_000)
+#       api = PasswordGrant(emu.url, 'admin', 'admin').get_api()
+#
+#   python -m pyramid_api.emulator --port 8080 --users 1000000 --items 5000000 \
+#       --latency lognormal:0.02:0.5 --error-rate 0.01 --bandwidth 10e6
+
+DEFAULT_ADMIN = ('admin', 'admin')
+SEEDED_PASSWORD = 'password'
+DEFAULT_SEARCH_LIMIT = 10000
+# smaller responses are not worth compressing
+COMPRESS_MIN_SIZE = 1024
+
+# answered as bare text rather than {'data': ...}, API reads them with _call_api
+PLAIN_TEXT_ENDPOINTS = frozenset([ep.AUTHENTICATE_USER, ep.RUN_SCHEDULE])
+
+
+class EmulatorError(Exception):
+    # answered as {'error': message}, which API raises as an APIException
+    pass
+
+
+##
+# --- Latency ---
+##
+
+class Fixed:
+
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+
+    def __call__(self, rng: random.Random) -> float:
+        return self.seconds
+
+
+class Uniform:
+
+    def __init__(self, low: float, high: float):
+        self.low = low
+        self.high = high
+
+    def __call__(self, rng: random.Random) -> float:
+        return rng.uniform(self.low, self.high)
+
+
+class LogNormal:
+    # long tailed like real server latency, `median` seconds, sigma of the log
+
+    def __init__(self, median: float, sigma: float = 0.5, cap: float = None):
+        self.median = median
+        self.sigma = sigma
+        self.cap = cap
+
+    def __call__(self, rng: random.Random) -> float:
+        value = rng.lognormvariate(math.log(self.median), self.sigma)
+        return value if self.cap is None else min(value, self.cap)
+
+
+LatencyModel = Callable[[random.Random], float]
+
+_LATENCY_MODELS = {'fixed': Fixed, 'uniform': Uniform, 'lognormal': LogNormal}
+
+
+def parse_latency(spec: str) -> LatencyModel:
+    # 'fixed:0.01', 'uniform:0.005:0.05' or 'lognormal:0.02:0.5', in seconds
+    name, *args = spec.split(':')
+    return _LATENCY_MODELS[name](*map(float, args))
+
+
+##
+# --- Faults ---
+##
+
+class Fault:
+    # Injected on `rate` of the calls:
+    #  status  - HTTP `status` with an error payload
+    #  error   - 200 with {'error': ...}, raised by API as APIException
+    #  stall   - the call hangs for `delay` seconds, then succeeds
+    #  reset   - the connection is closed without an answer
+
+    KINDS = ('status', 'error', 'stall', 'reset')
+
+    def __init__(self, rate: float, kind: str = 'status', status: int = 503, delay: float = 30.0):
+        if kind not in self.KINDS:
+            raise ValueError(f'unknown fault kind {kind}, expected one of {self.KINDS}')
+        self.rate = rate
+        self.kind = kind
+        self.status = status
+        self.delay = delay
+
+
+def _for_endpoint(config: Any, endpoint: str) -> Any:
+    # a single value, or a dict of endpoint -> value with '*' as the fallback
+    if isinstance(config, dict):
+        return config.get(endpoint, config.get('*'))
+    return config
+
+
+##
+# --- Seeded data ---
+##
+
+def _matches(value: str, text: str, match_type: int) -> bool:
+    value, text = (value or '').lower(), (text or '').lower()
+    if match_type == SearchMatchType.equals:
+        return value == text
+    if match_type == SearchMatchType.startswith:
+        return value.startswith(text)
+    if match_type == SearchMatchType.endswith:
+        return value.endswith(text)
+    if match_type == SearchMatchType.notcontains:
+        return text not in value
+    return text in value
+
+
+def _index(item_id: str, prefix: str, count: int) -> Optional[int]:
+    if not isinstance(item_id, str) or not item_id.startswith(prefix):
+        return None
+    try:
+        n = int(item_id[len(prefix):])
+    except ValueError:
+        return None
+    return n if 0 <= n < count else None
+
+
+class SeededContent:
+    # `count` items forming a complete `fanout`-ary tree under `parent_id`. Item n
+    # has id f'{prefix}{n}', the first `fanout` items sit directly in the parent
+    # and the children of item n are items (n + 1) * fanout ... + fanout - 1.
+    # Items with children are folders, the rest alternate between content types.
+
+    LEAF_TYPES = (ContentType.datadiscovery, ContentType.publisher, ContentType.storyboard)
+
+    def __init__(
+        self,
+        prefix: str,
+        tenant_id: str,
+        parent_id: str,
+        count: int,
+        fanout: int,
+        owner: str
+    ):
+        self.prefix = prefix
+        self.tenant_id = tenant_id
+        self.parent_id = parent_id
+        self.count = count
+        self.fanout = fanout
+        self.owner = owner
+
+    def __len__(self) -> int:
+        return self.count
+
+    def index(self, item_id: str) -> Optional[int]:
+        return _index(item_id, self.prefix, self.count)
+
+    def item(self, n: int) -> Dict[str, Any]:
+        is_folder = (n + 1) * self.fanout < self.count
+        leaf_type = self.LEAF_TYPES[n % len(self.LEAF_TYPES)]
+        content_type = ContentType.folder if is_folder else leaf_type
+        return {
+            'id': f'{self.prefix}{n}',
+            'parentId':
+                self.parent_id if n < self.fanout else f'{self.prefix}{n // self.fanout - 1}',
+            'caption': f'Folder {n}' if is_folder else f'Report {n}',
+            'itemType': 1,
+            'contentType': int(content_type),
+            'createdBy': self.owner,
+            'createdDate': 1600000000 + n,
+            'version': '1',
+            'modifiedDate': '2021-01-01T00:00:00',
+            'tenantId': self.tenant_id,
+            'description': None
+        }
+
+    def children(self, folder_id: str) -> List[Dict[str, Any]]:
+        if folder_id == self.parent_id:
+            first = 0
+        else:
+            n = self.index(folder_id)
+            if n is None:
+                return []
+            first = (n + 1) * self.fanout
+        return [self.item(i) for i in range(first, min(first + self.fanout, self.count))]
+
+    def search(self, text: str, match_type: int, types: List[int]) -> Iterator[Dict[str, Any]]:
+        for n in range(self.count):
+            item = self.item(n)
+            wanted = not types or item['contentType'] in types
+            if wanted and _matches(item['caption'], text, match_type):
+                yield item
+
+
+class SeededUsers:
+    # `count` users of a tenant, user n is f'{id_prefix}{n}' named f'{name_prefix}{n}'
+
+    def __init__(
+        self,
+        id_prefix: str,
+        name_prefix: str,
+        tenant_id: str,
+        count: int,
+        role_ids: List[str]
+    ):
+        self.id_prefix = id_prefix
+        self.name_prefix = name_prefix
+        self.tenant_id = tenant_id
+        self.count = count
+        self.role_ids = role_ids
+
+    def __len__(self) -> int:
+        return self.count
+
+    def user(self, n: int) -> Dict[str, Any]:
+        return {
+            'tenantId': self.tenant_id,
+            'userName': f'{self.name_prefix}{n}',
+            'roleIds': list(self.role_ids),
+            'clientLicenseType': 200,
+            'id': f'{self.id_prefix}{n}',
+            'firstName': 'Seeded',
+            'lastName': f'User {n}',
+            'email': f'{self.name_prefix}{n}@example.com',
+            'adminType': 0,
+            'statusID': 1,
+            'createdDate': 1600000000 + n,
+            'lastLoginDate': 0
+        }
+
+    def by_id(self, user_id: str) -> Optional[Dict[str, Any]]:
+        n = _index(user_id, self.id_prefix, self.count)
+        return None if n is None else self.user(n)
+
+    def by_name(self, name: str) -> Optional[Dict[str, Any]]:
+        n = _index(name, self.name_prefix, self.count)
+        return None if n is None else self.user(n)
+
+
+##
+# --- State ---
+##
+
+def _modified(*items: Tuple[str, str]) -> Dict[str, Any]:
+    return {
+        'success': True,
+        'modifiedList': [{'id': i, 'name': n} for i, n in items],
+        'errorMessage': None
+    }
+
+
+def _failed(message: str) -> Dict[str, Any]:
+    return {'success': False, 'modifiedList': [], 'errorMessage': message}
+
+
+class EmulatorState:
+    # In-memory model of one Pyramid instance. Every handler is named after the
+    # last segment of its endpoint and receives the request body and the caller.
+
+    def __init__(
+        self,
+        admin: Tuple[str, str] = DEFAULT_ADMIN,
+        search_limit: int = DEFAULT_SEARCH_LIMIT
+    ):
+        self.lock = threading.RLock()
+        self.search_limit = search_limit
+        self._ids = itertools.count(1)
+        self.tenants: Dict[str, Dict] = {}
+        self.users: Dict[str, Dict] = {}
+        self.passwords: Dict[str, str] = {}
+        self.tokens: Dict[str, str] = {}
+        self.roles: Dict[str, Dict] = {}
+        self.servers: Dict[str, Dict] = {}
+        self.databases: Dict[str, Dict] = {}
+        self.models: Dict[str, Dict] = {}
+        self.connection_strings: Dict[str, Dict] = {}
+        self.content: Dict[str, Dict] = {}
+        self.children: Dict[str, List[str]] = {}
+        self.item_connections: Dict[str, List[str]] = {}
+        self.grants: Dict[str, Dict[str, int]] = {}
+        self.seeded_content: List[SeededContent] = []
+        self.seeded_users: List[SeededUsers] = []
+        self.imports: List[Dict] = []
+        self.schedules_run: List[str] = []
+        self.default_tenant = self.add_tenant('default', 'default')
+        admin_name, admin_password = admin
+        self.admin = self.add_user(self.default_tenant, admin_name, admin_password, adminType=1)
+
+    def new_id(self, kind: str) -> str:
+        return f'{kind}-{next(self._ids)}'
+
+    ##
+    # --- Building blocks, also used by seed() ---
+    ##
+
+    def add_tenant(self, name: str, tenant_id: str = None, **fields) -> str:
+        with self.lock:
+            tenant_id = tenant_id or self.new_id('tenant')
+            self.tenants[tenant_id] = {
+                'id': tenant_id, 'name': name, 'viewerSeats': 0, 'usedViewerSeats': 0,
+                'proSeats': 0, 'usedProSeats': 0,
+                'tenantSettings': {'showGroupFolder': fields.pop('showGroupFolder', False)},
+                **fields
+            }
+            for kind in ('public', 'group'):
+                folder_id = f'{tenant_id}:{kind}'
+                self.content[folder_id] = self._folder(folder_id, None, kind, tenant_id)
+            return tenant_id
+
+    def add_user(self, tenant_id: str, name: str, password: str = None, **fields) -> str:
+        with self.lock:
+            user_id = fields.pop('id', None) or self.new_id('user')
+            self.users[user_id] = {
+                'tenantId': tenant_id, 'userName': name, 'roleIds': [], 'clientLicenseType': 200,
+                'id': user_id, 'adminType': 0, 'statusID': 1, 'createdDate': int(time.time()),
+                'lastLoginDate': 0, **fields
+            }
+            if password is not None:
+                self.passwords[name] = password
+            return user_id
+
+    def add_content(
+        self,
+        parent_id: str,
+        caption: str,
+        content_type: int,
+        tenant_id: str,
+        owner: str
+    ) -> str:
+        with self.lock:
+            item_id = self.new_id('item')
+            item = self._folder(item_id, parent_id, caption, tenant_id, owner)
+            item['contentType'] = int(content_type)
+            self.content[item_id] = item
+            self.children.setdefault(parent_id, []).append(item_id)
+            return item_id
+
+    def _folder(
+        self,
+        folder_id: str,
+        parent_id: Optional[str],
+        caption: str,
+        tenant_id: str,
+        owner: str = 'admin'
+    ):
+        return {
+            'id': folder_id, 'parentId': parent_id, 'caption': caption, 'itemType': 1,
+            'contentType': int(ContentType.folder), 'createdBy': owner,
+            'createdDate': int(time.time()),
+            'version': '1', 'modifiedDate': None, 'tenantId': tenant_id, 'description': None
+        }
+
+    ##
+    # --- Lookups ---
+    ##
+
+    def user(self, user_id: str) -> Dict:
+        user = self.users.get(user_id)
+        if user is None:
+            for seeded in self.seeded_users:
+                user = seeded.by_id(user_id)
+                if user is not None:
+                    break
+        if user is None:
+            raise EmulatorError(f'user {user_id} not found')
+        return user
+
+    def users_named(self, name: str) -> List[Dict]:
+        found = [u for u in self.users.values() if u['userName'] == name]
+        for seeded in self.seeded_users:
+            user = seeded.by_name(name)
+            if user is not None:
+                found.append(user)
+        return found
+
+    def item(self, item_id: str) -> Dict:
+        item = self.content.get(item_id)
+        if item is None:
+            for seeded in self.seeded_content:
+                n = seeded.index(item_id)
+                if n is not None:
+                    return seeded.item(n)
+            raise EmulatorError(f'item {item_id} not found')
+        return item
+
+    def tenant(self, tenant_id: str) -> Dict:
+        tenant = self.tenants.get(tenant_id)
+        if tenant is None:
+            raise EmulatorError(f'tenant {tenant_id} not found')
+        return tenant
+
+    def caller(self, token: str) -> Optional[Dict]:
+        user_id = self.tokens.get(token)
+        return None if user_id is None else self.user(user_id)
+
+    def _private_root(self, user_id: str) -> Dict:
+        user = self.user(user_id)
+        folder_id = f'{user_id}:private'
+        with self.lock:
+            if folder_id not in self.content:
+                self.content[folder_id] = self._folder(
+                    folder_id, None, 'private', user['tenantId'], user['userName'])
+            return self.content[folder_id]
+
+    ##
+    # --- Auth and identity ---
+    ##
+
+    def authenticateUser(self, body: Dict, caller: Dict) -> str:
+        data = body.get('data') or {}
+        name, password = data.get('userName'), data.get('password')
+        users = self.users_named(name)
+        expected = self.passwords.get(name, SEEDED_PASSWORD if users else None)
+        if not users or expected is None or password != expected:
+            raise PermissionError('invalid credentials')
+        token = f'token-{random.getrandbits(64):016x}'
+        with self.lock:
+            self.tokens[token] = users[0]['id']
+        return token
+
+    def getMe(self, body: Dict, caller: Dict) -> Dict:
+        return caller
+
+    def getUsersByName(self, body: Dict, caller: Dict) -> List[Dict]:
+        return self.users_named(body.get('userName'))
+
+    def getRolesByName(self, body: Dict, caller: Dict) -> List[Dict]:
+        name = body.get('roleName')
+        with self.lock:
+            return [dict(r) for r in self.roles.values() if r.get('roleName') == name]
+
+    def getNotificationIndicators(self, body: Dict, caller: Dict) -> Dict:
+        self.user(body.get('userId'))
+        return {'models': 0, 'subscriptions': 0, 'alerts': 0, 'publications': 0, 'conversations': 0}
+
+    ##
+    # --- Content ---
+    ##
+
+    def createNewFolder(self, body: Dict, caller: Dict) -> Dict:
+        folder = body['folderTenantObject']
+        parent = self.item(folder['parentFolderId'])
+        if parent['contentType'] != ContentType.folder:
+            return _failed(f'{parent["id"]} is not a folder')
+        name = folder['folderName']
+        # checked and added at once, concurrent creates of one name make one folder
+        with self.lock:
+            for child_id in self.children.get(parent['id'], []):
+                if self.content[child_id]['caption'] == name:
+                    return _failed(f'{name} already exists')
+            folder_id = self.add_content(
+                parent['id'], name, ContentType.folder, parent['tenantId'], caller['userName'])
+        return _modified((folder_id, name))
+
+    def findContentItem(self, body: Dict, caller: Dict) -> List[Dict]:
+        params = body['searchParams']
+        text = params.get('searchString', '')
+        match_type = params.get('searchMatchType', SearchMatchType.contains)
+        types = params.get('filterTypes') or []
+        found = []
+        for item in itertools.chain(
+            [i for i in self.content.values() if i['parentId'] is not None],
+            *[s.search(text, match_type, types) for s in self.seeded_content]
+        ):
+            wanted = not types or item['contentType'] in types
+            if wanted and _matches(item['caption'], text, match_type):
+                found.append(item)
+                if len(found) >= self.search_limit:
+                    break
+        return found
+
+    def getUserPublicRootFolder(self, body: Dict, caller: Dict) -> Dict:
+        return self.content[f'{self.user(body["userId"])["tenantId"]}:public']
+
+    def getUserGroupRootFolder(self, body: Dict, caller: Dict) -> Dict:
+        return self.content[f'{self.user(body["userId"])["tenantId"]}:group']
+
+    def getPrivateRootFolder(self, body: Dict, caller: Dict) -> Dict:
+        return self._private_root(body['userId'])
+
+    def getPrivateFolderForUser(self, body: Dict, caller: Dict) -> Dict:
+        return self._private_root(body['userId'])
+
+    def getPublicOrGroupFolderByTenantId(self, body: Dict, caller: Dict) -> Dict:
+        folder = body['folderTenantObject']
+        tenant_id = self.tenant(folder['tenantId'])['id']
+        group = folder.get('validRootFolderType') == ValidRootFolderType.group
+        kind = 'group' if group else 'public'
+        return self.content[f'{tenant_id}:{kind}']
+
+    def getFolderItems(self, body: Dict, caller: Dict) -> List[Dict]:
+        folder_id = body['folderId']
+        self.item(folder_id)
+        items = [self.content[i] for i in self.children.get(folder_id, [])]
+        for seeded in self.seeded_content:
+            items.extend(seeded.children(folder_id))
+        return items
+
+    def importContent(self, body: Dict, caller: Dict) -> Dict:
+        obj = body['pieApiObject']
+        parent = self.item(obj['rootFolderId'])
+        data = obj.get('fileZippedData') or ''
+        item_id = self.add_content(
+            parent['id'], f'import {len(self.imports) + 1}', ContentType.datadiscovery,
+            parent['tenantId'], caller['userName'])
+        with self.lock:
+            self.imports.append({'id': item_id, 'bytes': len(data), 'roleIds': obj.get('roleIds')})
+        return {'importDscMap': [], 'failedItems': []}
+
+    def addRoleToItem(self, body: Dict, caller: Dict) -> Dict:
+        data = body['roleToItemApiData']
+        item_id = self.item(data['itemId'])['id']
+        return self._grant(item_id, data['roleId'], data.get('accessType', 1))
+
+    ##
+    # --- Management ---
+    ##
+
+    def createTenant(self, body: Dict, caller: Dict) -> Dict:
+        tenant = body['tenant']
+        name = tenant.get('name')
+        if any(t['name'] == name for t in self.tenants.values()):
+            return _failed(f'tenant {name} already exists')
+        if tenant.get('id') in self.tenants:
+            return _failed(f'tenant {tenant["id"]} already exists')
+        tenant_id = self.add_tenant(
+            name, tenant.get('id') or None, viewerSeats=tenant.get('viewerSeats', 0),
+            proSeats=tenant.get('proSeats', 0),
+            showGroupFolder=tenant.get('showGroupFolder', False))
+        return _modified((tenant_id, name))
+
+    def getTenantByName(self, body: Dict, caller: Dict) -> Dict:
+        name = body.get('tenantName')
+        for tenant in self.tenants.values():
+            if tenant['name'] == name:
+                return tenant
+        raise EmulatorError(f'tenant {name} not found')
+
+    def deleteTenants(self, body: Dict, caller: Dict) -> Dict:
+        data = body['data']
+        deleted = []
+        with self.lock:
+            for tenant_id in data.get('tenantIds', []):
+                tenant = self.tenants.pop(tenant_id, None)
+                if tenant is None:
+                    continue
+                deleted.append((tenant_id, tenant['name']))
+                if data.get('deleteUsers'):
+                    user_ids = [
+                        u for u, user in self.users.items() if user['tenantId'] == tenant_id]
+                    for user_id in user_ids:
+                        self.passwords.pop(self.users.pop(user_id)['userName'], None)
+                    self.seeded_users = [s for s in self.seeded_users if s.tenant_id != tenant_id]
+                if data.get('deleteServers'):
+                    server_ids = [
+                        s for s, server in self.servers.items() if server['tenantId'] == tenant_id]
+                    for server_id in server_ids:
+                        del self.servers[server_id]
+                item_ids = [i for i, item in self.content.items() if item['tenantId'] == tenant_id]
+                for item_id in item_ids:
+                    del self.content[item_id]
+                    self.children.pop(item_id, None)
+                self.seeded_content = [s for s in self.seeded_content if s.tenant_id != tenant_id]
+        return _modified(*deleted)
+
+    def createRole(self, body: Dict, caller: Dict) -> Dict:
+        role = dict(body['roleData'])
+        self.tenant(role.get('tenantId'))
+        with self.lock:
+            role['roleId'] = role.get('roleId') or self.new_id('role')
+            self.roles[role['roleId']] = role
+        return _modified((role['roleId'], role.get('roleName')))
+
+    def createUserDb(self, body: Dict, caller: Dict) -> Dict:
+        user = dict(body['user'])
+        name = user.pop('userName', None)
+        tenant_id = user.pop('tenantId', None)
+        if tenant_id not in self.tenants:
+            return _failed(f'tenant {tenant_id} not found')
+        if not name or self.users_named(name):
+            return _failed(f'user {name} already exists')
+        password = user.pop('password', None)
+        user_id = self.add_user(tenant_id, name, password, **user)
+        return _modified((user_id, name))
+
+    ##
+    # --- Data sources ---
+    ##
+
+    def createDataServer(self, body: Dict, caller: Dict) -> Dict:
+        server = dict(body['serverData'])
+        server.pop('password', None)
+        with self.lock:
+            server['id'] = server.get('id') or self.new_id('server')
+            server.setdefault('tenantId', caller['tenantId'])
+            self.servers[server['id']] = server
+        return _modified((server['id'], server.get('serverName')))
+
+    def _grant(self, item_id: str, role_id: str, access: int) -> Dict:
+        if role_id not in self.roles:
+            return _failed(f'role {role_id} not found')
+        with self.lock:
+            self.grants.setdefault(item_id, {})[role_id] = access
+        return _modified((item_id, None))
+
+    def _grant_pairs(self, body: Dict, known: Dict[str, Dict]) -> Dict:
+        roles = body['itemRoles']
+        item_id = roles['itemId']
+        if item_id not in known:
+            return _failed(f'{item_id} not found')
+        for pair in roles.get('itemRolePairList', []):
+            res = self._grant(item_id, pair['roleId'], pair.get('accessType', 1))
+            if not res['success']:
+                return res
+        return _modified((item_id, None))
+
+    def addRolesToServer(self, body: Dict, caller: Dict) -> Dict:
+        return self._grant_pairs(body, self.servers)
+
+    def addRolesToDataBase(self, body: Dict, caller: Dict) -> Dict:
+        # used for databases and models alike
+        return self._grant_pairs(body, {**self.databases, **self.models})
+
+    def recognizeDataBase(self, body: Dict, caller: Dict) -> Dict:
+        obj = body['dataBaseRecognitionObject']
+        server = self.servers.get(obj['serverId'])
+        if server is None:
+            return _failed(f'server {obj["serverId"]} not found')
+        with self.lock:
+            db_id = self.new_id('db')
+            self.databases[db_id] = {
+                'id': db_id, 'name': obj['dbName'], 'serverId': server['id'],
+                'tenantId': server['tenantId']}
+        return _modified((db_id, obj['dbName']))
+
+    def importModel(self, body: Dict, caller: Dict) -> str:
+        obj = body['modelApiObject']
+        database = self.databases.get(obj['databaseId'])
+        if database is None:
+            raise EmulatorError(f'database {obj["databaseId"]} not found')
+        server = self.servers[database['serverId']]
+        with self.lock:
+            model_id = self.new_id('model')
+            self.models[model_id] = {
+                'id': model_id, 'name': f'model {model_id}', 'databaseId': database['id'],
+                'tenantId': database['tenantId'], 'bytes': len(obj.get('fileZippedData') or '')}
+            conn_id = self.new_id('conn')
+            self.connection_strings[conn_id] = {
+                'id': conn_id, 'modelId': model_id, 'modelName': self.models[model_id]['name'],
+                'serverId': server['id'], 'serverName': server.get('serverName'),
+                'dataBaseId': database['id'], 'dataBaseName': database['name'],
+                'connectionStringType': server.get('serverType', 0), 'isDynamicModel': False}
+        return model_id
+
+    def getDataSourcesByTenant(self, body: Dict, caller: Dict) -> List[Dict]:
+        tenant_id = self.tenant(body['tenantId'])['id']
+        items = []
+        for kind, source, caption in (
+            (MaterializedItemType.server, self.servers, 'serverName'),
+            (MaterializedItemType.database, self.databases, 'name'),
+            (MaterializedItemType.model, self.models, 'name'),
+        ):
+            items.extend(
+                {'itemId': i, 'itemCaption': v.get(caption), 'itemType': int(kind)}
+                for i, v in source.items() if v.get('tenantId') == tenant_id)
+        return items
+
+    def getAllConnectionStrings(self, body: Dict, caller: Dict) -> List[Dict]:
+        return list(self.connection_strings.values())
+
+    def getItemConnectionString(self, body: Dict, caller: Dict) -> List[Dict]:
+        item_id = body['pyramidItemIdentifier']['itemId']
+        return [self.connection_strings[c] for c in self.item_connections.get(item_id, [])]
+
+    def changeDataSource(self, body: Dict, caller: Dict) -> Dict:
+        data = body['dscApiData']
+        if data['toConnId'] not in self.connection_strings:
+            return _failed(f'connection {data["toConnId"]} not found')
+        with self.lock:
+            conns = self.item_connections.setdefault(data['itemId'], [])
+            if data['fromConnId'] in conns:
+                conns.remove(data['fromConnId'])
+            conns.append(data['toConnId'])
+        return _modified((data['itemId'], None))
+
+    def findServerByName(self, body: Dict, caller: Dict) -> List[Dict]:
+        criteria = body['searchCriteria']
+        match_type = criteria.get('searchMatchType', SearchMatchType.contains)
+        return [
+            {
+                'itemId': i,
+                'itemCaption': s.get('serverName'),
+                'itemType': int(MaterializedItemType.server)
+            }
+            for i, s in self.servers.items()
+            if _matches(s.get('serverName'), criteria.get('searchValue'), match_type)
+        ]
+
+    ##
+    # --- Tasks ---
+    ##
+
+    def reRunTask(self, body: Dict, caller: Dict) -> Dict:
+        return _modified((body['taskId'], None))
+
+    def runSchedule(self, body: Dict, caller: Dict) -> str:
+        with self.lock:
+            self.schedules_run.append(body['data']['scheduleId'])
+            return self.new_id('job')
+
+    ##
+    # --- Dispatch ---
+    ##
+
+    def handle(self, endpoint: str, body: Dict) -> Tuple[int, Any]:
+        name = endpoint.rsplit('/', 1)[-1]
+        handler = getattr(self, name, None) if endpoint.startswith('/API2/') else None
+        if handler is None:
+            return 404, {'error': f'unknown endpoint {endpoint}'}
+        try:
+            caller = None
+            if endpoint != ep.AUTHENTICATE_USER:
+                caller = self.caller((body or {}).get('auth'))
+                if caller is None:
+                    return 401, {'error': 'invalid token'}
+            result = handler(body, caller)
+            return 200, result if endpoint in PLAIN_TEXT_ENDPOINTS else {'data': result}
+        except PermissionError as err:
+            return 401, {'error': str(err)}
+        except EmulatorError as err:
+            return 200, {'error': str(err)}
+        except (KeyError, TypeError, AttributeError) as err:
+            return 400, {'error': f'malformed request: {err!r}'}
+
+
+def seed(
+    state: EmulatorState,
+    tenants: int = 1,
+    users: int = 1000,
+    items: int = 10000,
+    fanout: int = 50,
+    servers: int = 1,
+    databases: int = 2
+) -> List[str]:
+    # Adds `tenants` tenants, each with `users` users and `items` content items in
+    # its public folder, plus a role, servers, databases and one model per database.
+    # Users and items are virtual (see SeededContent / SeededUsers), the password
+    # of every seeded user is SEEDED_PASSWORD. Returns the new tenant ids.
+    ids = []
+    with state.lock:
+        for t in range(tenants):
+            name = f'tenant{len(state.tenants)}'
+            tenant_id = state.add_tenant(name)
+            ids.append(tenant_id)
+            role_id = state.new_id('role')
+            state.roles[role_id] = {
+                'tenantId': tenant_id, 'roleName': f'{name} users', 'roleId': role_id}
+            state.seeded_users.append(
+                SeededUsers(f'{tenant_id}:u', f'{name}.user', tenant_id, users, [role_id]))
+            state.seeded_content.append(
+                SeededContent(
+                    f'{tenant_id}:c', tenant_id, f'{tenant_id}:public', items, fanout, 'admin'))
+            for s in range(servers):
+                server_id = state.new_id('server')
+                state.servers[server_id] = {
+                    'id': server_id, 'serverName': f'{name}-pg{s}', 'port': 5432,
+                    'serverType': 8, 'tenantId': tenant_id}
+                for d in range(databases):
+                    db_id = state.new_id('db')
+                    state.databases[db_id] = {
+                        'id': db_id, 'name': f'sales_{s}_{d}', 'serverId': server_id,
+                        'tenantId': tenant_id}
+                    state.importModel(
+                        {'modelApiObject': {'databaseId': db_id}}, state.admin)
+    return ids
+
+
+##
+# --- HTTP ---
+##
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    emulator: 'Emulator' = None
+
+    def _read_body(self) -> bytes:
+        if self.headers.get('Transfer-Encoding', '').lower() == 'chunked':
+            chunks = []
+            while True:
+                size = int(self.rfile.readline().split(b';')[0], 16)
+                if size == 0:
+                    self.rfile.readline()
+                    return b''.join(chunks)
+                chunks.append(self.rfile.read(size))
+                self.rfile.readline()
+        return self.rfile.read(int(self.headers.get('Content-Length', 0)))
+
+    def _inflate(self, raw: bytes) -> bytes:
+        encoding = self.headers.get('Content-Encoding', '').lower()
+        if encoding == 'gzip':
+            return gzip.decompress(raw)
+        if encoding == 'deflate':
+            return zlib.decompress(raw)
+        return raw
+
+    def _send(self, status: int, payload: Any):
+        if isinstance(payload, str):
+            data, content_type = payload.encode('utf-8'), 'text/plain'
+        else:
+            data, content_type = json.dumps(payload).encode('utf-8'), 'application/json'
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        accepted = self.headers.get('Accept-Encoding', '').lower()
+        compress = self.emulator.compress_responses and len(data) >= COMPRESS_MIN_SIZE
+        if compress and 'gzip' in accepted:
+            data = gzip.compress(data, compresslevel=6)
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.emulator.transfer('out', len(data))
+        self.wfile.write(data)
+
+    def do_HEAD(self):
+        self.send_response(200)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def do_POST(self):
+        emulator = self.emulator
+        raw = self._read_body()
+        emulator.transfer('in', len(raw))
+        try:
+            raw = self._inflate(raw)
+            body = json.loads(raw) if raw else None
+        except (OSError, ValueError, zlib.error):
+            self._send(400, {'error': 'body is not JSON'})
+            return
+        status, payload = emulator.call(self.path, body)
+        if status is None:
+            # injected connection reset
+            self.close_connection = True
+            return
+        self._send(status, payload)
+
+    def log_message(self, format, *args):
+        LOG.debug(format, *args)
+
+
+class Emulator:
+    # Serves an EmulatorState over HTTP on a background thread. `latency` is a
+    # model or {endpoint: model} ('*' for the rest), `faults` a Fault or
+    # {endpoint: Fault}. `bandwidth` (bytes/s) delays every request and response
+    # body by its size on the wire, per connection. `seed` makes latency and
+    # faults reproducible.
+
+    def __init__(
+        self,
+        state: EmulatorState = None,
+        latency: Union[LatencyModel, Dict[str, LatencyModel]] = None,
+        faults: Union[Fault, Dict[str, Fault]] = None,
+        host: str = '127.0.0.1',
+        port: int = 0,
+        seed: int = None,
+        bandwidth: float = None,
+        compress_responses: bool = True
+    ):
+        self.state = state or EmulatorState()
+        self.latency = latency
+        self.faults = faults
+        self.bandwidth = bandwidth
+        self.compress_responses = compress_responses
+        self.calls: Counter = Counter()
+        self.wire_bytes: Counter = Counter()  # 'in' / 'out' -> body bytes as sent
+        self.injected: Counter = Counter()
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        handler = type('Handler', (_Handler,), {'emulator': self})
+        self.server = ThreadingHTTPServer((host, port), handler)
+        self.server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self) -> 'Emulator':
+        self._thread = threading.Thread(
+            target=self.server.serve_forever, name='pyramid-emulator', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self) -> 'Emulator':
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _draw(self, endpoint: str) -> Tuple[float, Optional[Fault]]:
+        with self._lock:
+            model = _for_endpoint(self.latency, endpoint)
+            delay = model(self._rng) if model is not None else 0.0
+            fault = _for_endpoint(self.faults, endpoint)
+            if fault is not None and self._rng.random() >= fault.rate:
+                fault = None
+            return delay, fault
+
+    def transfer(self, direction: str, size: int):
+        # counts a body crossing the wire and takes as long as the bandwidth needs
+        with self._lock:
+            self.wire_bytes[direction] += size
+        if self.bandwidth:
+            time.sleep(size / self.bandwidth)
+
+    def call(self, endpoint: str, body: Any) -> Tuple[Optional[int], Any]:
+        # status None means: drop the connection
+        with self._lock:
+            self.calls[endpoint] += 1
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        try:
+            delay, fault = self._draw(endpoint)
+            if fault is not None:
+                with self._lock:
+                    self.injected[fault.kind] += 1
+                if fault.kind == 'stall':
+                    delay += fault.delay
+            if delay:
+                time.sleep(delay)
+            if fault is not None and fault.kind == 'reset':
+                return None, None
+            if fault is not None and fault.kind == 'status':
+                return fault.status, {'error': f'injected {fault.status}'}
+            if fault is not None and fault.kind == 'error':
+                return 200, {'error': 'injected error'}
+            return self.state.handle(endpoint, body)
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'calls': dict(self.calls),
+            'injected': dict(self.injected),
+            'peak_in_flight': self.peak_in_flight,
+            'bytes_in': self.wire_bytes['in'],
+            'bytes_out': self.wire_bytes['out']
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local Pyramid /API2 emulator')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--tenants', type=int, default=1)
+    parser.add_argument('--users', type=int, default=1000, help='seeded users per tenant')
+    parser.add_argument('--items', type=int, default=10000, help='seeded content items per tenant')
+    parser.add_argument('--fanout', type=int, default=50, help='items per seeded folder')
+    parser.add_argument(
+        '--latency', help="ie 'fixed:0.01', 'uniform:0.005:0.05', 'lognormal:0.02:0.5'")
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--error-kind', default='status', choices=Fault.KINDS)
+    parser.add_argument('--error-status', type=int, default=503)
+    parser.add_argument('--bandwidth', type=float, help='bytes/s per connection, ie 10e6')
+    parser.add_argument('--no-compression', action='store_true', help='never gzip responses')
+    parser.add_argument('--seed', type=int)
+    parser.add_argument('--admin', default=':'.join(DEFAULT_ADMIN), help='user:password')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    state = EmulatorState(admin=tuple(args.admin.split(':', 1)))
+    tenant_ids = seed(state, args.tenants, args.users, args.items, args.fanout)
+    emulator = Emulator(
+        state,
+        latency=parse_latency(args.latency) if args.latency else None,
+        faults=(
+            Fault(args.error_rate, args.error_kind, args.error_status)
+            if args.error_rate else None),
+        host=args.host,
+        port=args.port,
+        seed=args.seed,
+        bandwidth=args.bandwidth,
+        compress_responses=not args.no_compression
+    )
+    LOG.info(f'seeded tenants {", ".join(tenant_ids)}, serving on {emulator.url}')
+    try:
+        emulator.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        emulator.server.server_close()
+
+
+if __name__ == '__main__':
+    main()
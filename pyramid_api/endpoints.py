@@ -0,0 +1,100 @@
+from typing import (
+    Dict,
+    FrozenSet
+)
+
+# Catalog of the /API2 endpoints used by API, shared by the layers in _call_api
+# that need to know which calls are safe to cache, repeat or coalesce.
+
+##
+# --- Reads ---
+##
+
+GET_ME = '/API2/access/getMe'
+GET_TENANT_BY_NAME = '/API2/access/getTenantByName'
+GET_USERS_BY_NAME = '/API2/access/getUsersByName'
+GET_ROLES_BY_NAME = '/API2/access/getRolesByName'
+GET_NOTIFICATION_INDICATORS = '/API2/notification/getNotificationIndicators'
+FIND_CONTENT_ITEM = '/API2/content/findContentItem'
+GET_FOLDER_ITEMS = '/API2/content/getFolderItems'
+GET_USER_PUBLIC_ROOT_FOLDER = '/API2/content/getUserPublicRootFolder'
+GET_PRIVATE_ROOT_FOLDER = '/API2/content/getPrivateRootFolder'
+GET_PRIVATE_FOLDER_FOR_USER = '/API2/content/getPrivateFolderForUser'
+GET_USER_GROUP_ROOT_FOLDER = '/API2/content/getUserGroupRootFolder'
+GET_PUBLIC_OR_GROUP_FOLDER_BY_TENANT_ID = '/API2/content/getPublicOrGroupFolderByTenantId'
+FIND_SERVER_BY_NAME = '/API2/dataSources/findServerByName'
+GET_ALL_CONNECTION_STRINGS = '/API2/dataSources/getAllConnectionStrings'
+GET_DATA_SOURCES_BY_TENANT = '/API2/dataSources/getDataSourcesByTenant'
+GET_ITEM_CONNECTION_STRING = '/API2/dataSources/getItemConnectionString'
+
+##
+# --- Writes ---
+##
+
+AUTHENTICATE_USER = '/API2/auth/authenticateUser'
+CREATE_TENANT = '/API2/access/createTenant'
+DELETE_TENANTS = '/API2/access/deleteTenants'
+CREATE_ROLE = '/API2/access/createRole'
+CREATE_USER_DB = '/API2/access/createUserDb'
+CREATE_NEW_FOLDER = '/API2/content/createNewFolder'
+IMPORT_CONTENT = '/API2/content/importContent'
+ADD_ROLE_TO_ITEM = '/API2/content/addRoleToItem'
+CREATE_DATA_SERVER = '/API2/dataSources/createDataServer'
+ADD_ROLES_TO_SERVER = '/API2/dataSources/addRolesToServer'
+ADD_ROLES_TO_DATABASE = '/API2/dataSources/addRolesToDataBase'
+CHANGE_DATA_SOURCE = '/API2/dataSources/changeDataSource'
+IMPORT_MODEL = '/API2/dataSources/importModel'
+RECOGNIZE_DATABASE = '/API2/dataSources/recognizeDataBase'
+RERUN_TASK = '/API2/tasks/reRunTask'
+RUN_SCHEDULE = '/API2/tasks/runSchedule'
+
+# idempotent, side effect free calls
+READ_ENDPOINTS: FrozenSet[str] = frozenset([
+    GET_ME,
+    GET_TENANT_BY_NAME,
+    GET_USERS_BY_NAME,
+    GET_ROLES_BY_NAME,
+    GET_NOTIFICATION_INDICATORS,
+    FIND_CONTENT_ITEM,
+    GET_FOLDER_ITEMS,
+    GET_USER_PUBLIC_ROOT_FOLDER,
+    GET_PRIVATE_ROOT_FOLDER,
+    GET_PRIVATE_FOLDER_FOR_USER,
+    GET_USER_GROUP_ROOT_FOLDER,
+    GET_PUBLIC_OR_GROUP_FOLDER_BY_TENANT_ID,
+    FIND_SERVER_BY_NAME,
+    GET_ALL_CONNECTION_STRINGS,
+    GET_DATA_SOURCES_BY_TENANT,
+    GET_ITEM_CONNECTION_STRING,
+])
+
+_CONTENT_READS = frozenset([
+    FIND_CONTENT_ITEM,
+    GET_FOLDER_ITEMS,
+])
+
+_DATA_SOURCE_READS = frozenset([
+    FIND_SERVER_BY_NAME,
+    GET_ALL_CONNECTION_STRINGS,
+    GET_DATA_SOURCES_BY_TENANT,
+    GET_ITEM_CONNECTION_STRING,
+])
+
+# reads whose answers may change after a successful write. Writes missing from
+# here (ie tasks) are assumed to touch everything.
+INVALIDATES: Dict[str, FrozenSet[str]] = {
+    AUTHENTICATE_USER: frozenset(),
+    CREATE_TENANT: frozenset([GET_TENANT_BY_NAME, GET_PUBLIC_OR_GROUP_FOLDER_BY_TENANT_ID]),
+    DELETE_TENANTS: READ_ENDPOINTS,
+    CREATE_ROLE: frozenset([GET_ROLES_BY_NAME]),
+    CREATE_USER_DB: frozenset([GET_USERS_BY_NAME]),
+    CREATE_NEW_FOLDER: _CONTENT_READS,
+    IMPORT_CONTENT: _CONTENT_READS | _DATA_SOURCE_READS,
+    ADD_ROLE_TO_ITEM: _CONTENT_READS,
+    CREATE_DATA_SERVER: _DATA_SOURCE_READS,
+    ADD_ROLES_TO_SERVER: _DATA_SOURCE_READS,
+    ADD_ROLES_TO_DATABASE: _DATA_SOURCE_READS,
+    CHANGE_DATA_SOURCE: _DATA_SOURCE_READS,
+    IMPORT_MODEL: _DATA_SOURCE_READS,
+    RECOGNIZE_DATABASE: _DATA_SOURCE_READS,
+}
@@ -1,11 +1,21 @@
 from dataclasses import dataclass
 import json
 from string import Template
-from typing import Any
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    Set
+)
 
 from dataclasses_json import DataClassJsonMixin
 
 from . import api_types
+from .codecs import decoder
 
 
 @dataclass
@@ -41,6 +51,11 @@ class WrappedType(DataClassJsonMixin):
                     obj = obj.safe_substitute(template_values)
             return WrappedType.from_json(obj)
 
+    @staticmethod
+    def compileFromFile(path_, error_on_missing=True) -> 'WrappedTemplate':
+        # for many createFromFile calls on one file, see WrappedTemplate
+        return WrappedTemplate.fromFile(path_, error_on_missing)
+
     @staticmethod
     def create(instance: Any) -> 'WrappedType':
         # expects an instance of an api_type Class
@@ -50,3 +65,143 @@ class WrappedType(DataClassJsonMixin):
             MetaData(),
             json.loads(instance.to_json())
         )
+
+
+# renders one JSON value of a template, its placeholders substituted
+_Render = Callable[[Mapping[str, Any]], Any]
+
+
+def _copy(value: Any) -> Any:
+    # constant parts of a template, copied so that instances share no lists
+    if isinstance(value, dict):
+        return {k: _copy(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_copy(v) for v in value]
+    return value
+
+
+def _constant(value: Any) -> _Render:
+    if isinstance(value, (dict, list)):
+        def render(values):
+            return _copy(value)
+    else:
+        def render(values):
+            return value
+    render.constant = True
+    return render
+
+
+class WrappedTemplate:
+    # A WrappedType file parsed once. createFromFile reads, dumps, substitutes and
+    # parses the whole JSON text per call; here every string holding a placeholder
+    # becomes a slot when the file is compiled and rendering only fills the slots.
+    # Results equal createFromFile(path_, values, error_on_missing), except that
+    # values are never re-read as JSON (quotes and backslashes stay as given).
+    #
+    #   template = WrappedType.compileFromFile('user.json')
+    #   users = template.instances({'userName': name} for name in names)
+    #   users = template.instances_from_columns({'userName': names, 'tenantId': tenant_id})
+
+    def __init__(self, obj: Dict[str, Any], error_on_missing: bool = True):
+        self.obj = obj
+        self.error_on_missing = error_on_missing
+        self.names: Set[str] = set()  # placeholders used
+        self._data = self._compile(obj.get('data'))
+        # placeholders outside of data are only checked for when rendering instances
+        self._outside = None
+        data_names = set(self.names)
+        self._render = self._compile(obj)
+        if error_on_missing and self.names - data_names:
+            self._outside = self.names - data_names
+        class_name = obj.get('className')
+        templated = class_name is None or '$' in class_name
+        self._class = None if templated else getattr(api_types, class_name)
+
+    @staticmethod
+    def fromFile(path_, error_on_missing=True) -> 'WrappedTemplate':
+        with open(path_, 'r') as f:
+            return WrappedTemplate(json.load(f), error_on_missing)
+
+    def _compile(self, node: Any) -> _Render:
+        if isinstance(node, str):
+            return self._compile_str(node)
+        if isinstance(node, dict):
+            items = [(self._compile(k), self._compile(v)) for k, v in node.items()]
+            if all(getattr(k, 'constant', False) and getattr(v, 'constant', False)
+                   for k, v in items):
+                return _constant(node)
+            return lambda values: {k(values): v(values) for k, v in items}
+        if isinstance(node, list):
+            items = [self._compile(v) for v in node]
+            if all(getattr(v, 'constant', False) for v in items):
+                return _constant(node)
+            return lambda values: [v(values) for v in items]
+        return _constant(node)
+
+    def _compile_str(self, text: str) -> _Render:
+        if '$' not in text:
+            return _constant(text)
+        template = Template(text)
+        for m in template.pattern.finditer(text):
+            if m.group('named') or m.group('braced'):
+                self.names.add(m.group('named') or m.group('braced'))
+        whole = template.pattern.fullmatch(text)
+        name = whole and (whole.group('named') or whole.group('braced'))
+        if name and self.error_on_missing:
+            return lambda values: str(values[name])
+        if name:
+            return lambda values: str(values[name]) if name in values else text
+        return template.substitute if self.error_on_missing else template.safe_substitute
+
+    def _check(self, values: Mapping[str, Any]):
+        if self._outside is not None:
+            missing = self._outside - values.keys()
+            if missing:
+                raise KeyError(sorted(missing)[0])
+
+    def render(self, values: Mapping[str, Any] = None) -> WrappedType:
+        # like createFromFile, no values substitute nothing
+        return WrappedType.from_dict(self._render(values) if values else _copy(self.obj))
+
+    def instance(self, values: Mapping[str, Any] = None) -> Any:
+        if not values:
+            return self.render().to_instance()
+        if self._class is None:
+            class_ = getattr(api_types, self._render(values)['className'])
+        else:
+            self._check(values)
+            class_ = self._class
+        return decoder(class_)(self._data(values))
+
+    def instances(self, rows: Iterable[Mapping[str, Any]]) -> Iterator[Any]:
+        if self._class is None:
+            yield from map(self.instance, rows)
+            return
+        decode, data, check = decoder(self._class), self._data, self._check
+        for values in rows:
+            if not values:
+                yield self.instance(values)
+                continue
+            check(values)
+            yield decode(data(values))
+
+    def instances_from_columns(self, columns: Mapping[str, Any]) -> List[Any]:
+        # One instance per row of equally long columns (lists, arrays, or a
+        # columnar.Table); str and non-sequence values are used for every row.
+        columns = getattr(columns, 'columns', columns)
+        missing = self.names - columns.keys()
+        if missing and self.error_on_missing:
+            raise KeyError(sorted(missing)[0])
+        names, series, scalars, length = [], [], {}, None
+        for name, column in columns.items():
+            if isinstance(column, (str, bytes)) or not hasattr(column, '__len__'):
+                scalars[name] = column
+                continue
+            if length is not None and len(column) != length:
+                raise ValueError(f'column {name} has {len(column)} values, expected {length}')
+            length = len(column)
+            names.append(name)
+            series.append(column)
+        if length is None:
+            return [self.instance(scalars)]
+        return list(self.instances({**scalars, **dict(zip(names, row))} for row in zip(*series)))
@@ -0,0 +1,287 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import (
+    dataclass,
+    field
+)
+import logging
+import threading
+import time
+from typing import (
+    Any,
+    AsyncIterator,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional
+)
+
+from .codecs import encode
+from .streaming import StreamingJsonBody
+
+LOG = logging.getLogger(__name__)
+
+# Before / after hooks around every API call, each receiving the CallTiming of the
+# call. A call is one typed endpoint method (_call_expect, which covers
+# _call_expect_modified, _call_expect_query_res, ...), one direct _call_api or one
+# stream=True listing from its request to its last item. The layers below add the
+# time they spend to the current call's phases:
+#
+#   encode     dataclasses -> dicts (API._encode, in the endpoint method)
+#   queue      waiting for a ConcurrencyController slot / the AsyncAPI semaphore
+#   serialize  the request body -> JSON bytes
+#   network    sending and receiving, including server time
+#   parse      JSON bytes -> dicts
+#   decode     dicts -> dataclasses
+#
+# Whatever is left of `elapsed` (cache lookups, auth retries, waiting on a
+# coalesced call) is reported by the Profiler as 'other'. Hedged copies of a call
+# both add their time.
+#
+#   profiler = Profiler()
+#   api = grant.get_api(hooks=profiler)
+#   ...
+#   print(profiler.report())
+
+PHASES = ('encode', 'queue', 'serialize', 'network', 'parse', 'decode')
+OTHER = 'other'
+
+
+@dataclass
+class CallTiming:
+    endpoint: str
+    started: float  # time.perf_counter(), encoding included
+    phases: Dict[str, float] = field(default_factory=dict)
+    elapsed: Optional[float] = None  # set before the after hooks run
+    error: Optional[BaseException] = None
+
+    def add(self, phase: str, seconds: float):
+        self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    @property
+    def other(self) -> float:
+        return max(0.0, (self.elapsed or 0.0) - sum(self.phases.values()))
+
+
+_current: ContextVar[Optional[CallTiming]] = ContextVar('pyramid_api_call', default=None)
+
+
+class Encoded(dict):
+    # Encoding runs in the endpoint method before the call starts, so APIs with hooks
+    # encode through timed_encode and each encoded field carries its time in the
+    # request body to the call it is sent with. Calls started together (threads,
+    # asyncio.gather) only count their own.
+    __slots__ = ('seconds',)
+
+
+def timed_encode(obj: Any, drop_nulls: bool = True) -> Dict[str, Any]:
+    start = time.perf_counter()
+    value = encode(obj, drop_nulls)
+    if not isinstance(value, dict):
+        return value
+    encoded = Encoded(value)
+    encoded.seconds = time.perf_counter() - start
+    return encoded
+
+
+def encode_seconds(data: Any) -> float:
+    # time spent encoding the fields of a request body
+    if isinstance(data, StreamingJsonBody):
+        data = data.document
+    if not isinstance(data, dict):
+        return 0.0
+    return sum(value.seconds for value in data.values() if isinstance(value, Encoded))
+
+
+def current_call() -> Optional[CallTiming]:
+    return _current.get()
+
+
+def record_phase(phase: str, start: float):
+    # adds the time since `start` (time.perf_counter()) to the current call, if any
+    call = _current.get()
+    if call is not None:
+        call.add(phase, time.perf_counter() - start)
+
+
+class Hooks:
+    # Hooks observe calls, an exception raised by one is logged and the call goes on
+
+    def __init__(
+        self,
+        before: Iterable[Callable[[CallTiming], Any]] = (),
+        after: Iterable[Callable[[CallTiming], Any]] = ()
+    ):
+        self.before: List[Callable[[CallTiming], Any]] = list(before)
+        self.after: List[Callable[[CallTiming], Any]] = list(after)
+
+    def _run(self, hooks: List[Callable[[CallTiming], Any]], call: CallTiming):
+        for hook in hooks:
+            try:
+                hook(call)
+            except Exception:
+                LOG.exception(f'hook {hook!r} failed for {call.endpoint}')
+
+    def _start(self, endpoint: str, data: Any) -> CallTiming:
+        now = time.perf_counter()
+        encoding = encode_seconds(data)
+        call = CallTiming(endpoint, now - encoding)
+        if encoding:
+            call.add('encode', encoding)
+        self._run(self.before, call)
+        return call
+
+    def _finish(self, call: CallTiming):
+        call.elapsed = time.perf_counter() - call.started
+        self._run(self.after, call)
+
+    @contextmanager
+    def call(self, endpoint: str, data: Any = None) -> Iterator[Optional[CallTiming]]:
+        if _current.get() is not None:
+            # _call_api under _call_expect is part of the same call, its body included
+            yield None
+            return
+        call = self._start(endpoint, data)
+        token = _current.set(call)
+        try:
+            yield call
+        except BaseException as err:
+            call.error = err
+            raise
+        finally:
+            _current.reset(token)
+            self._finish(call)
+
+    def stream(self, endpoint: str, data: Any, items: Iterator[Any]) -> Iterator[Any]:
+        # One call from the first next() until `items` is exhausted or closed. The
+        # call is current only while `items` runs, not in the caller between items,
+        # so `elapsed` includes the time the caller holds each item.
+        call = None
+        try:
+            call = self._start(endpoint, data)
+            while True:
+                token = _current.set(call)
+                try:
+                    item = next(items)
+                except StopIteration:
+                    return
+                finally:
+                    _current.reset(token)
+                yield item
+        except BaseException as err:
+            if call is not None and not isinstance(err, GeneratorExit):
+                call.error = err
+            raise
+        finally:
+            items.close()
+            if call is not None:
+                self._finish(call)
+
+    async def stream_async(
+        self,
+        endpoint: str,
+        data: Any,
+        items: AsyncIterator[Any]
+    ) -> AsyncIterator[Any]:
+        # async generator twin of stream
+        call = None
+        try:
+            call = self._start(endpoint, data)
+            while True:
+                token = _current.set(call)
+                try:
+                    item = await items.__anext__()
+                except StopAsyncIteration:
+                    return
+                finally:
+                    _current.reset(token)
+                yield item
+        except BaseException as err:
+            if call is not None and not isinstance(err, GeneratorExit):
+                call.error = err
+            raise
+        finally:
+            await items.aclose()
+            if call is not None:
+                self._finish(call)
+
+
+class _Totals:
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.elapsed = 0.0
+        self.phases: Dict[str, float] = {}
+        self.max: Dict[str, float] = {}
+
+
+class Profiler:
+    # after hook summing the phases of every call per endpoint
+
+    def __init__(self):
+        self._endpoints: Dict[str, _Totals] = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, call: CallTiming):
+        phases = dict(call.phases)
+        phases[OTHER] = call.other
+        with self._lock:
+            totals = self._endpoints.get(call.endpoint)
+            if totals is None:
+                totals = self._endpoints[call.endpoint] = _Totals()
+            totals.calls += 1
+            totals.errors += call.error is not None
+            totals.elapsed += call.elapsed
+            for phase, seconds in phases.items():
+                totals.phases[phase] = totals.phases.get(phase, 0.0) + seconds
+                totals.max[phase] = max(totals.max.get(phase, 0.0), seconds)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out = {}
+            for endpoint, totals in sorted(self._endpoints.items()):
+                out[endpoint] = {
+                    'calls': totals.calls,
+                    'errors': totals.errors,
+                    'elapsed': totals.elapsed,
+                    'mean': totals.elapsed / totals.calls,
+                    'phases': {
+                        phase: {
+                            'total': totals.phases[phase],
+                            'mean': totals.phases[phase] / totals.calls,
+                            'max': totals.max[phase],
+                            'share':
+                                totals.phases[phase] / totals.elapsed if totals.elapsed else 0.0
+                        }
+                        for phase in PHASES + (OTHER,) if phase in totals.phases
+                    }
+                }
+            return out
+
+    def reset(self):
+        with self._lock:
+            self._endpoints = {}
+
+    def report(self) -> str:
+        # one row per endpoint: calls, mean ms and the share of each phase
+        columns = PHASES + (OTHER,)
+        header = f'{"endpoint":<48} {"calls":>7} {"mean ms":>9} '
+        rows = [header + ' '.join(f'{c:>9}' for c in columns)]
+        for endpoint, stats in self.stats().items():
+            shares = ' '.join(
+                f'{stats["phases"][c]["share"]:>9.1%}' if c in stats['phases'] else f'{"-":>9}'
+                for c in columns)
+            rows.append(f'{endpoint:<48} {stats["calls"]:>7} {stats["mean"] * 1000:>9.2f} {shares}')
+        return '\n'.join(rows)
+
+
+def as_hooks(hooks: Any) -> Optional[Hooks]:
+    # None / False -> no hooks, a callable (ie a Profiler) -> run after every call
+    if hooks is None or hooks is False:
+        return None
+    if isinstance(hooks, Hooks):
+        return hooks
+    return Hooks(after=[hooks])
@@ -0,0 +1,178 @@
+from collections import (
+    Counter,
+    deque
+)
+import math
+import threading
+from typing import (
+    Any,
+    Deque,
+    Dict,
+    Optional,
+    Tuple
+)
+
+from . import endpoints as ep
+
+# Per-endpoint latency tracking for API._call_api. Every response time is kept
+# in a sliding window per endpoint; for idempotent reads (endpoints.READ_ENDPOINTS)
+# the window drives
+#
+#  - an adaptive read timeout, `timeout_factor` x the observed p99 clamped to
+#    [min_timeout, max_timeout], so one stalled node fails fast instead of
+#    holding a job hostage. A call that times out is kept as a sample at its
+#    timeout (it took at least that long), so when the server slows down for
+#    good the timeout grows by `timeout_factor` every few timeouts instead of
+#    failing every call, and
+#  - hedging (opt in): when no response arrived by the observed p95 an identical
+#    request is sent and whichever answers first wins. Hedges are capped at
+#    `hedge_budget` of all read calls so a slow server is not sent twice the load.
+#
+# Writes are tracked but never get an adaptive timeout and are never hedged.
+#
+#   api = grant.get_api(latency=LatencyPolicy(hedge=True))
+#   api.latency.stats()
+
+DEFAULT_WINDOW = 256
+DEFAULT_MIN_SAMPLES = 20
+
+Timeout = Optional[Tuple[Optional[float], Optional[float]]]
+
+
+def _quantile(ordered: list, q: float) -> float:
+    # nearest rank on an already sorted list
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))]
+
+
+class LatencyTracker:
+
+    def __init__(self, window: int = DEFAULT_WINDOW):
+        self.window = window
+        self.counts: Counter = Counter()
+        self._samples: Dict[str, Deque[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, endpoint: str, seconds: float):
+        with self._lock:
+            samples = self._samples.get(endpoint)
+            if samples is None:
+                samples = self._samples[endpoint] = deque(maxlen=self.window)
+            samples.append(seconds)
+            self.counts[endpoint] += 1
+
+    def samples(self, endpoint: str) -> int:
+        return len(self._samples.get(endpoint, ()))
+
+    def quantiles(self, endpoint: str, *qs: float) -> Optional[Tuple[float, ...]]:
+        with self._lock:
+            samples = self._samples.get(endpoint)
+            if not samples:
+                return None
+            ordered = sorted(samples)
+        return tuple(_quantile(ordered, q) for q in qs)
+
+    def quantile(self, endpoint: str, q: float) -> Optional[float]:
+        res = self.quantiles(endpoint, q)
+        return None if res is None else res[0]
+
+    def endpoints(self):
+        return list(self._samples)
+
+
+class LatencyPolicy:
+
+    def __init__(
+        self,
+        hedge: bool = False,
+        hedge_quantile: float = 0.95,
+        hedge_budget: float = 0.1,
+        timeout_quantile: float = 0.99,
+        timeout_factor: float = 4.0,
+        min_timeout: float = 1.0,
+        max_timeout: float = 120.0,
+        min_samples: int = DEFAULT_MIN_SAMPLES,
+        window: int = DEFAULT_WINDOW
+    ):
+        self.hedge = hedge
+        self.hedge_quantile = hedge_quantile
+        self.hedge_budget = hedge_budget
+        self.timeout_quantile = timeout_quantile
+        self.timeout_factor = timeout_factor
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.min_samples = min_samples
+        self.tracker = LatencyTracker(window)
+        self.reads: Counter = Counter()
+        self.hedges: Counter = Counter()
+        self.hedge_wins: Counter = Counter()
+        self.timeouts: Counter = Counter()
+        self._lock = threading.Lock()
+
+    def observe(self, endpoint: str, seconds: float):
+        self.tracker.observe(endpoint, seconds)
+
+    def _ready(self, endpoint: str) -> bool:
+        return endpoint in ep.READ_ENDPOINTS and self.tracker.samples(endpoint) >= self.min_samples
+
+    def timeout(self, endpoint: str, default: Timeout) -> Timeout:
+        # requests style (connect, read) timeout for one call. The configured
+        # read_timeout, if any, stays the upper bound.
+        if endpoint not in ep.READ_ENDPOINTS:
+            return default
+        connect, read = default or (None, None)
+        ceiling = self.max_timeout if read is None else min(read, self.max_timeout)
+        if not self._ready(endpoint):
+            return (connect, ceiling)
+        observed = self.tracker.quantile(endpoint, self.timeout_quantile)
+        return (connect, min(ceiling, max(self.min_timeout, observed * self.timeout_factor)))
+
+    def hedge_delay(self, endpoint: str) -> Optional[float]:
+        # seconds to wait before sending a duplicate, None to not hedge this call
+        if not self.hedge or endpoint not in ep.READ_ENDPOINTS:
+            return None
+        with self._lock:
+            self.reads[endpoint] += 1
+            over_budget = sum(self.hedges.values()) >= self.hedge_budget * sum(self.reads.values())
+        if over_budget or not self._ready(endpoint):
+            return None
+        return self.tracker.quantile(endpoint, self.hedge_quantile)
+
+    def hedged(self, endpoint: str):
+        with self._lock:
+            self.hedges[endpoint] += 1
+
+    def hedge_won(self, endpoint: str):
+        with self._lock:
+            self.hedge_wins[endpoint] += 1
+
+    def timed_out(self, endpoint: str, timeout: Timeout = None):
+        # kept as a sample at the read timeout the call was given, a lower bound of its latency
+        with self._lock:
+            self.timeouts[endpoint] += 1
+        read = timeout[1] if isinstance(timeout, tuple) else timeout
+        if read is not None:
+            self.tracker.observe(endpoint, read)
+
+    def stats(self) -> Dict[str, Any]:
+        out = {}
+        for endpoint in sorted(self.tracker.endpoints()):
+            p50, p95, p99 = self.tracker.quantiles(endpoint, 0.5, 0.95, 0.99)
+            out[endpoint] = {
+                'count': self.tracker.counts[endpoint],
+                'p50': p50,
+                'p95': p95,
+                'p99': p99,
+                'hedges': self.hedges[endpoint],
+                'hedge_wins': self.hedge_wins[endpoint],
+                'timeouts': self.timeouts[endpoint]
+            }
+        return out
+
+
+def as_latency_policy(latency: Any) -> Optional[LatencyPolicy]:
+    # True -> adaptive timeouts without hedging, None / False -> nothing tracked
+    if latency is True:
+        return LatencyPolicy()
+    if latency is None or latency is False:
+        return None
+    return latency
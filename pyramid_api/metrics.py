@@ -0,0 +1,293 @@
+from bisect import bisect_left
+from collections import Counter
+import threading
+from typing import (
+    Any,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Sequence,
+    Tuple
+)
+import weakref
+
+# Per-endpoint call metrics, recorded by API._request for every request sent
+# (hedged copies and auth retries included): call counts, latency and request /
+# response size histograms (as JSON and as sent on the wire, which differ when
+# bodies are compressed), error responses by HTTP status and exceptions by type
+# (APIException for error payloads, the transport's exception for failed calls).
+# Recording is a bisect and a few increments under a lock, so every API keeps a
+# registry. Pass one registry to several APIs to pool their numbers, or merge
+# the registries of all live APIs in the process with aggregate().
+#
+#   api = grant.get_api()
+#   api.metrics.snapshot()['/API2/access/getMe']['latency']['count']
+#   print(aggregate().to_prometheus())
+
+DEFAULT_LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+DEFAULT_SIZE_BUCKETS = tuple(4 ** i * 256 for i in range(10))  # 256B ... 64MB
+
+DEFAULT_PREFIX = 'pyramid_api'
+
+
+class Histogram:
+    # counts per bucket upper bound, the last slot holds everything above
+
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def merge(self, other: 'Histogram'):
+        if other.buckets != self.buckets:
+            raise ValueError('cannot merge histograms with different buckets')
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.sum += other.sum
+        self.count += other.count
+
+    def cumulative(self) -> List[Tuple[float, int]]:
+        # (upper bound, observations <= bound) pairs ending in +Inf, as Prometheus wants
+        out, total = [], 0
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            total += count
+            out.append((bound, total))
+        return out
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {'count': self.count, 'sum': self.sum, 'buckets': self.cumulative()}
+
+
+class EndpointMetrics:
+
+    def __init__(self, latency_buckets: Sequence[float], size_buckets: Sequence[float]):
+        self.calls = 0
+        self.latency = Histogram(latency_buckets)
+        self.request_bytes = Histogram(size_buckets)
+        self.response_bytes = Histogram(size_buckets)
+        self.request_wire_bytes = Histogram(size_buckets)
+        self.response_wire_bytes = Histogram(size_buckets)
+        self.errors: Counter = Counter()  # HTTP status -> count, statuses >= 400 only
+        self.exceptions: Counter = Counter()  # exception class name -> count
+
+    def merge(self, other: 'EndpointMetrics'):
+        self.calls += other.calls
+        self.latency.merge(other.latency)
+        self.request_bytes.merge(other.request_bytes)
+        self.response_bytes.merge(other.response_bytes)
+        self.request_wire_bytes.merge(other.request_wire_bytes)
+        self.response_wire_bytes.merge(other.response_wire_bytes)
+        self.errors.update(other.errors)
+        self.exceptions.update(other.exceptions)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            'calls': self.calls,
+            'latency': self.latency.snapshot(),
+            'request_bytes': self.request_bytes.snapshot(),
+            'response_bytes': self.response_bytes.snapshot(),
+            'request_wire_bytes': self.request_wire_bytes.snapshot(),
+            'response_wire_bytes': self.response_wire_bytes.snapshot(),
+            'errors': dict(self.errors),
+            'exceptions': dict(self.exceptions)
+        }
+
+
+_registries: 'weakref.WeakSet[MetricsRegistry]' = weakref.WeakSet()
+
+
+class MetricsRegistry:
+
+    def __init__(
+        self,
+        latency_buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS,
+        size_buckets: Sequence[float] = DEFAULT_SIZE_BUCKETS
+    ):
+        self.latency_buckets = tuple(latency_buckets)
+        self.size_buckets = tuple(size_buckets)
+        self._endpoints: Dict[str, EndpointMetrics] = {}
+        self._lock = threading.Lock()
+        _registries.add(self)
+
+    def _endpoint(self, endpoint: str) -> EndpointMetrics:
+        metrics = self._endpoints.get(endpoint)
+        if metrics is None:
+            metrics = EndpointMetrics(self.latency_buckets, self.size_buckets)
+            self._endpoints[endpoint] = metrics
+        return metrics
+
+    ##
+    # --- Recording ---
+    ##
+
+    def observe(
+        self,
+        endpoint: str,
+        seconds: float,
+        status: int = None,
+        error: BaseException = None
+    ):
+        # one finished call; status is None when no response arrived
+        with self._lock:
+            metrics = self._endpoint(endpoint)
+            metrics.calls += 1
+            metrics.latency.observe(seconds)
+            if status is not None and status >= 400:
+                metrics.errors[status] += 1
+            elif error is not None:
+                metrics.exceptions[type(error).__name__] += 1
+
+    def transferred(
+        self,
+        endpoint: str,
+        sent: int,
+        received: int,
+        sent_wire: int = None,
+        received_wire: int = None
+    ):
+        # body sizes of one call, 0 for a streamed upload of unknown length. The
+        # wire sizes default to the plain ones for uncompressed bodies.
+        with self._lock:
+            metrics = self._endpoint(endpoint)
+            metrics.request_bytes.observe(sent)
+            metrics.response_bytes.observe(received)
+            metrics.request_wire_bytes.observe(sent if sent_wire is None else sent_wire)
+            metrics.response_wire_bytes.observe(
+                received if received_wire is None else received_wire)
+
+    ##
+    # --- Reading ---
+    ##
+
+    def endpoints(self) -> List[str]:
+        with self._lock:
+            return sorted(self._endpoints)
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {e: m.snapshot() for e, m in sorted(self._endpoints.items())}
+
+    def reset(self) -> Dict[str, Dict[str, Any]]:
+        # clears everything, returns what was recorded up to now
+        with self._lock:
+            out = {e: m.snapshot() for e, m in sorted(self._endpoints.items())}
+            self._endpoints = {}
+        return out
+
+    def merge(self, other: 'MetricsRegistry') -> 'MetricsRegistry':
+        # adds the numbers of `other` to this registry
+        if other is self:
+            return self
+        with other._lock:
+            copies = []
+            for endpoint, metrics in other._endpoints.items():
+                copy = EndpointMetrics(other.latency_buckets, other.size_buckets)
+                copy.merge(metrics)
+                copies.append((endpoint, copy))
+        with self._lock:
+            for endpoint, metrics in copies:
+                self._endpoint(endpoint).merge(metrics)
+        return self
+
+    def to_prometheus(self, prefix: str = DEFAULT_PREFIX, labels: Dict[str, str] = None) -> str:
+        # text exposition format 0.0.4, `labels` are added to every sample
+        with self._lock:
+            endpoints = sorted(self._endpoints.items())
+            lines = []
+            _counter(lines, f'{prefix}_calls_total', 'Requests sent.', [
+                ({'endpoint': e}, m.calls) for e, m in endpoints], labels)
+            _counter(lines, f'{prefix}_http_errors_total', 'Responses with an HTTP error status.', [
+                ({'endpoint': e, 'status': str(s)}, n)
+                for e, m in endpoints for s, n in sorted(m.errors.items())], labels)
+            _counter(
+                lines, f'{prefix}_exceptions_total', 'Calls failed without an HTTP error status.', [
+                    ({'endpoint': e, 'exception': x}, n)
+                    for e, m in endpoints for x, n in sorted(m.exceptions.items())], labels)
+            _histogram(lines, f'{prefix}_request_seconds', 'Request latency.', [
+                ({'endpoint': e}, m.latency) for e, m in endpoints], labels)
+            _histogram(lines, f'{prefix}_request_bytes', 'Request body size.', [
+                ({'endpoint': e}, m.request_bytes) for e, m in endpoints], labels)
+            _histogram(lines, f'{prefix}_response_bytes', 'Response body size.', [
+                ({'endpoint': e}, m.response_bytes) for e, m in endpoints], labels)
+            _histogram(lines, f'{prefix}_request_wire_bytes', 'Request body size on the wire.', [
+                ({'endpoint': e}, m.request_wire_bytes) for e, m in endpoints], labels)
+            _histogram(lines, f'{prefix}_response_wire_bytes', 'Response body size on the wire.', [
+                ({'endpoint': e}, m.response_wire_bytes) for e, m in endpoints], labels)
+        return '\n'.join(lines) + '\n'
+
+
+##
+# --- Prometheus text format ---
+##
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(labels: Dict[str, str], extra: Optional[Dict[str, str]]) -> str:
+    merged = {**(extra or {}), **labels}
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in merged.items()) + '}'
+
+
+def _number(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _counter(
+    lines: List[str],
+    name: str,
+    help_: str,
+    samples: List[Tuple[Dict, int]],
+    extra: Dict
+):
+    lines.append(f'# HELP {name} {help_}')
+    lines.append(f'# TYPE {name} counter')
+    lines.extend(f'{name}{_labels(labels, extra)} {value}' for labels, value in samples)
+
+
+def _histogram(
+    lines: List[str],
+    name: str,
+    help_: str,
+    samples: List[Tuple[Dict, Histogram]],
+    extra: Dict
+):
+    lines.append(f'# HELP {name} {help_}')
+    lines.append(f'# TYPE {name} histogram')
+    for labels, histogram in samples:
+        for bound, count in histogram.cumulative():
+            lines.append(f'{name}_bucket{_labels({**labels, "le": _number(bound)}, extra)} {count}')
+        lines.append(f'{name}_sum{_labels(labels, extra)} {_number(histogram.sum)}')
+        lines.append(f'{name}_count{_labels(labels, extra)} {histogram.count}')
+
+
+def aggregate(registries: Iterable[MetricsRegistry] = None) -> MetricsRegistry:
+    # a new registry holding the sum of `registries`, by default every live one
+    # in the process (a registry shared by several APIs is counted once)
+    if registries is None:
+        registries = list(_registries)
+    registries = list({id(r): r for r in registries}.values())
+    out = MetricsRegistry(
+        *((registries[0].latency_buckets, registries[0].size_buckets) if registries else ()))
+    _registries.discard(out)
+    for registry in registries:
+        out.merge(registry)
+    return out
+
+
+def as_metrics(metrics: Any) -> MetricsRegistry:
+    # None / True -> a registry of its own, or a registry shared with other APIs
+    if metrics is None or metrics is True:
+        return MetricsRegistry()
+    return metrics
@@ -0,0 +1,530 @@
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    ThreadPoolExecutor,
+    wait
+)
+from dataclasses import (
+    dataclass,
+    field,
+    fields,
+    is_dataclass,
+    replace
+)
+import logging
+import time
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    Union
+)
+
+from dataclasses_json import DataClassJsonMixin
+
+from .api import (
+    API,
+    APIException
+)
+from .api_types import (
+    AccessType,
+    ModifiedItemsResult,
+    NewFolder,
+    NewTenant,
+    PieApiObject,
+    Role,
+    RoleAssignmentType,
+    Server,
+    User,
+    ValidRootFolderType
+)
+from .bulk import DEFAULT_WORKERS
+from .bundle import BundleReader
+from .helper_types import (
+    WrappedTemplate,
+    WrappedType
+)
+
+LOG = logging.getLogger(__name__)
+
+# Declarative tenant provisioning. A ProvisioningSpec lists tenants, roles, users,
+# data servers (with their databases), folders and content; build_plan turns it
+# into a DAG of API calls where every generated id flows to the calls needing it,
+# and provision runs the DAG on a thread pool, each call as soon as its inputs
+# exist. Onboarding then takes as long as the longest chain of calls (tenant ->
+# root folder -> folder -> import -> grant) rather than the sum of all of them.
+#
+# Inside a spec `tenantId` is the name of a tenant in the spec, role ids / role
+# keys are names of roles of the same tenant and folders are '/' separated paths
+# under the tenant's public root. Anything else is used as an existing id.
+#
+#   spec = ProvisioningSpec(
+#       tenants=[NewTenant('', 'acme', proSeats=10)],
+#       roles=[Role('acme', 'admins'), Role('acme', 'viewers')],
+#       users=[User('acme', 'bob', roleIds=['admins'], password='pw')],
+#       servers=[ServerSpec(
+#           Server(5432, 'pg', tenantId='acme'), {'admins': AccessType.admin}, {'sales': {}})],
+#       folders=[FolderSpec('acme', 'reports/2024', {'viewers': AccessType.read})],
+#       content=[ContentSpec('acme', 'reports/2024', PieFile('dash.pie'))])
+#   result = provision(api, spec)
+#   result.raise_for_errors()
+#   result.ids['user:acme/bob'], result.critical_path()
+#
+#   spec = load_spec(glob.glob('tenant/*.json'), {'tenant': 'acme'})
+
+
+@dataclass
+class ServerSpec(DataClassJsonMixin):
+    server: Server
+    roles: Dict[str, AccessType] = field(default_factory=dict)
+    # database name -> {role: access} granted on the recognized database
+    databases: Dict[str, Dict[str, AccessType]] = field(default_factory=dict)
+
+
+@dataclass
+class FolderSpec(DataClassJsonMixin):
+    tenant: str
+    path: str
+    roles: Dict[str, AccessType] = field(default_factory=dict)
+    # with propagate the grants run after everything below the folder is created
+    propagate: bool = True
+
+
+@dataclass
+class ContentSpec(DataClassJsonMixin):
+    tenant: str
+    folder: str  # path, created if no FolderSpec declares it
+    data: Any  # base64 .pie text or a PieFile
+    clashDefaultOption: int = 1
+    name: Optional[str] = None  # caption once imported, lets reconcile find it
+    rolesAssignmentType: RoleAssignmentType = RoleAssignmentType.forceparentroles
+    # names of roles of the tenant, for RoleAssignmentType.forceexternalroles
+    roleIds: Optional[List[str]] = None
+
+
+@dataclass
+class ProvisioningSpec(DataClassJsonMixin):
+    tenants: List[NewTenant] = field(default_factory=list)
+    roles: List[Role] = field(default_factory=list)
+    users: List[User] = field(default_factory=list)
+    servers: List[ServerSpec] = field(default_factory=list)
+    folders: List[FolderSpec] = field(default_factory=list)
+    content: List[ContentSpec] = field(default_factory=list)
+
+    def add(self, obj: Any, path: str = None):
+        # an api_types object as found in a WrappedType file; folders and content
+        # are placed by `path`, 'tenant/folder/...'
+        if isinstance(obj, NewTenant):
+            self.tenants.append(obj)
+        elif isinstance(obj, Role):
+            self.roles.append(obj)
+        elif isinstance(obj, User):
+            self.users.append(obj)
+        elif isinstance(obj, Server):
+            self.servers.append(ServerSpec(obj))
+        elif isinstance(obj, (NewFolder, PieApiObject)):
+            tenant, _, folder = (path or '').strip('/').partition('/')
+            if not tenant:
+                raise ValueError(f'{type(obj).__name__} needs a tenant/folder path, got {path!r}')
+            if isinstance(obj, NewFolder):
+                self.folders.append(FolderSpec(tenant, f'{folder}/{obj.folderName}'.strip('/')))
+            else:
+                self.content.append(ContentSpec(
+                    tenant, folder, obj.fileZippedData, obj.clashDefaultOption,
+                    rolesAssignmentType=obj.rolesAssignmentType, roleIds=obj.roleIds))
+        else:
+            raise ValueError(f'cannot provision {type(obj).__name__}')
+
+
+def load_spec(
+    paths: Iterable[str],
+    template_values: Dict[str, Any] = None,
+    spec: ProvisioningSpec = None
+) -> ProvisioningSpec:
+    # WrappedType files, see WrappedType.createFromFile; metaData.dstPath places
+    # NewFolder and PieApiObject files
+    spec = spec or ProvisioningSpec()
+    for path_ in paths:
+        wrapped = WrappedType.createFromFile(path_, template_values)
+        spec.add(wrapped.to_instance(), wrapped.metaData.dstPath if wrapped.metaData else None)
+    return spec
+
+
+def load_bundle(
+    path_: str,
+    template_values: Dict[str, Any] = None,
+    spec: ProvisioningSpec = None
+) -> ProvisioningSpec:
+    # load_spec for the records of a bundle, see bundle.BundleWriter
+    spec = spec or ProvisioningSpec()
+    with BundleReader(path_) as bundle:
+        for i in range(len(bundle)):
+            if template_values:
+                wrapped = WrappedTemplate(bundle.raw(i)).render(template_values)
+            else:
+                wrapped = bundle[i]
+            spec.add(wrapped.to_instance(), wrapped.metaData.dstPath if wrapped.metaData else None)
+    return spec
+
+
+##
+# --- Plan ---
+##
+
+@dataclass(frozen=True)
+class Ref:
+    # the output of another step, replaced before the call
+    key: str
+
+
+@dataclass
+class Step:
+    key: str
+    method: Union[str, Callable]  # an API method name, or fn(api, *args)
+    args: Tuple = ()
+    output: Callable[[Any], Any] = None  # result -> what Refs to this step get
+    after: Tuple[str, ...] = ()  # ordering without data, ie grants after imports
+
+    @property
+    def deps(self) -> Set[str]:
+        return _refs(self.args) | set(self.after)
+
+    def describe(self) -> str:
+        name = self.method if isinstance(self.method, str) else self.method.__name__
+        return f'{self.key}: {name}({", ".join(map(_show, self.args))})'
+
+
+class Plan:
+    # `given` holds the outputs of steps that need not run, ie objects that
+    # already exist (see reconcile.py)
+
+    def __init__(self, steps: Iterable[Step], given: Dict[str, Any] = None):
+        self.steps: Dict[str, Step] = {}
+        self.given: Dict[str, Any] = dict(given or {})
+        for step in steps:
+            if step.key in self.steps or step.key in self.given:
+                raise ValueError(f'duplicate step {step.key}')
+            self.steps[step.key] = step
+        # dependencies still to be run, per step
+        self.deps: Dict[str, Set[str]] = {}
+        for step in self.steps.values():
+            missing = step.deps - self.steps.keys() - self.given.keys()
+            if missing:
+                raise ValueError(f'{step.key} depends on unknown {", ".join(sorted(missing))}')
+            self.deps[step.key] = step.deps - self.given.keys()
+        self.dependents: Dict[str, List[str]] = {}
+        for key, deps in self.deps.items():
+            for dep in deps:
+                self.dependents.setdefault(dep, []).append(key)
+        self.order = self._order()
+
+    def _order(self) -> List[str]:
+        # Kahn's algorithm, in declaration order where there is a choice
+        waiting = {key: len(deps) for key, deps in self.deps.items()}
+        ready = [key for key, count in waiting.items() if count == 0]
+        order = []
+        while ready:
+            key = ready.pop(0)
+            order.append(key)
+            for user in self.dependents.get(key, []):
+                waiting[user] -= 1
+                if waiting[user] == 0:
+                    ready.append(user)
+        if len(order) != len(self.steps):
+            raise ValueError(f'cycle between {", ".join(sorted(self.steps.keys() - set(order)))}')
+        return order
+
+    def levels(self) -> Dict[str, int]:
+        # 1 for steps depending on nothing still to run, 1 + the deepest dependency otherwise
+        levels: Dict[str, int] = {}
+        for key in self.order:
+            levels[key] = 1 + max((levels[d] for d in self.deps[key]), default=0)
+        return levels
+
+    def depth(self) -> int:
+        # steps on the longest chain, the fewest rounds of calls the plan can run in
+        return max(self.levels().values(), default=0)
+
+    def describe(self) -> str:
+        return '\n'.join(self.steps[key].describe() for key in self.order)
+
+
+def _refs(value: Any) -> Set[str]:
+    if isinstance(value, Ref):
+        return {value.key}
+    if isinstance(value, (list, tuple)):
+        return set().union(*map(_refs, value)) if value else set()
+    if isinstance(value, dict):
+        return set().union(*map(_refs, value.values())) if value else set()
+    if is_dataclass(value) and not isinstance(value, type):
+        return set().union(*(_refs(getattr(value, f.name)) for f in fields(value)))
+    return set()
+
+
+def _resolve(value: Any, outputs: Dict[str, Any]) -> Any:
+    if isinstance(value, Ref):
+        return outputs[value.key]
+    if isinstance(value, (list, tuple)):
+        return type(value)(_resolve(v, outputs) for v in value)
+    if isinstance(value, dict):
+        return {k: _resolve(v, outputs) for k, v in value.items()}
+    if is_dataclass(value) and not isinstance(value, type) and _refs(value):
+        return replace(
+            value, **{f.name: _resolve(getattr(value, f.name), outputs) for f in fields(value)})
+    return value
+
+
+def _show(value: Any) -> str:
+    if isinstance(value, Ref):
+        return f'<{value.key}>'
+    if isinstance(value, str) and len(value) > 40:
+        return f'<{len(value)} chars>'
+    if isinstance(value, list):
+        return f'[{", ".join(map(_show, value))}]'
+    if is_dataclass(value) and not isinstance(value, type):
+        shown = ', '.join(f'{f.name}={_show(getattr(value, f.name))}' for f in fields(value)
+                          if getattr(value, f.name) not in (None, [], {}))
+        return f'{type(value).__name__}({shown})'
+    return repr(value)
+
+
+##
+# --- Building ---
+##
+
+def _modified_id(res: ModifiedItemsResult) -> Optional[str]:
+    if not res.success:
+        raise APIException(res.errorMessage or 'not modified')
+    return res.modifiedList[0].id if res.modifiedList else None
+
+
+def _imported(res: Any) -> Any:
+    if res.failedItems:
+        raise APIException(f'import failed for {res.failedItems}')
+    return res
+
+
+def _item_id(item: Any) -> str:
+    return item.id
+
+
+def _create_tenant(api: API, tenant: NewTenant) -> str:
+    # servers that leave modifiedList empty need the name lookup
+    return _modified_id(api.createTenant(tenant)) or api.getTenantByName(tenant.name).id
+
+
+class _Builder:
+
+    def __init__(self, spec: ProvisioningSpec):
+        self.spec = spec
+        self.steps: Dict[str, Step] = {}
+        self.tenants = {t.name for t in spec.tenants}
+        self.roles = {(r.tenantId, r.roleName) for r in spec.roles}
+
+    def add(self, key: str, method: Union[str, Callable], *args, output=None, after=()) -> Ref:
+        if key in self.steps:
+            raise ValueError(f'{key} is declared twice')
+        self.steps[key] = Step(key, method, args, output, tuple(after))
+        return Ref(key)
+
+    def tenant(self, name: str) -> Any:
+        return Ref(f'tenant:{name}') if name in self.tenants else name
+
+    def role(self, tenant: str, name: str) -> Any:
+        return Ref(f'role:{tenant}/{name}') if (tenant, name) in self.roles else name
+
+    def folder(self, tenant: str, path: str) -> Ref:
+        # the folder at `path`, with steps for it and any missing parents
+        path = path.strip('/')
+        if not path:
+            key = f'root:{tenant}'
+            if key not in self.steps:
+                self.add(key, 'getPublicOrGroupFolderByTenantId', self.tenant(tenant),
+                         ValidRootFolderType.public, output=_item_id)
+            return Ref(key)
+        key = f'folder:{tenant}/{path}'
+        if key not in self.steps:
+            parent, _, name = path.rpartition('/')
+            self.add(
+                key, 'createNewFolder', NewFolder(self.folder(tenant, parent), name),
+                output=_modified_id)
+        return Ref(key)
+
+    def build(self) -> Plan:
+        spec = self.spec
+        for tenant in spec.tenants:
+            self.add(f'tenant:{tenant.name}', _create_tenant, tenant)
+        for role in spec.roles:
+            self.add(f'role:{role.tenantId}/{role.roleName}', 'createRole',
+                     replace(role, tenantId=self.tenant(role.tenantId)), output=_modified_id)
+        for user in spec.users:
+            roles = [self.role(user.tenantId, r) for r in user.roleIds or []]
+            self.add(f'user:{user.tenantId}/{user.userName}', 'createUserDb',
+                     replace(user, tenantId=self.tenant(user.tenantId), roleIds=roles),
+                     output=_modified_id)
+        for server in spec.servers:
+            tenant = server.server.tenantId
+            key = f'server:{tenant}/{server.server.serverName}'
+            ref = self.add(key, 'createDataServer',
+                           replace(server.server, tenantId=self.tenant(tenant)),
+                           output=_modified_id)
+            for role, access in server.roles.items():
+                self.add(f'{key}/role:{role}', 'addRoleToServer', ref, self.role(tenant, role),
+                         access, output=_modified_id)
+            for db, roles in server.databases.items():
+                db_ref = self.add(
+                    f'{key}/db:{db}', 'recognizeDataBase', ref, db, output=_modified_id)
+                for role, access in roles.items():
+                    self.add(f'{key}/db:{db}/role:{role}', 'addRoleToDataBase', db_ref,
+                             self.role(tenant, role), access, output=_modified_id)
+        for folder in spec.folders:
+            self.folder(folder.tenant, folder.path)
+        for i, content in enumerate(spec.content):
+            roles = content.roleIds
+            if roles is not None:
+                roles = [self.role(content.tenant, r) for r in roles]
+            self.add(f'content:{content.tenant}/{content.folder.strip("/")}#{i}', 'importContent',
+                     PieApiObject(self.folder(content.tenant, content.folder), content.data,
+                                  content.clashDefaultOption, content.rolesAssignmentType, roles),
+                     output=_imported)
+        # grants last, so that propagated roles reach everything created below
+        for folder in spec.folders:
+            ref = self.folder(folder.tenant, folder.path)
+            below = [k for k in self.steps if folder.propagate and _below(k, ref.key)]
+            for role, access in folder.roles.items():
+                self.add(f'{ref.key}/role:{role}', 'addRoleToItem', ref,
+                         self.role(folder.tenant, role), access, folder.propagate,
+                         output=_modified_id, after=below)
+        return Plan(self.steps.values())
+
+
+def _below(key: str, folder_key: str) -> bool:
+    # steps creating things inside the folder `folder_key`
+    tenant_path = folder_key.split(':', 1)[1]
+    kind, _, rest = key.partition(':')
+    return kind in ('folder', 'content') and rest.startswith((f'{tenant_path}/', f'{tenant_path}#'))
+
+
+def build_plan(spec: ProvisioningSpec) -> Plan:
+    return _Builder(spec).build()
+
+
+##
+# --- Execution ---
+##
+
+@dataclass
+class StepTiming:
+    started: float  # seconds since provisioning started
+    finished: float
+
+    @property
+    def elapsed(self) -> float:
+        return self.finished - self.started
+
+
+@dataclass
+class ProvisioningResult:
+    plan: Plan
+    ids: Dict[str, Any] = field(default_factory=dict)  # step key -> output, Plan.given included
+    errors: Dict[str, Exception] = field(default_factory=dict)
+    skipped: List[str] = field(default_factory=list)  # a dependency failed
+    timings: Dict[str, StepTiming] = field(default_factory=dict)
+    elapsed: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return not self.errors and not self.skipped
+
+    def raise_for_errors(self):
+        if self.errors:
+            key, err = next(iter(self.errors.items()))
+            raise APIException(f'{len(self.errors)} step(s) failed, {key}: {err}') from err
+
+    def critical_path(self) -> Tuple[List[str], float]:
+        # the chain of steps that ended last and the sum of their times, the wall
+        # clock no amount of parallelism gets below
+        finish: Dict[str, Tuple[float, List[str]]] = {}
+        for key in self.plan.order:
+            if key not in self.timings:
+                continue
+            before = max((finish[d] for d in self.plan.deps[key] if d in finish), default=(0.0, []))
+            finish[key] = (before[0] + self.timings[key].elapsed, before[1] + [key])
+        seconds, path = max(finish.values(), default=(0.0, []))
+        return path, seconds
+
+    def sequential_seconds(self) -> float:
+        # what running the steps one after the other would have taken
+        return sum(t.elapsed for t in self.timings.values())
+
+
+def provision(
+    api: API,
+    spec: Union[ProvisioningSpec, Plan],
+    workers: int = DEFAULT_WORKERS,
+    fail_fast: bool = False
+) -> ProvisioningResult:
+    # Runs every step once all it depends on succeeded. A failed step skips what
+    # depends on it and the rest carries on, unless fail_fast.
+    plan = spec if isinstance(spec, Plan) else build_plan(spec)
+    result = ProvisioningResult(plan, dict(plan.given))
+    waiting = {key: set(deps) for key, deps in plan.deps.items()}
+    ready = [key for key in plan.order if not waiting[key]]
+    start = time.perf_counter()
+
+    def run(step: Step) -> Tuple[Any, float, float]:
+        began = time.perf_counter() - start
+        args = _resolve(step.args, result.ids)
+        if isinstance(step.method, str):
+            value = getattr(api, step.method)(*args)
+        else:
+            value = step.method(api, *args)
+        if step.output is not None:
+            value = step.output(value)
+        return value, began, time.perf_counter() - start
+
+    def skip(key: str):
+        for user in plan.dependents.get(key, []):
+            if user not in result.skipped:
+                result.skipped.append(user)
+                skip(user)
+
+    pool = ThreadPoolExecutor(max_workers=workers)
+    in_flight = {}
+    try:
+        while ready or in_flight:
+            while ready and len(in_flight) < workers:
+                key = ready.pop(0)
+                in_flight[pool.submit(run, plan.steps[key])] = key
+            done, _ = wait(list(in_flight), return_when=FIRST_COMPLETED)
+            for future in done:
+                key = in_flight.pop(future)
+                try:
+                    value, began, ended = future.result()
+                except Exception as err:
+                    LOG.error(f'{key} failed: {err}')
+                    result.errors[key] = err
+                    skip(key)
+                    if fail_fast:
+                        ready.clear()
+                    continue
+                result.ids[key] = value
+                result.timings[key] = StepTiming(began, ended)
+                for user in plan.dependents.get(key, []):
+                    waiting[user].discard(key)
+                    if not waiting[user] and not (fail_fast and result.errors):
+                        ready.append(user)
+    finally:
+        for future in in_flight:
+            future.cancel()
+        pool.shutdown(wait=True)
+    # with fail_fast, what was never started
+    result.skipped.extend(
+        k for k in plan.order
+        if k not in result.ids and k not in result.errors and k not in result.skipped)
+    result.elapsed = time.perf_counter() - start
+    return result
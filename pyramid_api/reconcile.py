@@ -0,0 +1,263 @@
+from dataclasses import (
+    dataclass,
+    field
+)
+import logging
+from typing import (
+    Any,
+    Dict,
+    List,
+    Optional,
+    Set,
+    Tuple
+)
+
+from requests.exceptions import HTTPError
+
+from .api import (
+    API,
+    APIException
+)
+from .api_types import (
+    ContentType,
+    MaterializedItemType,
+    SearchMatchType
+)
+from .bulk import DEFAULT_WORKERS
+from .provisioning import (
+    Plan,
+    ProvisioningResult,
+    ProvisioningSpec,
+    Ref,
+    Step,
+    _create_tenant,
+    _refs,
+    build_plan,
+    provision
+)
+
+LOG = logging.getLogger(__name__)
+
+# Desired state reconciliation for provisioning specs. reconcile() reads what
+# already exists through the getters, drops the steps of the build_plan DAG whose
+# objects are there (their ids become Plan.given) and leaves a plan of only the
+# calls needed to converge, to print before applying it.
+#
+#   tenants     getTenantByName
+#   roles       getRolesByName, same tenant
+#   users       getUsersByName, same tenant
+#   servers     findServerByName, narrowed by getDataSourcesByTenant
+#   databases   getDataSourcesByTenant by name, getAllConnectionStrings tells apart
+#               databases of the same name on other servers
+#   folders     getFolderItems of the parent folder, by caption
+#   content     getFolderItems of its folder, by ContentSpec.name (always imported without one)
+#
+# Grants have no getter: pass the ids of a previous run as `known`
+# (ProvisioningResult.ids, ie saved as JSON) to skip them, otherwise they are
+# issued again, granting the same access. Lookups run level by level of the DAG,
+# each level's distinct lookups at once, and nothing is looked up below an object
+# that is missing.
+#
+#   rec = reconcile(api, spec, known=json.load(open('acme.ids.json')))
+#   print(rec.describe())
+#   result = rec.apply()
+#   json.dump(result.ids, open('acme.ids.json', 'w'))
+
+CREATE = '+'
+EXISTS = '='
+DRIFT = '~'
+
+# a getter call: (API method name, args)
+Lookup = Tuple[str, Tuple]
+
+
+@dataclass
+class Reconciliation:
+    api: API
+    plan: Plan  # what is left to do, plan.given holds what exists
+    # found by a getter, the rest of given was `known`
+    observed: Set[str] = field(default_factory=set)
+    # existing objects that differ from the spec in ways no endpoint can update
+    drift: Dict[str, str] = field(default_factory=dict)
+    lookups: int = 0  # getter calls made
+
+    @property
+    def changes(self) -> int:
+        return len(self.plan.steps)
+
+    def describe(self) -> str:
+        lines = [step.describe() for step in map(self.plan.steps.get, self.plan.order)]
+        lines = [f'{CREATE} {line}' for line in lines]
+        for key, value in self.plan.given.items():
+            how = '' if key in self.observed else ' (known)'
+            lines.append(f'{EXISTS} {key}: {value}{how}')
+        lines.extend(f'{DRIFT} {key}: {why}' for key, why in self.drift.items())
+        lines.append(
+            f'{self.changes} to apply, {len(self.plan.given)} unchanged, {len(self.drift)} drifted'
+            f' ({self.lookups} lookups)')
+        return '\n'.join(lines)
+
+    def apply(self, workers: int = DEFAULT_WORKERS, fail_fast: bool = False) -> ProvisioningResult:
+        return provision(self.api, self.plan, workers, fail_fast)
+
+
+class _Observer:
+    # finds the existing object of a plan step: lookups() are the getter calls
+    # it needs, match() picks the object from their results
+
+    def __init__(self, spec: ProvisioningSpec, plan: Plan, me: Optional[str]):
+        self.plan = plan
+        self.content_names = {
+            f'content:{c.tenant}/{c.folder.strip("/")}#{i}': c.name
+            for i, c in enumerate(spec.content)}
+        self.me = me  # getFolderItems wants a user
+
+    def _id(self, value: Any, ids: Dict[str, Any]) -> Any:
+        return ids.get(value.key) if isinstance(value, Ref) else value
+
+    def needs(self, step: Step) -> Set[str]:
+        # the steps whose ids the lookups of `step` use. Users and servers only need
+        # their tenant, so they are found even when one of their roles is new.
+        arg = step.args[0] if step.args else None
+        if step.method in ('createRole', 'createUserDb', 'createDataServer'):
+            return _refs(arg.tenantId)
+        if step.method == 'recognizeDataBase':
+            return {arg.key} | _refs(self.plan.steps[arg.key].args[0].tenantId)
+        return self.plan.deps[step.key]
+
+    def lookups(self, step: Step, ids: Dict[str, Any]) -> Optional[List[Lookup]]:
+        # None when the step cannot be observed
+        arg = step.args[0] if step.args else None
+        if step.method is _create_tenant:
+            return [('getTenantByName', (arg.name,))]
+        if step.method == 'getPublicOrGroupFolderByTenantId':
+            return [(step.method, (self._id(arg, ids), step.args[1]))]
+        if step.method == 'createRole':
+            return [('getRolesByName', (arg.roleName,))]
+        if step.method == 'createUserDb':
+            return [('getUsersByName', (arg.userName,))]
+        if step.method == 'createDataServer':
+            return [('findServerByName', (arg.serverName, SearchMatchType.equals)),
+                    ('getDataSourcesByTenant', (self._id(arg.tenantId, ids),))]
+        if step.method == 'recognizeDataBase':
+            server = self.plan.steps[arg.key].args[0]
+            return [('getDataSourcesByTenant', (self._id(server.tenantId, ids),)),
+                    ('getAllConnectionStrings', ())]
+        if step.method == 'createNewFolder':
+            return [('getFolderItems', (self.me, self._id(arg.parentFolderId, ids)))]
+        if step.method == 'importContent' and self.content_names.get(step.key):
+            return [('getFolderItems', (self.me, self._id(arg.rootFolderId, ids)))]
+        return None
+
+    def match(
+        self,
+        step: Step,
+        ids: Dict[str, Any],
+        found: List[Any]
+    ) -> Tuple[Optional[str], Optional[str]]:
+        # (id of the existing object or None, drift)
+        arg = step.args[0]
+        if step.method is _create_tenant:
+            return found[0].id, None
+        if step.method == 'getPublicOrGroupFolderByTenantId':
+            return found[0].id, None
+        if step.method == 'createRole':
+            tenant_id = self._id(arg.tenantId, ids)
+            roles = [r.roleId for r in found[0] if r.tenantId == tenant_id]
+            return (roles[0] if roles else None), None
+        if step.method == 'createUserDb':
+            tenant_id = self._id(arg.tenantId, ids)
+            users = [u for u in found[0] if u.tenantId == tenant_id]
+            if not users:
+                return None, None
+            wanted = [self._id(r, ids) for r in arg.roleIds or []]
+            if None not in wanted and sorted(wanted) != sorted(users[0].roleIds or []):
+                return users[0].id, (
+                    f'roles {users[0].roleIds} instead of {wanted}, no endpoint updates users')
+            return users[0].id, None
+        if step.method == 'createDataServer':
+            servers, sources = found
+            tenant_ids = {s.itemId for s in sources if s.itemType == MaterializedItemType.server}
+            ids_ = [s.itemId for s in servers if s.itemId in tenant_ids]
+            return (ids_[0] if ids_ else None), None
+        if step.method == 'recognizeDataBase':
+            sources, connections = found
+            server_id, name = self._id(arg, ids), step.args[1]
+            servers = {c.dataBaseId: c.serverId for c in connections}
+            dbs = [
+                s.itemId for s in sources
+                if s.itemType == MaterializedItemType.database and s.itemCaption == name
+                and servers.get(s.itemId, server_id) == server_id]
+            return (dbs[0] if len(dbs) == 1 else None), None
+        if step.method == 'createNewFolder':
+            items = [
+                i.id for i in found[0]
+                if i.caption == arg.folderName and i.contentType == ContentType.folder]
+            return (items[0] if items else None), None
+        if step.method == 'importContent':
+            name = self.content_names[step.key]
+            items = [
+                i.id for i in found[0] if i.caption == name and i.contentType != ContentType.folder]
+            return (items[0] if items else None), None
+        return None, None
+
+
+def _get(api: API, method: str, *args) -> Any:
+    # a getter, None where the object is missing: an error payload or status
+    # (some getters answer 404 / 500 for unknown names). Transport errors raise.
+    try:
+        return getattr(api, method)(*args)
+    except (APIException, HTTPError) as err:
+        LOG.debug(f'{method}{args} not found: {err}')
+        return None
+
+
+def reconcile(
+    api: API,
+    spec: ProvisioningSpec,
+    known: Dict[str, Any] = None,
+    workers: int = DEFAULT_WORKERS
+) -> Reconciliation:
+    # Only steps whose lookups have all they need are looked up: below a missing
+    # object everything is missing too. `known` ids are trusted for the steps no
+    # getter can check (grants, unnamed content).
+    known = known or {}
+    full = build_plan(spec)
+    observer = _Observer(spec, full, api.getMe().id if spec.folders or spec.content else None)
+    given: Dict[str, Any] = {}
+    observed: Set[str] = set()
+    drift: Dict[str, str] = {}
+    results: Dict[Lookup, Any] = {}
+    levels = full.levels()
+    for level in range(1, max(levels.values(), default=0) + 1):
+        wave = [
+            full.steps[key] for key in full.order
+            if levels[key] == level and observer.needs(full.steps[key]) <= given.keys()]
+        pending = {}
+        for step in wave:
+            lookups = observer.lookups(step, given)
+            if lookups is None:
+                if step.key in known:
+                    given[step.key] = known[step.key]
+                continue
+            pending[step.key] = lookups
+        needed = {lookup for lookups in pending.values() for lookup in lookups} - results.keys()
+        args = [(lookup,) for lookup in needed]
+        for res in api.bulk(lambda lookup: _get(api, lookup[0], *lookup[1]), args, workers):
+            if res.error is not None:
+                raise res.error
+            results[res.args[0]] = res.value
+        for key, lookups in pending.items():
+            step = full.steps[key]
+            found = [results[lookup] for lookup in lookups]
+            if any(f is None for f in found):
+                continue
+            existing, why = observer.match(step, given, found)
+            if existing is not None:
+                given[key] = existing
+                observed.add(key)
+            if why:
+                drift[key] = why
+    remaining = [step for key, step in full.steps.items() if key not in given]
+    LOG.info(f'{len(remaining)} of {len(full.steps)} steps to apply after {len(results)} lookups')
+    return Reconciliation(api, Plan(remaining, given), observed, drift, len(results))
@@ -0,0 +1,80 @@
+import asyncio
+from collections import Counter
+from concurrent.futures import Future
+import threading
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    Hashable
+)
+
+# Coalescing of identical in-flight calls, consulted by API._call_expect for
+# endpoints.READ_ENDPOINTS. While a call for a key is running, every other caller
+# asking for the same key waits for it and gets the same result (or exception)
+# instead of sending its own request. Nothing is kept once the call finishes,
+# that is what the ResponseCache is for. Results are shared, treat them as
+# read-only.
+#
+#   api = grant.get_api(single_flight=True)
+#   api.single_flight.stats()
+
+
+class SingleFlight:
+
+    def __init__(self):
+        self.calls: Counter = Counter()
+        self.saved: Counter = Counter()
+        self._running: Dict[Hashable, Any] = {}
+        self._lock = threading.Lock()
+
+    def do(self, endpoint: str, key: Hashable, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            future = self._running.get(key)
+            leader = future is None
+            if leader:
+                future = self._running[key] = Future()
+                self.calls[endpoint] += 1
+            else:
+                self.saved[endpoint] += 1
+        if not leader:
+            return future.result()
+        try:
+            future.set_result(fn())
+        except BaseException as err:
+            future.set_exception(err)
+        finally:
+            with self._lock:
+                del self._running[key]
+        return future.result()
+
+    async def do_async(self, endpoint: str, key: Hashable, fn: Callable[[], Awaitable]) -> Any:
+        task = self._running.get(key)
+        if task is not None:
+            self.saved[endpoint] += 1
+        else:
+            task = self._running[key] = asyncio.ensure_future(fn())
+            task.add_done_callback(lambda _: self._running.pop(key, None))
+            self.calls[endpoint] += 1
+        # a cancelled waiter must not cancel the call the others wait for
+        return await asyncio.shield(task)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'calls': sum(self.calls.values()),
+            'saved': sum(self.saved.values()),
+            'by_endpoint': {
+                e: {'calls': self.calls[e], 'saved': self.saved[e]}
+                for e in sorted(set(self.calls) | set(self.saved))
+            }
+        }
+
+
+def as_single_flight(single_flight: Any) -> SingleFlight:
+    # True -> a new SingleFlight, None / False -> no coalescing
+    if single_flight is True:
+        return SingleFlight()
+    if single_flight is None or single_flight is False:
+        return None
+    return single_flight
@@ -0,0 +1,361 @@
+import base64
+import codecs
+import io
+import json
+import mmap
+import os
+from typing import (
+    Any,
+    BinaryIO,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    Union
+)
+
+# Constant memory uploads. A PieFile stands in for the base64 string of a .pie
+# export inside a request body; StreamingJsonBody serializes everything around it
+# once and reads the file in chunks while the request is sent, so the payload is
+# never held in memory as a whole.
+#
+#   api.importContent(PieApiObject(folder_id, PieFile('export.pie')))
+#
+# And constant memory downloads: JsonArrayParser turns the chunks of a
+# {"data": [...]} response into items as they arrive, so stream=True list
+# endpoints hold one item at a time rather than the body, its text and the list.
+#
+#   for item in api.findContentItem(params, stream=True):
+#       ...
+
+DEFAULT_CHUNK_SIZE = 1 << 20
+RESPONSE_CHUNK_SIZE = 1 << 16
+
+_BASE64 = b'ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/='
+_TRAILING = b' \t\r\n'
+
+PieSource = Union[str, os.PathLike, BinaryIO, memoryview, bytes, bytearray, mmap.mmap]
+
+
+class PieFile:
+    # `source` is a path, a binary file object or a buffer (bytes, memoryview, mmap).
+    # .pie exports are already base64 text and are sent as is; encode=True base64
+    # encodes raw binary on the fly instead. use_mmap maps a path into memory
+    # rather than reading it through a file buffer.
+
+    def __init__(
+        self,
+        source: PieSource,
+        encode: bool = False,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        use_mmap: bool = False
+    ):
+        self.source = source
+        self.encode = encode
+        # base64 works on 3 byte groups, keep chunks aligned so they concatenate
+        self.chunk_size = chunk_size - chunk_size % 3 if encode else chunk_size
+        self.use_mmap = use_mmap
+        self._size = self._source_size()
+        # bytes this PieFile adds to the body, None when it cannot be known up front
+        self.length = self._length()
+
+    def __repr__(self) -> str:
+        return f'<PieFile {self._size} bytes>'
+
+    def _source_size(self) -> Optional[int]:
+        src = self.source
+        if isinstance(src, (str, os.PathLike)):
+            return os.path.getsize(src)
+        if isinstance(src, (bytes, bytearray, memoryview, mmap.mmap)):
+            return len(src)
+        try:
+            return os.fstat(src.fileno()).st_size - src.tell()
+        except (AttributeError, OSError, io.UnsupportedOperation):
+            pass
+        if getattr(src, 'seekable', lambda: False)():
+            pos = src.tell()
+            end = src.seek(0, io.SEEK_END)
+            src.seek(pos)
+            return end - pos
+        return None
+
+    @staticmethod
+    def _trailing_whitespace(buf) -> int:
+        # files written by editors often end in a newline, which is not base64
+        n = 0
+        while n < len(buf) and buf[len(buf) - 1 - n] in _TRAILING:
+            n += 1
+        return n
+
+    @staticmethod
+    def _trailing_whitespace_file(f: BinaryIO, start: int, end: int) -> int:
+        # same as above, reading backwards from `end` without moving the stream
+        pos = f.tell()
+        n = 0
+        try:
+            while end - n > start:
+                step = min(64, end - n - start)
+                f.seek(end - n - step)
+                block = f.read(step)
+                ws = PieFile._trailing_whitespace(block)
+                n += ws
+                if ws < step:
+                    break
+        finally:
+            f.seek(pos)
+        return n
+
+    def _chunks(self, buf) -> Iterator[bytes]:
+        # released explicitly, an mmap cannot be closed while a view is alive
+        with memoryview(buf) as view:
+            end = len(view)
+            if not self.encode:
+                end -= self._trailing_whitespace(view)
+            for i in range(0, end, self.chunk_size):
+                yield bytes(view[i:min(i + self.chunk_size, end)])
+
+    def _read_chunks(self, f: BinaryIO) -> Iterator[bytes]:
+        pending = b''
+        while True:
+            chunk = f.read(self.chunk_size)
+            if not chunk:
+                break
+            if self.encode:
+                # pipes and sockets return short reads, only whole 3 byte groups
+                # are encoded before the end or padding lands mid stream
+                chunk = pending + chunk
+                end = len(chunk) - len(chunk) % 3
+                pending = chunk[end:]
+                if end:
+                    yield chunk[:end]
+                continue
+            # hold back trailing whitespace until we know it really is trailing
+            chunk = pending + chunk
+            stripped = chunk.rstrip(_TRAILING)
+            pending = chunk[len(stripped):]
+            if stripped:
+                yield stripped
+        if self.encode and pending:
+            yield pending
+
+    def _raw(self) -> Iterator[bytes]:
+        src = self.source
+        if isinstance(src, (str, os.PathLike)):
+            with open(src, 'rb') as f:
+                if self.use_mmap and self._size:
+                    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                        yield from self._chunks(mm)
+                else:
+                    yield from self._read_chunks(f)
+        elif isinstance(src, (bytes, bytearray, memoryview, mmap.mmap)):
+            yield from self._chunks(src)
+        else:
+            yield from self._read_chunks(src)
+
+    def __iter__(self) -> Iterator[bytes]:
+        for chunk in self._raw():
+            if self.encode:
+                yield base64.b64encode(chunk)
+            else:
+                if chunk.translate(None, _BASE64):
+                    raise ValueError('PieFile data is not base64, pass encode=True for raw files')
+                yield chunk
+
+    def _length(self) -> Optional[int]:
+        if self._size is None:
+            return None
+        if self.encode:
+            return 4 * ((self._size + 2) // 3)
+        src = self.source
+        if isinstance(src, (bytes, bytearray, memoryview, mmap.mmap)):
+            with memoryview(src) as view:
+                return self._size - self._trailing_whitespace(view)
+        if isinstance(src, (str, os.PathLike)):
+            with open(src, 'rb') as f:
+                return self._size - self._trailing_whitespace_file(f, 0, self._size)
+        pos = src.tell()
+        return self._size - self._trailing_whitespace_file(src, pos, pos + self._size)
+
+
+_PLACEHOLDER = '\u0000__pie_file_{}__\u0000'
+
+
+class StreamingJsonBody:
+    # Iterable of the encoded JSON document with every PieFile value spliced in.
+    # `len` lets requests send a Content-Length instead of chunked encoding.
+
+    def __init__(self, document: Dict[str, Any]):
+        self.document = document
+        self.files: List[PieFile] = []
+        text = json.dumps(self._swap(document), allow_nan=False)
+        self.segments: List[bytes] = []
+        for i, _ in enumerate(self.files):
+            marker = json.dumps(_PLACEHOLDER.format(i))[1:-1]
+            head, text = text.split(marker, 1)
+            self.segments.append(head.encode('utf-8'))
+        self.segments.append(text.encode('utf-8'))
+
+    def _swap(self, value: Any) -> Any:
+        if isinstance(value, PieFile):
+            self.files.append(value)
+            return _PLACEHOLDER.format(len(self.files) - 1)
+        if isinstance(value, dict):
+            return {k: self._swap(v) for k, v in value.items()}
+        if isinstance(value, (list, tuple)):
+            return [self._swap(v) for v in value]
+        return value
+
+    def __repr__(self) -> str:
+        return f'<StreamingJsonBody {self.len} bytes>'
+
+    def __iter__(self) -> Iterator[bytes]:
+        for segment, file_ in zip(self.segments, self.files):
+            yield segment
+            yield from file_
+        yield self.segments[-1]
+
+    @property
+    def len(self) -> Optional[int]:
+        lengths = [f.length for f in self.files]
+        if None in lengths:
+            return None
+        return sum(len(s) for s in self.segments) + sum(lengths)
+
+
+##
+# --- Responses ---
+##
+
+_WHITESPACE = ' \t\r\n'
+
+_OBJECT, _KEY, _COLON, _VALUE, _FIRST_ITEM, _ITEM, _ITEM_END, _KEY_END, _DONE = range(9)
+
+
+class JsonArrayParser:
+    # Push parser for a {..., "<key>": [item, ...], ...} document. feed() takes the
+    # body in chunks of any size and returns the items completed so far, only the
+    # unparsed tail is kept. The other top level values end up in `fields`
+    # (ie 'error'), they are expected to be small.
+
+    def __init__(self, key: str = 'data'):
+        self.key = key
+        self.fields: Dict[str, Any] = {}
+        self.items = 0
+        self._text = ''
+        self._pos = 0
+        self._state = _OBJECT
+        self._field: Optional[str] = None
+        self._utf8 = codecs.getincrementaldecoder('utf-8')()
+        self._json = json.JSONDecoder()
+        self._final = False
+        # a value cut by a chunk boundary is retried once the buffer has doubled,
+        # so a value spanning many small chunks is not parsed over and over
+        self._retry_at = 0
+
+    @property
+    def buffered(self) -> int:
+        return len(self._text) - self._pos
+
+    @property
+    def done(self) -> bool:
+        return self._state == _DONE
+
+    def feed(self, chunk: bytes) -> List[Any]:
+        self._text = self._text[self._pos:] + self._utf8.decode(chunk)
+        self._retry_at -= self._pos
+        self._pos = 0
+        return self._parse()
+
+    def close(self) -> List[Any]:
+        # the items left at the end of the body, raises if the document is incomplete
+        self._text = self._text[self._pos:] + self._utf8.decode(b'', final=True)
+        self._pos = 0
+        self._final = True
+        self._retry_at = 0
+        items = self._parse()
+        if self._state != _DONE:
+            raise ValueError('truncated JSON document')
+        return items
+
+    def _char(self) -> Optional[str]:
+        text, pos = self._text, self._pos
+        while pos < len(text) and text[pos] in _WHITESPACE:
+            pos += 1
+        self._pos = pos
+        return text[pos] if pos < len(text) else None
+
+    def _expect(self, char: str, expected: str) -> str:
+        if char not in expected:
+            raise ValueError(f'expected one of {expected!r} at {char!r} in JSON document')
+        self._pos += 1
+        return char
+
+    def _value(self) -> Tuple[bool, Any]:
+        if len(self._text) < self._retry_at:
+            return False, None
+        try:
+            value, end = self._json.raw_decode(self._text, self._pos)
+        except json.JSONDecodeError:
+            if self._final:
+                raise
+            self._retry_at = len(self._text) + (len(self._text) - self._pos)
+            return False, None
+        if end == len(self._text) and not self._final:
+            # a number or literal running into the end of the buffer may go on
+            self._retry_at = len(self._text) + 1
+            return False, None
+        self._pos = end
+        return True, value
+
+    def _parse(self) -> List[Any]:
+        items = []
+        while True:
+            char = self._char()
+            if char is None:
+                return items
+            state = self._state
+            if state == _OBJECT:
+                self._expect(char, '{')
+                self._state = _KEY
+            elif state == _KEY:
+                if char == '}':
+                    self._pos += 1
+                    self._state = _DONE
+                    continue
+                ok, self._field = self._value()
+                if not ok:
+                    return items
+                self._state = _COLON
+            elif state == _COLON:
+                self._expect(char, ':')
+                self._state = _VALUE
+            elif state == _VALUE:
+                if self._field == self.key and char == '[':
+                    self._pos += 1
+                    self._state = _FIRST_ITEM
+                    continue
+                ok, value = self._value()
+                if not ok:
+                    return items
+                self.fields[self._field] = value
+                self._state = _KEY_END
+            elif state == _FIRST_ITEM:
+                if char == ']':
+                    self._pos += 1
+                    self._state = _KEY_END
+                else:
+                    self._state = _ITEM
+            elif state == _ITEM:
+                ok, value = self._value()
+                if not ok:
+                    return items
+                items.append(value)
+                self.items += 1
+                self._state = _ITEM_END
+            elif state == _ITEM_END:
+                self._state = _ITEM if self._expect(char, ',]') == ',' else _KEY_END
+            elif state == _KEY_END:
+                self._state = _KEY if self._expect(char, ',}') == ',' else _DONE
+            else:
+                raise ValueError('data after the end of the JSON document')
@@ -0,0 +1,86 @@
+import io
+import json
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    List
+)
+from urllib.parse import urlparse
+
+from requests import Response
+from requests.adapters import BaseAdapter
+from requests.structures import CaseInsensitiveDict
+
+from .api import (
+    API,
+    Grant
+)
+
+# In-process stand-in for a Pyramid server. Routes map an /API2 path to a handler
+# that receives the decoded request body and returns the response payload, or a
+# (status, payload) tuple.
+
+STUB_DOMAIN = 'http://pyramid.stub'
+
+
+class StubAdapter(BaseAdapter):
+
+    def __init__(self, routes: Dict[str, Callable[[Any], Any]] = None):
+        super().__init__()
+        self.routes = routes or {}
+        self.calls: List[Dict] = []
+
+    def _read_body(self, request):
+        body = request.body
+        if body is None:
+            return None
+        if not isinstance(body, (bytes, str)):
+            body = b''.join(
+                c if isinstance(c, bytes) else c.encode('utf-8') for c in body)
+        try:
+            return json.loads(body)
+        except ValueError:
+            return body
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        path = urlparse(request.url).path
+        body = self._read_body(request)
+        self.calls.append({'endpoint': path, 'body': body, 'timeout': timeout})
+        handler = self.routes.get(path)
+        if handler is None:
+            status, payload = 404, {'error': f'no stub route for {path}'}
+        else:
+            payload = handler(body)
+            status = 200
+            if isinstance(payload, tuple):
+                status, payload = payload
+        res = Response()
+        res.status_code = status
+        res.reason = 'OK' if status < 400 else 'Error'
+        res.url = request.url
+        res.request = request
+        res.encoding = 'utf-8'
+        res.headers = CaseInsensitiveDict({'Content-Type': 'application/json'})
+        content = payload if isinstance(payload, bytes) else json.dumps(payload).encode()
+        if stream:
+            # read back in small pieces, like a socket
+            res.raw = io.BytesIO(content)
+        else:
+            res._content = content
+        return res
+
+    def close(self):
+        pass
+
+
+def stub_api(routes: Dict[str, Callable[[Any], Any]] = None, **options) -> API:
+    api = Grant().get_api(**options)
+    api.domain = STUB_DOMAIN
+    api.token = 'stub-token'
+    api.session.mount(STUB_DOMAIN, StubAdapter(routes))
+    return api
+
+
+def stub_adapter(api: API) -> StubAdapter:
+    return api.session.get_adapter(STUB_DOMAIN)
@@ -0,0 +1,158 @@
+from contextlib import contextmanager
+import hashlib
+import hmac
+import json
+import logging
+import os
+import stat
+import time
+from typing import (
+    Any,
+    Dict,
+    Iterator,
+    Optional
+)
+
+try:
+    import fcntl
+except ImportError:  # not on Windows, writes there are still atomic but unlocked
+    fcntl = None
+
+LOG = logging.getLogger(__name__)
+
+# On-disk token cache shared by short lived processes, so that a cron job or
+# worker starting up reuses the token of the previous run instead of paying the
+# authenticateUser / getMe round trip. Tokens are keyed by domain and user name and
+# stored with a salted hash of the password, so a changed or wrong password logs
+# in rather than reusing the token. For TokenGrants only a hash of the already
+# validated token is kept. The file is
+# created 0600 in a 0700 directory and guarded by a lock file, so concurrent
+# processes never see a half written cache.
+#
+#   api = PasswordGrant(domain, user, pw).get_api(token_cache=True)
+#
+# A cached token is trusted as is. When the server rejects it (401 / 403) the
+# entry is dropped and API logs in again once.
+
+DEFAULT_PATH = os.path.join('~', '.cache', 'pyramid_api', 'tokens.json')
+ENV_PATH = 'PYRAMID_TOKEN_CACHE'
+PASSWORD_ROUNDS = 10000
+
+
+def _key(credential: Any) -> Optional[str]:
+    domain = (credential.domain or '').rstrip('/')
+    username = getattr(credential, 'username', None)
+    if username is not None:
+        return f'{domain}|{username}'
+    if credential.token:
+        return f'{domain}|#{hashlib.sha256(credential.token.encode("utf-8")).hexdigest()}'
+    return None
+
+
+def _password_hash(credential: Any, salt: str) -> str:
+    password = (getattr(credential, 'password', None) or '').encode('utf-8')
+    return hashlib.pbkdf2_hmac('sha256', password, bytes.fromhex(salt), PASSWORD_ROUNDS).hex()
+
+
+class TokenCache:
+
+    def __init__(self, path: str = None, max_age: float = None, clock=time.time):
+        # max_age (seconds) stops reusing tokens older than the server's session timeout
+        self.path = os.path.expanduser(path or os.environ.get(ENV_PATH) or DEFAULT_PATH)
+        self.max_age = max_age
+        self._clock = clock
+
+    @contextmanager
+    def _locked(self, exclusive: bool) -> Iterator[None]:
+        os.makedirs(os.path.dirname(self.path) or '.', mode=0o700, exist_ok=True)
+        fd = os.open(f'{self.path}.lock', os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            yield
+        finally:
+            # closing the descriptor releases the lock
+            os.close(fd)
+
+    def _read(self) -> Dict[str, Dict]:
+        try:
+            with open(self.path) as f:
+                mode = os.fstat(f.fileno()).st_mode
+                if mode & (stat.S_IRWXG | stat.S_IRWXO):
+                    LOG.warning(f'token cache {self.path} was readable by others, restricting to 0600')
+                    os.chmod(self.path, 0o600)
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except ValueError:
+            LOG.warning(f'ignoring corrupt token cache {self.path}')
+            return {}
+
+    def _write(self, entries: Dict[str, Dict]):
+        tmp = f'{self.path}.{os.getpid()}.tmp'
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w') as f:
+            json.dump(entries, f)
+        os.replace(tmp, self.path)
+
+    def get(self, credential: Any) -> Optional[str]:
+        # the token to use for `credential`, None when it has to log in
+        key = _key(credential)
+        if key is None:
+            return None
+        with self._locked(exclusive=False):
+            entry = self._read().get(key)
+        if entry is None:
+            return None
+        if self.max_age is not None and self._clock() - entry['created'] > self.max_age:
+            return None
+        if key.split('|', 1)[1].startswith('#'):
+            return credential.token
+        if 'salt' not in entry or not hmac.compare_digest(
+                _password_hash(credential, entry['salt']), entry.get('password', '')):
+            return None
+        return entry['token']
+
+    def put(self, credential: Any, token: str):
+        key = _key(credential)
+        if key is None:
+            return
+        # TokenGrants already hold their token, only remember that it was valid
+        entry = {'created': self._clock()}
+        if getattr(credential, 'username', None) is not None:
+            entry['token'] = token
+            entry['salt'] = os.urandom(16).hex()
+            entry['password'] = _password_hash(credential, entry['salt'])
+        with self._locked(exclusive=True):
+            entries = self._read()
+            entries[key] = entry
+            self._write(entries)
+
+    def discard(self, credential: Any, token: str = None):
+        # drop the entry, or only if it still holds `token` (another process may
+        # have stored a fresh one meanwhile)
+        key = _key(credential)
+        if key is None:
+            return
+        with self._locked(exclusive=True):
+            entries = self._read()
+            entry = entries.get(key)
+            if entry is None or (token is not None and entry.get('token', token) != token):
+                return
+            del entries[key]
+            self._write(entries)
+
+    def clear(self):
+        with self._locked(exclusive=True):
+            self._write({})
+
+
+def as_token_cache(token_cache: Any) -> Optional[TokenCache]:
+    # True -> default location, a str -> that file, None / False -> no cache
+    if token_cache is True:
+        return TokenCache()
+    if token_cache is None or token_cache is False:
+        return None
+    if isinstance(token_cache, (str, os.PathLike)):
+        return TokenCache(os.fspath(token_cache))
+    return token_cache
@@ -0,0 +1,207 @@
+from dataclasses import (
+    asdict,
+    dataclass
+)
+import itertools
+import json
+import logging
+import threading
+from typing import (
+    Any,
+    Callable,
+    FrozenSet,
+    Optional,
+    Union
+)
+
+from .endpoints import AUTHENTICATE_USER
+
+LOG = logging.getLogger(__name__)
+
+# Request/response tracing for API._call_api. Nothing is formatted unless a call
+# is actually traced: LazyJson defers json.dumps until a log record is emitted,
+# and a Tracer only scrubs the payloads of the calls it samples.
+#
+# Secrets are masked by key in JSON payloads. Bodies that are plain text rather
+# than JSON (authenticateUser answers with the bare session token) are never
+# traced or logged, only their length.
+
+REDACTED_KEYS: FrozenSet[str] = frozenset(['auth', 'password', 'token'])
+# endpoints whose whole response is a secret
+REDACTED_ENDPOINTS: FrozenSet[str] = frozenset([AUTHENTICATE_USER])
+REDACTED = '***'
+DEFAULT_MAX_CHARS = 2000
+
+
+def scrub(
+    value: Any,
+    redact_keys: FrozenSet[str] = REDACTED_KEYS,
+    max_chars: int = DEFAULT_MAX_CHARS
+) -> Any:
+    # copy of value with secrets masked and long strings (ie base64 .pie data) cut
+    # short, so the cost of formatting never depends on the payload size
+    if isinstance(value, dict):
+        return {
+            k: REDACTED if k in redact_keys and v is not None else scrub(v, redact_keys, max_chars)
+            for k, v in value.items()
+        }
+    if isinstance(value, (list, tuple)):
+        return [scrub(v, redact_keys, max_chars) for v in value]
+    if isinstance(value, str) and max_chars and len(value) > max_chars:
+        return f'{value[:max_chars]}... [{len(value)} chars]'
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return f'<{len(value)} bytes>'
+    return value
+
+
+def scrub_text(
+    text: str,
+    redact_keys: FrozenSet[str] = REDACTED_KEYS,
+    max_chars: int = DEFAULT_MAX_CHARS
+) -> Any:
+    # a response body kept as text: JSON (ie an error body) is scrubbed as above,
+    # anything else may be a token and only its length is kept
+    try:
+        value = json.loads(text)
+    except ValueError:
+        value = None
+    if isinstance(value, (dict, list)):
+        return scrub(value, redact_keys, max_chars)
+    return f'<{len(text)} chars of text>'
+
+
+class LazyJson:
+    # pass as a logging argument, `LOG.debug('%s', LazyJson(body))`
+    __slots__ = ('value', 'indent', 'redact_keys', 'max_chars')
+
+    def __init__(
+        self,
+        value: Any,
+        indent: int = 2,
+        redact_keys: FrozenSet[str] = REDACTED_KEYS,
+        max_chars: int = DEFAULT_MAX_CHARS
+    ):
+        self.value = value
+        self.indent = indent
+        self.redact_keys = redact_keys
+        self.max_chars = max_chars
+
+    def __str__(self) -> str:
+        if isinstance(self.value, str) and self.redact_keys:
+            value = scrub_text(self.value, self.redact_keys, self.max_chars)
+        else:
+            value = scrub(self.value, self.redact_keys, self.max_chars)
+        if isinstance(value, str):
+            return value
+        return json.dumps(value, indent=self.indent, default=str)
+
+
+@dataclass
+class TraceRecord:
+    endpoint: str
+    method: str
+    status: Optional[int]
+    elapsed: float  # seconds
+    request: Any
+    response: Any
+    error: Optional[str] = None
+
+
+class FileSink:
+    # appends one JSON line per TraceRecord
+
+    def __init__(self, path_: str):
+        self.path = path_
+        self._lock = threading.Lock()
+
+    def __call__(self, record: TraceRecord):
+        line = json.dumps(asdict(record), default=str)
+        with self._lock:
+            with open(self.path, 'a') as f:
+                f.write(line + '\n')
+
+
+class LogSink:
+
+    def __init__(self, logger: logging.Logger = LOG, level: int = logging.INFO):
+        self.logger = logger
+        self.level = level
+
+    def __call__(self, record: TraceRecord):
+        self.logger.log(
+            self.level,
+            '%s %s -> %s in %.1fms%s\nrequest: %s\nresponse: %s',
+            record.method,
+            record.endpoint,
+            record.status,
+            record.elapsed * 1000,
+            f' ({record.error})' if record.error else '',
+            LazyJson(record.request, redact_keys=frozenset(), max_chars=0),
+            LazyJson(record.response, redact_keys=frozenset(), max_chars=0)
+        )
+
+
+class Tracer:
+    # Samples calls and hands scrubbed TraceRecords to `sink`, a callable, a file
+    # path (JSON lines) or None for logging. A call is traced when it is one of
+    # every `sample_every` calls, when it took at least `slow_threshold` seconds,
+    # or when it failed. sample_every=0 traces only slow and failed calls.
+
+    def __init__(
+        self,
+        sink: Union[None, str, Callable[[TraceRecord], Any]] = None,
+        sample_every: int = 1,
+        slow_threshold: float = None,
+        max_chars: int = DEFAULT_MAX_CHARS,
+        redact_keys: FrozenSet[str] = REDACTED_KEYS
+    ):
+        if sink is None:
+            sink = LogSink()
+        elif isinstance(sink, str):
+            sink = FileSink(sink)
+        self.sink = sink
+        self.sample_every = sample_every
+        self.slow_threshold = slow_threshold
+        self.max_chars = max_chars
+        self.redact_keys = frozenset(redact_keys)
+        self._counter = itertools.count()
+
+    def sampled(self, elapsed: float, failed: bool) -> bool:
+        n = next(self._counter)
+        if failed:
+            return True
+        if self.slow_threshold is not None and elapsed >= self.slow_threshold:
+            return True
+        return bool(self.sample_every) and n % self.sample_every == 0
+
+    def record(
+        self,
+        endpoint: str,
+        method: str,
+        status: Optional[int],
+        elapsed: float,
+        request: Any,
+        response: Any,
+        error: BaseException = None
+    ):
+        if not self.sampled(elapsed, error is not None):
+            return
+        if endpoint in REDACTED_ENDPOINTS:
+            response = REDACTED
+        elif isinstance(response, str):
+            response = scrub_text(response, self.redact_keys, self.max_chars)
+        else:
+            response = scrub(response, self.redact_keys, self.max_chars)
+        try:
+            self.sink(TraceRecord(
+                endpoint,
+                method,
+                status,
+                elapsed,
+                scrub(request, self.redact_keys, self.max_chars),
+                response,
+                f'{type(error).__name__}: {error}' if error is not None else None
+            ))
+        except Exception as err:
+            # a broken sink must never fail the API call
+            LOG.warning(f'trace sink failed: {err}')
@@ -0,0 +1,173 @@
+import csv
+from dataclasses import dataclass
+from enum import IntEnum
+import json
+import logging
+import os
+from typing import (
+    Any,
+    Dict,
+    Iterator,
+    Optional,
+    get_type_hints
+)
+
+from .api import API
+from .api_types import User
+from .bulk import (
+    DEFAULT_WORKERS,
+    BulkResult
+)
+
+LOG = logging.getLogger(__name__)
+
+# Streams users from a CSV or JSONL file through API.createUserDb. Rows are read
+# lazily and only the rows in flight in the bulk executor are held in memory, so
+# file size does not matter. Every row gets a line in the result file.
+#
+#   import_users(api, 'users.csv', 'users.result.csv', defaults={'tenantId': tid})
+
+_USER_TYPES = get_type_hints(User)
+RESULT_COLUMNS = ['row', 'userName', 'success', 'id', 'error']
+
+
+@dataclass
+class ImportSummary:
+    total: int = 0
+    created: int = 0
+    failed: int = 0
+
+
+def _format_of(path_: str, fmt: Optional[str]) -> str:
+    fmt = fmt or os.path.splitext(path_)[1].lstrip('.').lower()
+    if fmt in ('jsonl', 'ndjson'):
+        return 'jsonl'
+    if fmt == 'csv':
+        return 'csv'
+    raise ValueError(f'unknown user file format: {fmt}, expected csv or jsonl')
+
+
+def read_rows(path_: str, fmt: str = None) -> Iterator[Dict[str, Any]]:
+    fmt = _format_of(path_, fmt)
+    with open(path_, 'r', newline='', encoding='utf-8') as f:
+        if fmt == 'csv':
+            yield from csv.DictReader(f)
+            return
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def _coerce(name: str, value: Any, list_sep: str) -> Any:
+    type_ = _USER_TYPES[name]
+    if isinstance(value, str):
+        value = value.strip()
+        if value == '':
+            return None
+    if getattr(type_, '__origin__', None) is list:
+        if isinstance(value, str):
+            return [v.strip() for v in value.split(list_sep) if v.strip()]
+        return list(value)
+    # Optional[int] and friends
+    args = [a for a in getattr(type_, '__args__', ()) if a is not type(None)]
+    if getattr(type_, '__origin__', None) is not None and len(args) == 1:
+        type_ = args[0]
+    if isinstance(type_, type) and issubclass(type_, IntEnum):
+        # accept both the wire value and the member name, ie `200` or `professional`
+        if isinstance(value, str) and not value.lstrip('-').isdigit():
+            return type_[value.lower()]
+        return type_(int(value))
+    if type_ is int and isinstance(value, str):
+        return int(value)
+    if type_ is bool and isinstance(value, str):
+        return value.lower() in ('1', 'true', 'yes', 'y')
+    return value
+
+
+def row_to_user(
+    row: Dict[str, Any],
+    column_map: Dict[str, str] = None,
+    defaults: Dict[str, Any] = None,
+    list_sep: str = ';'
+) -> User:
+    # column_map renames source columns to User fields, unknown columns are ignored
+    values = dict(defaults or {})
+    column_map = column_map or {}
+    for column, value in row.items():
+        name = column_map.get(column, column)
+        if name not in _USER_TYPES:
+            continue
+        value = _coerce(name, value, list_sep)
+        if value is not None:
+            values[name] = value
+    return User(**values)
+
+
+def _result_row(res: BulkResult, name_column: str) -> Dict[str, Any]:
+    index, row = res.args
+    out = {'row': index + 1, 'userName': row.get(name_column), 'success': False,
+           'id': None, 'error': None}
+    if res.error is not None:
+        out['error'] = f'{type(res.error).__name__}: {res.error}'
+    elif not res.value.success:
+        out['error'] = res.value.errorMessage
+    else:
+        out['success'] = True
+        if res.value.modifiedList:
+            out['id'] = res.value.modifiedList[0].id
+    return out
+
+
+class _ResultWriter:
+
+    def __init__(self, path_: str, fmt: str = None):
+        self.fmt = _format_of(path_, fmt)
+        self.f = open(path_, 'w', newline='', encoding='utf-8')
+        if self.fmt == 'csv':
+            self.writer = csv.DictWriter(self.f, RESULT_COLUMNS)
+            self.writer.writeheader()
+
+    def write(self, row: Dict[str, Any]):
+        if self.fmt == 'csv':
+            self.writer.writerow(row)
+        else:
+            self.f.write(json.dumps(row) + '\n')
+
+    def close(self):
+        self.f.close()
+
+
+def import_users(
+    api: API,
+    source_path: str,
+    result_path: str,
+    fmt: str = None,
+    column_map: Dict[str, str] = None,
+    defaults: Dict[str, Any] = None,
+    list_sep: str = ';',
+    workers: int = DEFAULT_WORKERS,
+    result_fmt: str = None
+) -> ImportSummary:
+    # Formats are taken from the file extensions unless given. Results are written
+    # in completion order, `row` is the 1-based record number in the source file.
+    def create(index: int, row: Dict[str, Any]):
+        return api.createUserDb(row_to_user(row, column_map, defaults, list_sep))
+
+    name_column = next(
+        (c for c, f in (column_map or {}).items() if f == 'userName'), 'userName')
+    summary = ImportSummary()
+    writer = _ResultWriter(result_path, result_fmt)
+    try:
+        rows = enumerate(read_rows(source_path, fmt))
+        for res in api.bulk(create, rows, workers=workers, ordered=False):
+            out = _result_row(res, name_column)
+            writer.write(out)
+            summary.total += 1
+            if out['success']:
+                summary.created += 1
+            else:
+                summary.failed += 1
+    finally:
+        writer.close()
+    LOG.info(f'imported users from {source_path}: {summary}')
+    return summary
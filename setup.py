@@ -8,6 +8,11 @@ setup(
     packages=['pyramid_api'],
     # requires=['dataclasses-json', 'requests'],
     setup_requires=['pytest','pytest-runner', 'requests'],
+    extras_require={
+        'async': ['aiohttp'],
+        'columnar': ['numpy', 'pandas'],
+        'zstd': ['zstandard'],
+    },
     url='https://github.com/shawnsarwar/pyramid_analytics_api',
     keywords=['REST', 'pyramidanalytics', 'pyramid', 'analytics'],
     classifiers=[]
@@ -0,0 +1,225 @@
+import asyncio
+import logging
+import time
+
+import pytest
+
+from ..pyramid_api.api import (
+    APIException,
+    PasswordGrant,
+    TokenGrant
+)
+
+from ..pyramid_api.api_types import (
+    ContentItem,
+    ImportApiResultObject,
+    PieApiObject,
+    User
+)
+
+from ..pyramid_api.streaming import (
+    PieFile
+)
+
+web = pytest.importorskip('aiohttp.web')
+
+from ..pyramid_api.async_api import AsyncAPI
+
+
+LOG = logging.getLogger(__name__)
+
+ME = {'data': {'tenantId': 't1', 'userName': 'admin', 'id': 'u1'}}
+PIE_PATH = './tests/content/TimeSeriesRadar.pie'
+ITEM = {'id': 'i1', 'parentId': 'f1', 'caption': 'c', 'itemType': 1, 'contentType': 3}
+
+
+async def _serve(state):
+    async def authenticate(request):
+        body = await request.json()
+        if body['data']['password'] != 'pw':
+            return web.Response(status=401)
+        return web.json_response('the-token')
+
+    async def get_me(request):
+        body = await request.json()
+        if body['auth'] != 'the-token':
+            return web.Response(status=403)
+        return web.json_response(ME)
+
+    async def folder_items(request):
+        state['in_flight'] += 1
+        state['peak'] = max(state['peak'], state['in_flight'])
+        if state.pop('stall', False):
+            await asyncio.sleep(2)
+        await asyncio.sleep(0.01)
+        state['in_flight'] -= 1
+        return web.json_response({'data': [ITEM, ITEM]})
+
+    async def create_user(request):
+        return web.json_response({'data': {'success': True, 'modifiedList': []}})
+
+    async def import_content(request):
+        body = await request.json()
+        state['uploaded'] = body['pieApiObject']['fileZippedData']
+        return web.json_response({'data': {}})
+
+    app = web.Application(client_max_size=1 << 24)
+    app.router.add_post('/API2/content/importContent', import_content)
+    app.router.add_post('/API2/auth/authenticateUser', authenticate)
+    app.router.add_post('/API2/access/getMe', get_me)
+    app.router.add_post('/API2/access/createUserDb', create_user)
+    app.router.add_post('/API2/content/getFolderItems', folder_items)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f'http://127.0.0.1:{port}'
+
+
+@pytest.mark.offline
+def test__async_api():
+    async def run():
+        state = {'in_flight': 0, 'peak': 0}
+        runner, domain = await _serve(state)
+        try:
+            api = await PasswordGrant(domain, 'admin', 'pw').get_async_api(max_concurrency=4)
+            async with api:
+                assert(isinstance(api, AsyncAPI))
+                assert(api.token == 'the-token')
+                assert(isinstance(await api.getMe(), User))
+                results = await asyncio.gather(
+                    *[api.getFolderItems('u1', f'f{i}') for i in range(20)])
+                assert(all(isinstance(i, ContentItem) for r in results for i in r))
+                assert(state['peak'] <= 4)
+                bulk = [r async for r in api.bulk(
+                    api.getFolderItems, [('u1', f'f{i}') for i in range(10)], workers=3)]
+                assert([r.index for r in bulk] == list(range(10)))
+                assert(all(r.ok for r in bulk))
+                pie = PieFile(PIE_PATH, chunk_size=4096)
+                assert(isinstance(
+                    await api.importContent(PieApiObject('f1', pie)), ImportApiResultObject))
+                assert(state['uploaded'] == PieApiObject.dataFromPath(PIE_PATH))
+                metrics = api.metrics.snapshot()
+                assert(metrics['/API2/content/getFolderItems']['calls'] == 30)
+                assert(metrics['/API2/content/importContent']['request_bytes']['sum'] > 0)
+                assert(metrics['/API2/access/getMe']['response_bytes']['count'] == 1)
+
+            async with await TokenGrant(domain, 'the-token').get_async_api() as api:
+                assert((await api.getMe()).id == 'u1')
+
+            with pytest.raises(APIException):
+                await PasswordGrant(domain, 'admin', 'wrong').get_async_api()
+            with pytest.raises(APIException):
+                await TokenGrant(domain, 'stale').get_async_api()
+        finally:
+            await runner.cleanup()
+    asyncio.run(run())
+
+
+@pytest.mark.offline
+def test__async_hedging():
+    from ..pyramid_api.latency import LatencyPolicy
+
+    async def run():
+        state = {'in_flight': 0, 'peak': 0}
+        runner, domain = await _serve(state)
+        policy = LatencyPolicy(hedge=True, hedge_budget=1.0, min_samples=5)
+        try:
+            async with await TokenGrant(domain, 'the-token').get_async_api(latency=policy) as api:
+                for i in range(5):
+                    await api.getFolderItems('u1', f'f{i}')
+                state['stall'] = True
+                start = asyncio.get_running_loop().time()
+                assert(len(await api.getFolderItems('u1', 'slow')) == 2)
+                assert(asyncio.get_running_loop().time() - start < 1)
+                assert(policy.hedge_wins['/API2/content/getFolderItems'] == 1)
+        finally:
+            await runner.cleanup()
+    asyncio.run(run())
+
+
+@pytest.mark.offline
+def test__async_single_flight():
+    async def run():
+        state = {'in_flight': 0, 'peak': 0}
+        runner, domain = await _serve(state)
+        try:
+            grant = TokenGrant(domain, 'the-token')
+            async with await grant.get_async_api(single_flight=True) as api:
+                results = await asyncio.gather(*[api.getFolderItems('u1', 'f1') for _ in range(10)])
+                assert(all(r is results[0] for r in results))
+                assert(state['peak'] == 1)
+                assert(api.single_flight.stats()['saved'] == 9)
+        finally:
+            await runner.cleanup()
+    asyncio.run(run())
+
+
+@pytest.mark.offline
+def test__async_hooks():
+    from ..pyramid_api.hooks import Profiler
+
+    async def run():
+        state = {'in_flight': 0, 'peak': 0}
+        runner, domain = await _serve(state)
+        profiler = Profiler()
+        try:
+            async with await TokenGrant(domain, 'the-token').get_async_api(hooks=profiler) as api:
+                await asyncio.gather(*[api.getFolderItems('u1', f'f{i}') for i in range(10)])
+                stats = profiler.stats()['/API2/content/getFolderItems']
+                assert(stats['calls'] == 10)
+                assert({'queue', 'serialize', 'network', 'parse', 'decode'} <= set(stats['phases']))
+                assert(stats['phases']['network']['mean'] >= 0.01)
+                items = [i async for i in api.getFolderItems('u1', 'f1', stream=True)]
+                stats = profiler.stats()['/API2/content/getFolderItems']
+                assert(len(items) == 2 and stats['calls'] == 11 and 'decode' in stats['phases'])
+        finally:
+            await runner.cleanup()
+    asyncio.run(run())
+
+
+@pytest.mark.offline
+def test__async_hooks_encode_per_call(monkeypatch):
+    # calls gathered together each count only their own encoding
+    from ..pyramid_api import hooks
+    from ..pyramid_api.hooks import Hooks
+    encode = hooks.encode
+
+    def slow_encode(obj, drop_nulls=True):
+        if obj.userName == 'slow':
+            time.sleep(0.05)
+        return encode(obj, drop_nulls)
+    monkeypatch.setattr(hooks, 'encode', slow_encode)
+
+    async def run():
+        runner, domain = await _serve({})
+        after = []
+        try:
+            hooks_ = Hooks(after=[after.append])
+            async with await TokenGrant(domain, 'the-token').get_async_api(hooks=hooks_) as api:
+                await asyncio.gather(
+                    api.createUserDb(User('t1', 'slow')), api.createUserDb(User('t1', 'fast')))
+                created = [c for c in after if c.endpoint == '/API2/access/createUserDb']
+                encoding = sorted(call.phases['encode'] for call in created)
+                assert(encoding[0] < 0.01 and encoding[1] >= 0.05)
+        finally:
+            await runner.cleanup()
+    asyncio.run(run())
+
+
+@pytest.mark.offline
+def test__async_stream():
+    async def run():
+        state = {'in_flight': 0, 'peak': 0}
+        runner, domain = await _serve(state)
+        try:
+            async with await TokenGrant(domain, 'the-token').get_async_api() as api:
+                items = [i async for i in api.getFolderItems('u1', 'f1', stream=True)]
+                assert(items == await api.getFolderItems('u1', 'f1'))
+                assert(all(isinstance(i, ContentItem) for i in items))
+                table = await api.getFolderItems('u1', 'f1', columnar=True)
+                assert(len(table) == 2 and list(table['id']) == ['i1', 'i1'])
+        finally:
+            await runner.cleanup()
+    asyncio.run(run())
@@ -0,0 +1,30 @@
+import logging
+
+import pytest
+
+from ..benchmarks.suite import (
+    compare,
+    run_suite,
+    to_document,
+    uncovered
+)
+
+
+LOG = logging.getLogger(__name__)
+
+
+@pytest.mark.offline
+def test__benchmark_suite():
+    # every endpoint method needs a case, new ones must be added to CASES
+    assert(uncovered() == [])
+    results = run_suite('^getFolderItems/1000$|^createUserDb$|importContent\\[PieFile\\]/1KB',
+                        quick=True, min_time=0, echo=LOG.debug)
+    assert(sorted(results) == ['createUserDb', 'getFolderItems/1000', 'importContent[PieFile]/1KB'])
+    assert(all(r.ops_per_sec > 0 and r.iterations >= 3 for r in results.values()))
+
+    current = to_document(results)
+    assert(compare(current, current) == [])
+    slower = to_document(results)
+    slower['results']['createUserDb'] = dict(
+        slower['results']['createUserDb'], ops_per_sec=current['results']['createUserDb']['ops_per_sec'] / 2)
+    assert(len(compare(slower, current)) == 1)
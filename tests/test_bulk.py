@@ -0,0 +1,148 @@
+import logging
+import time
+
+import pytest
+
+from ..pyramid_api.api_types import (
+    ModifiedItemsResult,
+    User
+)
+
+from ..pyramid_api.testing import (
+    stub_api
+)
+
+
+LOG = logging.getLogger(__name__)
+
+
+def _create_user(body):
+    name = body['user']['userName']
+    if name.startswith('bad'):
+        return 500, {'error': 'cannot create'}
+    # later users answer first so completion order differs from input order
+    time.sleep(0.02 / (1 + int(name[1:])))
+    return {'data': {'success': True, 'modifiedList': [{'id': name}]}}
+
+
+def _users(n, bad=()):
+    return [User('t1', f'bad{i}' if i in bad else f'u{i}') for i in range(n)]
+
+
+@pytest.mark.offline
+def test__bulk_ordered_captures_errors():
+    api = stub_api({'/API2/access/createUserDb': _create_user}, pool_maxsize=4)
+    results = list(api.bulk(api.createUserDb, _users(20, bad={3, 7}), workers=4))
+    assert([r.index for r in results] == list(range(20)))
+    assert([r.index for r in results if not r.ok] == [3, 7])
+    assert(all(isinstance(r.value, ModifiedItemsResult) for r in results if r.ok))
+    assert(results[5].value.modifiedList[0]['id'] == 'u5')
+
+
+@pytest.mark.offline
+def test__bulk_completion_order_and_map():
+    api = stub_api({'/API2/access/createUserDb': _create_user}, pool_maxsize=4)
+    results = list(api.bulk('createUserDb', _users(8), workers=4, ordered=False))
+    assert(sorted(r.index for r in results) == list(range(8)))
+    assert([r.index for r in results] != list(range(8)))
+
+    values = list(api.map(api.createUserDb, ((u,) for u in _users(5, bad={2})),
+                          return_exceptions=True))
+    assert(isinstance(values[2], Exception))
+    with pytest.raises(Exception):
+        list(api.map(api.createUserDb, _users(5, bad={2})))
+
+
+@pytest.mark.offline
+def test__import_users(tmp_path):
+    from ..pyramid_api.user_import import import_users, read_rows
+    created = []
+
+    def create(body):
+        created.append(body['user'])
+        return _create_user(body)
+
+    api = stub_api({'/API2/access/createUserDb': create})
+    source = tmp_path / 'users.csv'
+    source.write_text(
+        'login,roleIds,clientLicenseType,adminType,email\n'
+        'u1,r1;r2,professional,1,a@b.c\n'
+        'bad2,r1,100,none,\n'
+        'u3,,0,0,\n'
+    )
+    result = tmp_path / 'users.result.jsonl'
+    summary = import_users(api, str(source), str(result), column_map={'login': 'userName'},
+                           defaults={'tenantId': 't1'}, workers=2)
+    assert((summary.total, summary.created, summary.failed) == (3, 2, 1))
+    by_name = {u['userName']: u for u in created}
+    assert(by_name['u1']['roleIds'] == ['r1', 'r2'])
+    assert(by_name['u1']['clientLicenseType'] == 200)
+    assert(by_name['u1']['adminType'] == 1)
+    assert(by_name['u3']['tenantId'] == 't1')
+    assert('email' not in by_name['u3'])
+    rows = sorted(read_rows(str(result)), key=lambda r: r['row'])
+    assert([r['success'] for r in rows] == [True, False, True])
+    assert(rows[0]['id'] == 'u1')
+    assert(rows[1]['userName'] == 'bad2')
+    assert(rows[1]['error'])
+
+
+@pytest.mark.unit
+@pytest.mark.helpers
+def test__aimd_controller():
+    from requests import Response
+    from requests.exceptions import HTTPError
+    from ..pyramid_api.concurrency import ConcurrencyController
+    c = ConcurrencyController(initial_limit=2, max_limit=3, latency_tolerance=float('inf'))
+    ep = '/API2/access/createUserDb'
+
+    # additive increase only while the limit is in use
+    for _ in range(4):
+        a, b = c.acquire(ep), c.acquire(ep)
+        c.release(ep, a)
+        c.release(ep, b)
+    assert(c.limit(ep) == 3)
+    assert([h.reason for h in c.history(ep)] == ['increase'])
+
+    # server errors halve it, once per burst; client errors are not a load signal
+    response = Response()
+    response.status_code = 503
+    started = [c.acquire(ep) for _ in range(3)]
+    for s in started:
+        c.release(ep, s, HTTPError(response=response))
+    assert(c.limit(ep) == 1)
+    response.status_code = 400
+    c.release(ep, c.acquire(ep), HTTPError(response=response))
+    assert(c.limit(ep) == 1 and c.in_flight(ep) == 0)
+
+    # rising latency also backs off
+    slow = ConcurrencyController(initial_limit=8)
+    for _ in range(3):
+        slow.release(ep, slow.acquire(ep))
+    slow.release(ep, slow.acquire(ep) - 10)
+    assert(slow.limit(ep) == 4 and slow.history(ep)[-1].reason == 'latency')
+
+
+@pytest.mark.offline
+def test__bulk_with_concurrency_controller():
+    import threading
+    from ..pyramid_api.concurrency import ConcurrencyController
+    state = {'in_flight': 0, 'peak': 0}
+    lock = threading.Lock()
+
+    def create(body):
+        with lock:
+            state['in_flight'] += 1
+            state['peak'] = max(state['peak'], state['in_flight'])
+        time.sleep(0.005)
+        with lock:
+            state['in_flight'] -= 1
+        return _create_user(body)
+
+    controller = ConcurrencyController(initial_limit=2, max_limit=6, latency_tolerance=float('inf'))
+    api = stub_api({'/API2/access/createUserDb': create}, pool_maxsize=16, concurrency=controller)
+    results = list(api.bulk(api.createUserDb, _users(60, bad={50}), workers=16))
+    assert(len(results) == 60 and sum(not r.ok for r in results) == 1)
+    assert(state['peak'] <= 6)
+    history = controller.history('/API2/access/createUserDb')
+    assert(history[0].reason == 'increase' and 'error' in [h.reason for h in history])
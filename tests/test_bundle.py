@@ -0,0 +1,110 @@
+import gzip
+import json
+import os
+
+import pytest
+
+from ..pyramid_api.api_types import (
+    Role,
+    Server,
+    User
+)
+from ..pyramid_api.bundle import (
+    BundleReader,
+    BundleWriter,
+    pack,
+    write_bundle
+)
+from ..pyramid_api.helper_types import (
+    MetaData,
+    WrappedType
+)
+
+
+def _records(count):
+    for i in range(count):
+        obj = [User('acme', f'user{i}'), Role('acme', f'role{i}'), Server(5432, f'pg{i}')][i % 3]
+        wrapped = WrappedType.create(obj)
+        wrapped.metaData = MetaData(name=f'{wrapped.className.lower()}{i}')
+        yield wrapped
+
+
+@pytest.mark.offline
+@pytest.mark.parametrize('suffix', ['.jsonl', '.jsonl.gz', '.jsonl.zst'])
+def test__bundle_round_trip(tmp_path, suffix):
+    if suffix.endswith('.zst'):
+        pytest.importorskip('zstandard')
+    path_ = str(tmp_path / f'records{suffix}')
+    records = list(_records(3000))
+    assert(write_bundle(path_, records, block_size=16 << 10) == 3000)
+    with BundleReader(path_) as bundle:
+        assert(len(bundle) == 3000)
+        assert(bundle.classes() == {'User': 1000, 'Role': 1000, 'Server': 1000})
+        assert(list(bundle) == records)
+        assert(bundle[1234] == records[1234])
+        assert(bundle.get('Server', 'server2999').to_instance() == Server(5432, 'pg2999'))
+        assert([w.metaData.name for w in bundle.find(className='Role')][:2] == ['role1', 'role4'])
+        with pytest.raises(KeyError):
+            bundle.get('User', 'role1')
+    with BundleReader(path_, use_mmap=False) as bundle:
+        assert(bundle[2998] == records[2998])
+
+
+@pytest.mark.offline
+def test__bundle_random_access_reads_one_block(tmp_path):
+    path_ = str(tmp_path / 'records.jsonl.gz')
+    with BundleWriter(path_, block_size=8 << 10) as out:
+        out.write_all(_records(2000))
+    # every block a gzip member of its own, so the file is ordinary .jsonl.gz
+    with gzip.open(path_, 'rt') as f:
+        assert(sum(1 for _ in f) == 2000)
+    with BundleReader(path_) as bundle:
+        assert(len(bundle.blocks) > 10)
+        block = bundle.entries[bundle.positions('User', 'user1500')[0]][2]
+        decompressed = []
+        original = bundle._block
+
+        def tracked(i):
+            if bundle._cached[0] != i:
+                decompressed.append(i)
+            return original(i)
+        bundle._block = tracked
+        assert(bundle.get('User', 'user1500').to_instance().userName == 'user1500')
+        assert(decompressed == [block])
+
+
+@pytest.mark.offline
+@pytest.mark.parametrize('suffix', ['.jsonl', '.jsonl.gz'])
+def test__bundle_index_is_rebuilt(tmp_path, suffix):
+    # a bundle written elsewhere without an index, and one whose index is stale
+    path_ = str(tmp_path / f'records{suffix}')
+    records = list(_records(500))
+    lines = ''.join(json.dumps(r.to_dict()) + '\n' for r in records).encode('utf-8')
+    with open(path_, 'wb') as f:
+        f.write(gzip.compress(lines[:len(lines) // 2]) + gzip.compress(lines[len(lines) // 2:])
+                if suffix.endswith('.gz') else lines)
+    with BundleReader(path_) as bundle:
+        assert(list(bundle) == records)
+        assert(bundle.get('User', 'user498') == records[498])
+    assert(os.path.exists(path_ + '.idx'))
+    write_bundle(path_, records[:10])
+    with open(path_, 'ab') as f:
+        f.write(gzip.compress(lines) if suffix.endswith('.gz') else lines)
+    with BundleReader(path_) as bundle:
+        assert(len(bundle) == 510)
+
+
+@pytest.mark.offline
+def test__bundle_pack_and_provisioning(tmp_path):
+    from ..pyramid_api.api_types import NewTenant
+    from ..pyramid_api.provisioning import load_bundle
+    files = []
+    for i, obj in enumerate([NewTenant('', '${tenant}'), Role('${tenant}', 'admins'), User('${tenant}', 'ann')]):
+        files.append(str(tmp_path / f'{i}.json'))
+        WrappedType.create(obj).to_file(files[-1])
+    path_ = str(tmp_path / 'tenant.jsonl.gz')
+    assert(pack(files, path_) == 3)
+    spec = load_bundle(path_, {'tenant': 'beta'})
+    assert([t.name for t in spec.tenants] == ['beta'])
+    assert([(u.tenantId, u.userName) for u in spec.users] == [('beta', 'ann')])
+    assert(load_bundle(path_).roles == [Role('${tenant}', 'admins')])
@@ -0,0 +1,143 @@
+import logging
+
+import pytest
+
+from dataclasses import asdict
+
+from ..pyramid_api.api_types import (
+    ContentItem,
+    ContentType,
+    ItemId,
+    ModifiedItemsResult,
+    NewTenant,
+    SearchParams,
+    Server,
+    TenantData,
+    TenantSettings,
+    User
+)
+
+from ..pyramid_api.codecs import (
+    decode,
+    decode_list,
+    decoder,
+    encode,
+    encode_list,
+    encoder
+)
+
+
+LOG = logging.getLogger(__name__)
+
+
+@pytest.mark.unit
+@pytest.mark.helpers
+def test__decoder_tolerates_schema_changes():
+    item = decode(ContentItem, {
+        'id': 'i1', 'parentId': 'p1', 'caption': 'c', 'itemType': 1,
+        'contentType': 5, 'addedInANewerServer': True
+    })
+    assert(item == ContentItem('i1', 'p1', 'c', 1, ContentType.folder))
+    assert(item.contentType is ContentType.folder)
+    # values this client does not know about survive as plain ints
+    assert(decode(ContentItem, {'id': 'i1', 'contentType': 99}).contentType == 99)
+    # missing required fields become None, explicit nulls are kept
+    partial = decode(ContentItem, {'id': 'i2', 'createdBy': None})
+    assert(partial.caption is None and partial.createdBy is None)
+    assert(decoder(ContentItem) is decoder(ContentItem))
+
+
+@pytest.mark.unit
+@pytest.mark.helpers
+def test__decoder_nested_types():
+    res = decode(ModifiedItemsResult, {'success': True, 'modifiedList': [{'id': 'a', 'name': 'n'}]})
+    assert(res.modifiedList == [ItemId('a', 'n')])
+    assert(res.modifiedList[0].get('id') == 'a' and res.modifiedList[0]['name'] == 'n')
+    assert(res.modifiedList[0].get('to_dict') is None)
+    with pytest.raises(KeyError):
+        res.modifiedList[0]['missing']
+    assert(decode(ModifiedItemsResult, {'success': False}).errorMessage is None)
+
+    tenant = decode(TenantData, {'id': 't', 'name': 'n', 'tenantSettings': {'showGroupFolder': True}})
+    assert(tenant.tenantSettings == TenantSettings(showGroupFolder=True))
+
+    params = decode(SearchParams, {'searchString': 's', 'filterTypes': [3, 5]})
+    assert(params.filterTypes == [ContentType.datadiscovery, ContentType.folder])
+
+    # default factories are not shared between instances
+    users = decode_list(User, [{'tenantId': 't', 'userName': 'a'}, {'tenantId': 't', 'userName': 'b'}])
+    users[0].roleIds.append('r')
+    assert(users[1].roleIds == [])
+    assert(users[0] == User('t', 'a', ['r']))
+
+
+@pytest.mark.unit
+@pytest.mark.helpers
+def test__encoder_matches_asdict():
+    def old(obj):
+        return {k: v for k, v in asdict(obj).items() if v != None}
+    user = User('t', 'name', ['r1'], email='e@x')
+    assert(encode(user) == old(user))
+    assert('firstName' not in encode(user))
+    # values are not copied
+    assert(encode(user)['roleIds'] is user.roleIds)
+    server = Server(5432, 'srv', tenantId='t', additionalServerProperties={'a': 1})
+    assert(encode(server) == old(server))
+    params = SearchParams('s', [ContentType.folder])
+    assert(encode(params) == old(params))
+    # nested objects keep their nulls
+    tenant = TenantData('t', 'n', tenantSettings=TenantSettings(showGroupFolder=True))
+    assert(encode(tenant) == old(tenant))
+    new_tenant = NewTenant('t', 'n')
+    assert(encode(new_tenant, drop_nulls=False) == asdict(new_tenant))
+    assert(encoder(User) is encoder(User))
+    res = ModifiedItemsResult(True, modifiedList=[ItemId('a', 'n')])
+    assert(encode_list([user, res, user]) == [old(user), old(res), old(user)])
+
+
+LISTING = [
+    {'id': 'a', 'parentId': 'p', 'caption': 'A', 'itemType': 1, 'contentType': 5, 'createdDate': 10},
+    {'id': 'b', 'parentId': 'p', 'caption': 'B', 'itemType': 2, 'contentType': 3, 'extra': 'x'},
+]
+
+
+@pytest.mark.unit
+@pytest.mark.helpers
+def test__columnar_table():
+    from array import array
+    from ..pyramid_api.columnar import np, to_table
+    table = to_table(ContentItem, LISTING, use_numpy=False)
+    assert(len(table) == 2)
+    assert(table['id'] == ['a', 'b'])
+    assert(table['itemType'] == array('q', [1, 2]))
+    # nulls in an int column turn it into floats
+    assert(table['createdDate'][0] == 10 and table['createdDate'][1] != table['createdDate'][1])
+    assert('extra' not in table)
+    assert(table.row(1)['caption'] == 'B')
+    if np is not None:
+        table = to_table(ContentItem, LISTING)
+        assert(table['contentType'].dtype == np.int64)
+        assert(list(table['contentType']) == [5, 3])
+
+
+@pytest.mark.offline
+def test__columnar_results():
+    from ..pyramid_api.columnar import Table, columns_of
+    from ..pyramid_api.testing import STUB_DOMAIN, stub_api
+    api = stub_api({'/API2/content/getFolderItems': lambda body: {'data': LISTING}})
+    table = api.getFolderItems('u1', 'f1', columnar=True)
+    assert(isinstance(table, Table))
+    assert(list(table['caption']) == ['A', 'B'])
+    assert(isinstance(api.getFolderItems('u1', 'f1')[0], ContentItem))
+    # streamed into columns, the same table columns_of builds from the parsed response
+    res = api.session.post(f'{STUB_DOMAIN}/API2/content/getFolderItems')
+    parsed = columns_of(ContentItem)(res.json())
+    assert(table.columns.keys() == parsed.columns.keys() and len(parsed) == 2)
+    assert(list(table.rows())[0] == list(parsed.rows())[0])
+    assert(all(list(table[name]) == list(parsed[name]) for name in ('id', 'itemType', 'contentType')))
+    with pytest.raises(ValueError):
+        api.getFolderItems('u1', 'f1', columnar=True, stream=True)
+    pandas = pytest.importorskip('pandas')
+    frame = table.to_pandas()
+    assert(isinstance(frame, pandas.DataFrame))
+    assert(list(frame['id']) == ['a', 'b'])
@@ -0,0 +1,87 @@
+import logging
+import threading
+import time
+
+import pytest
+
+from ..pyramid_api.api_types import (
+    ContentItem,
+    ContentType,
+    ValidRootFolderType
+)
+
+from ..pyramid_api.crawler import (
+    crawl_folders
+)
+
+from ..pyramid_api.testing import (
+    stub_api
+)
+
+
+LOG = logging.getLogger(__name__)
+
+FANOUT = 3
+LEVELS = 3
+
+
+def _item(id_, parent, content_type):
+    return {'id': id_, 'parentId': parent, 'caption': id_, 'itemType': 1,
+            'contentType': int(content_type)}
+
+
+def _tree_routes(state):
+    lock = threading.Lock()
+
+    def folder_items(body):
+        folder = body['folderId']
+        with lock:
+            state['in_flight'] += 1
+            state['peak'] = max(state['peak'], state['in_flight'])
+        time.sleep(0.005)
+        with lock:
+            state['in_flight'] -= 1
+        items = [_item(f'{folder}/d', folder, ContentType.datadiscovery)]
+        if folder.count('/') < LEVELS - 1:
+            items += [_item(f'{folder}/{i}', folder, ContentType.folder) for i in range(FANOUT)]
+        return {'data': items}
+
+    return {
+        '/API2/content/getFolderItems': folder_items,
+        '/API2/content/getUserPublicRootFolder':
+            lambda body: {'data': _item('root', None, ContentType.folder)},
+        '/API2/content/getPublicOrGroupFolderByTenantId':
+            lambda body: {'data': _item(
+                body['folderTenantObject']['tenantId'], None, ContentType.folder)},
+    }
+
+
+@pytest.mark.offline
+def test__crawl_folders():
+    state = {'in_flight': 0, 'peak': 0}
+    api = stub_api(_tree_routes(state))
+    items = list(crawl_folders(api, 'u1', ValidRootFolderType.public, workers=4))
+    assert(all(isinstance(i, ContentItem) for i in items))
+    folders = [i for i in items if i.contentType == ContentType.folder]
+    # 3 + 9 folders below the root, one dashboard in each of the 13 folders
+    assert(len(folders) == FANOUT + FANOUT ** 2)
+    assert(len(items) - len(folders) == 1 + len(folders))
+    assert(1 < state['peak'] <= 4)
+
+    shallow = list(crawl_folders(api, 'u1', 'root', max_depth=1))
+    assert(len(shallow) == FANOUT + 1)
+
+    dashboards = list(crawl_folders(
+        api, 'u1', 'root', max_depth=2, content_types=[ContentType.datadiscovery]))
+    assert(len(dashboards) == 1 + FANOUT)
+    assert(all(i.contentType == ContentType.datadiscovery for i in dashboards))
+
+    # a frontier smaller than the fan-out slows the crawl down, nothing is skipped
+    for workers in (1, 4):
+        capped = list(crawl_folders(api, 'u1', 'root', workers=workers, max_frontier=1))
+        assert(sorted(i.id for i in capped) == sorted(i.id for i in items))
+
+    tenant = list(crawl_folders(api, 'u1', ValidRootFolderType.public, max_depth=1, tenant_id='t1'))
+    assert([i.id for i in tenant][:2] == ['t1/d', 't1/0'])
+    with pytest.raises(ValueError):
+        list(crawl_folders(api, 'u1', ValidRootFolderType.private, tenant_id='t1'))
@@ -0,0 +1,189 @@
+import time
+
+import pytest
+
+from ..pyramid_api.api import (
+    APIException,
+    PasswordGrant
+)
+from ..pyramid_api.api_types import (
+    ContentType,
+    NewFolder,
+    NewTenant,
+    SearchMatchType,
+    User,
+    ValidRootFolderType
+)
+from ..pyramid_api.emulator import (
+    Emulator,
+    EmulatorState,
+    Fault,
+    Fixed,
+    SEEDED_PASSWORD,
+    parse_latency,
+    seed
+)
+
+
+@pytest.mark.offline
+def test__emulator_flows():
+    with Emulator() as emu:
+        api = PasswordGrant(emu.url, 'admin', 'admin').get_api()
+        me = api.getMe()
+        assert(me.userName == 'admin')
+
+        res = api.createTenant(NewTenant('', 'acme'))
+        assert(res.success)
+        tenant = api.getTenantByName('acme')
+        assert(tenant.id == res.modifiedList[0].id)
+        assert(not api.createTenant(NewTenant('', 'acme')).success)
+
+        assert(api.createUserDb(User(tenant.id, 'bob', password='pw')).success)
+        assert(not api.createUserDb(User(tenant.id, 'bob')).success)
+        bob = api.getUsersByName('bob')[0]
+        assert(bob.tenantId == tenant.id)
+
+        root = api.getUserPublicRootFolder(bob.id)
+        res = api.createNewFolder(NewFolder(root.id, 'reports'))
+        items = api.getFolderItems(bob.id, root.id)
+        assert([(i.id, i.caption) for i in items] == [(res.modifiedList[0].id, 'reports')])
+        with pytest.raises(APIException):
+            api.getFolderItems(bob.id, 'missing')
+        # the threaded server creates a name once, however many ask at the same time,
+        # even when creating takes a while
+        new_id = emu.state.new_id
+
+        def slow_new_id(*args):
+            time.sleep(0.01)
+            return new_id(*args)
+        emu.state.new_id = slow_new_id
+        results = list(api.bulk(api.createNewFolder, [(NewFolder(root.id, 'dup'),)] * 16, workers=16))
+        assert(sum(r.value.success for r in results) == 1)
+        api.close()
+
+        # the new user can log in, bad passwords are rejected
+        assert(PasswordGrant(emu.url, 'bob', 'pw').get_api().getMe().id == bob.id)
+        with pytest.raises(Exception):
+            PasswordGrant(emu.url, 'bob', 'wrong').get_api()
+        assert(emu.stats()['calls']['/API2/access/createUserDb'] == 2)
+
+
+@pytest.mark.offline
+def test__emulator_seeded_data():
+    from ..pyramid_api.crawler import crawl_folders
+    state = EmulatorState()
+    # far more than could be stored, only touched items are ever built
+    tenant_id, = seed(state, users=1_000_000, items=10_000_000, fanout=100)
+    with Emulator(state) as emu:
+        user = f'{state.tenants[tenant_id]["name"]}.user999999'
+        api = PasswordGrant(emu.url, user, SEEDED_PASSWORD).get_api()
+        me = api.getMe()
+        assert(me.tenantId == tenant_id)
+
+        root = api.getUserPublicRootFolder(me.id)
+        top = api.getFolderItems(me.id, root.id)
+        assert(len(top) == 100 and all(i.contentType == ContentType.folder for i in top))
+        assert(all(i.parentId == top[0].id for i in api.getFolderItems(me.id, top[0].id)))
+
+        found = list(crawl_folders(api, me.id, ValidRootFolderType.public, max_depth=2, workers=4))
+        assert(len(found) == 100 + 100 * 100)
+        assert(len(api.getDataSourcesByTenant(tenant_id)) == 1 + 2 + 2)
+        api.close()
+
+    small = EmulatorState()
+    seed(small, items=30, fanout=5)
+
+    def search(text, match_type, types=None):
+        params = {'searchString': text, 'searchMatchType': match_type, 'filterTypes': types}
+        return {i['caption'] for i in small.findContentItem({'searchParams': params}, None)}
+
+    # with a fanout of 5 items 0-4 have children, 5-29 are leaves
+    assert(search('report 2', SearchMatchType.startswith) == {f'Report {n}' for n in range(20, 30)})
+    assert(search('', SearchMatchType.contains, [ContentType.folder]) == {f'Folder {n}' for n in range(5)})
+
+
+@pytest.mark.offline
+def test__emulator_faults_and_latency():
+    import time
+    from requests.exceptions import HTTPError
+    assert(parse_latency('lognormal:0.02:0.5').median == 0.02)
+
+    faults = {'/API2/access/getMe': Fault(1.0, status=503)}
+    with Emulator(latency=Fixed(0.05), faults=faults, seed=1) as emu:
+        api = PasswordGrant(emu.url, 'admin', 'admin').get_api()
+        with pytest.raises(HTTPError) as err:
+            api.getMe()
+        assert(err.value.response.status_code == 503)
+        start = time.perf_counter()
+        api.getUsersByName('admin')
+        assert(time.perf_counter() - start >= 0.05)
+
+        emu.faults = {'*': Fault(1.0, kind='error')}
+        with pytest.raises(APIException):
+            api.getUsersByName('admin')
+        emu.faults = {'*': Fault(1.0, kind='reset')}
+        with pytest.raises(Exception):
+            api.getUsersByName('admin')
+        emu.faults = None
+        assert(api.getUsersByName('admin')[0].userName == 'admin')
+        assert(emu.stats()['injected'] == {'status': 1, 'error': 1, 'reset': 1})
+        api.close()
+
+
+@pytest.mark.offline
+def test__compression():
+    import asyncio
+    import base64
+    import time
+    from ..pyramid_api.api_types import PieApiObject
+    from ..pyramid_api.streaming import PieFile
+    # a .pie is base64 of a zip, JSON-like text inside compresses well
+    pie = base64.b64encode(b''.join(b'{"row": %d, "value": "abc"},' % (i % 997) for i in range(200_000)))
+    endpoint = '/API2/content/importContent'
+
+    state = EmulatorState()
+    tenant_id, = seed(state, items=3000, fanout=3000)
+    # 20MB/s, the uncompressed upload alone takes about 0.4s
+    with Emulator(state, bandwidth=20e6) as emu:
+        user = f'{state.tenants[tenant_id]["name"]}.user0'
+        timings, metrics = {}, {}
+        for compress_requests in (False, True):
+            api = PasswordGrant(emu.url, user, SEEDED_PASSWORD).get_api(compress_requests=compress_requests)
+            me = api.getMe()
+            root = api.getUserPublicRootFolder(me.id)
+            start = time.perf_counter()
+            api.importContent(PieApiObject(root.id, pie.decode('ascii')))
+            timings[compress_requests] = time.perf_counter() - start
+            api.importContent(PieApiObject(root.id, PieFile(pie, chunk_size=1 << 16)))
+            assert(len(api.getFolderItems(me.id, root.id)) == 3000 + 2 * (compress_requests + 1))
+            metrics[compress_requests] = api.metrics.snapshot()
+            api.close()
+        assert([i['bytes'] for i in state.imports] == [len(pie)] * 4)
+        assert(timings[True] < timings[False] / 2)
+
+        plain, packed = metrics[False][endpoint], metrics[True][endpoint]
+        assert(plain['request_wire_bytes']['sum'] == plain['request_bytes']['sum'] > 2 * len(pie))
+        assert(packed['request_wire_bytes']['sum'] < packed['request_bytes']['sum'] / 10)
+        listing = metrics[True]['/API2/content/getFolderItems']
+        assert(listing['response_wire_bytes']['sum'] < listing['response_bytes']['sum'] / 5)
+        assert(emu.stats()['bytes_in'] < 3 * len(pie))
+
+        async def run():
+            api = await PasswordGrant(emu.url, user, SEEDED_PASSWORD).get_async_api(compress_requests=True)
+            try:
+                me = await api.getMe()
+                root = await api.getUserPublicRootFolder(me.id)
+                await api.importContent(PieApiObject(root.id, pie.decode('ascii')))
+                await api.importContent(PieApiObject(root.id, PieFile(pie, chunk_size=1 << 16)))
+                items = await api.getFolderItems(me.id, root.id)
+                return len(items), api.metrics.snapshot()
+            finally:
+                await api.close()
+
+        count, snapshot = asyncio.run(run())
+        assert(count == 3000 + 6)
+        assert([i['bytes'] for i in state.imports] == [len(pie)] * 6)
+        packed = snapshot[endpoint]
+        assert(packed['request_wire_bytes']['sum'] < packed['request_bytes']['sum'] / 10)
+        listing = snapshot['/API2/content/getFolderItems']
+        assert(listing['response_wire_bytes']['sum'] < listing['response_bytes']['sum'] / 5)
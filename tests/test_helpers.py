@@ -1,4 +1,3 @@
-from dataclasses import asdict
 import logging
 import os
 
@@ -9,6 +8,7 @@ from ..pyramid_api.api_types import (
 )
 
 from ..pyramid_api.helper_types import (
+    WrappedTemplate,
     WrappedType
 )
 
@@ -17,6 +17,7 @@ LOG = logging.getLogger(__name__)
 
 TEST_ARTIFACT_PATH = './tests/tmp'
 
+
 @pytest.mark.unit
 @pytest.mark.helpers
 def test__wrap_type():
@@ -45,7 +46,7 @@ def test__wrap_type():
         templated_from_file = WrappedType.createFromFile(file_path, values)
         assert(templated_from_file != wrapped_instance)
         resolved_instance = templated_from_file.to_instance()
-        assert(resolved_instance.id == values['tenantId']) 
+        assert(resolved_instance.id == values['tenantId'])
         # missing value
         del values['tenantName']
         with pytest.raises(KeyError):
@@ -53,7 +54,7 @@ def test__wrap_type():
         templated_from_file = WrappedType.createFromFile(file_path, values, False)
         assert(templated_from_file != wrapped_instance)
         resolved_instance = templated_from_file.to_instance()
-        assert(resolved_instance.id == values['tenantId']) 
+        assert(resolved_instance.id == values['tenantId'])
 
     finally:
         LOG.debug(from_file)
@@ -62,3 +63,53 @@ def test__wrap_type():
         os.rmdir(TEST_ARTIFACT_PATH)
 
 
+@pytest.mark.unit
+@pytest.mark.helpers
+def test__compiled_template(tmp_path):
+    from ..pyramid_api.api_types import (
+        AdminType,
+        User
+    )
+    obj = User(
+        '${tenant}',
+        '$first.$last',
+        ['$role', 'fixed-role'],
+        email='${first}.${last}@example.com',
+        adminType=AdminType.domainadmin,
+        firstName='$$first'
+    )
+    file_path = str(tmp_path / 'user.json')
+    WrappedType.create(obj).to_file(file_path)
+    template = WrappedType.compileFromFile(file_path)
+    assert(template.names == {'tenant', 'first', 'last', 'role'})
+
+    rows = [
+        {'tenant': 't1', 'first': f'ann{i}', 'last': 'lee', 'role': f'r{i % 3}'}
+        for i in range(300)]
+    expected = [WrappedType.createFromFile(file_path, values).to_instance() for values in rows]
+    assert(list(template.instances(rows)) == expected)
+    assert(template.render(rows[0]) == WrappedType.createFromFile(file_path, rows[0]))
+    assert(expected[0].userName == 'ann0.lee' and expected[0].firstName == '$first')
+    # instances share no lists
+    users = list(template.instances(rows[:2]))
+    users[0].roleIds.append('extra')
+    assert(users[1].roleIds == ['r1', 'fixed-role'])
+
+    columns = {
+        'tenant': 't1', 'first': [r['first'] for r in rows],
+        'last': 'lee', 'role': [r['role'] for r in rows]}
+    assert(template.instances_from_columns(columns) == expected)
+    with pytest.raises(ValueError):
+        template.instances_from_columns({**columns, 'role': ['r0']})
+
+    # error_on_missing as in createFromFile
+    partial = {'tenant': 't1', 'first': 'bo'}
+    with pytest.raises(KeyError):
+        template.instance(partial)
+    with pytest.raises(KeyError):
+        template.instances_from_columns({'tenant': ['t1']})
+    lenient = WrappedTemplate.fromFile(file_path, error_on_missing=False)
+    lenient_expected = WrappedType.createFromFile(file_path, partial, False).to_instance()
+    assert(lenient.instance(partial) == lenient_expected)
+    assert(lenient.instance(partial).roleIds == ['$role', 'fixed-role'])
+    assert(template.instance() == WrappedType.createFromFile(file_path).to_instance())
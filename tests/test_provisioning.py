@@ -0,0 +1,139 @@
+import pytest
+
+from ..pyramid_api.api import (
+    APIException,
+    PasswordGrant
+)
+from ..pyramid_api.api_types import (
+    AccessType,
+    NewTenant,
+    Role,
+    Server,
+    User
+)
+from ..pyramid_api.emulator import (
+    Emulator,
+    Fixed
+)
+from ..pyramid_api.provisioning import (
+    ContentSpec,
+    FolderSpec,
+    ProvisioningSpec,
+    ServerSpec,
+    build_plan,
+    load_spec,
+    provision
+)
+
+LATENCY = 0.03
+
+
+def _spec():
+    return ProvisioningSpec(
+        tenants=[NewTenant('', 'acme', proSeats=10)],
+        roles=[Role('acme', name) for name in ('admins', 'analysts', 'viewers')],
+        users=[User('acme', f'user{i}', roleIds=['viewers', 'analysts'][:i % 2 + 1], password='pw')
+               for i in range(6)],
+        servers=[
+            ServerSpec(Server(5432, f'pg{i}', tenantId='acme'), {'admins': AccessType.admin},
+                       {'sales': {'analysts': AccessType.read}, 'hr': {}})
+            for i in range(2)],
+        folders=[
+            FolderSpec('acme', 'reports', {'viewers': AccessType.read}),
+            FolderSpec('acme', 'reports/2024/q1', {'analysts': AccessType.write}),
+            FolderSpec('acme', 'archive')],
+        content=[ContentSpec('acme', 'reports/2024/q1', 'cGll'), ContentSpec('acme', 'archive', 'cGll')])
+
+
+@pytest.mark.offline
+def test__provisioning_plan():
+    plan = build_plan(_spec())
+    order = plan.order
+    assert(order[0] == 'tenant:acme')
+    assert(order.index('folder:acme/reports') < order.index('folder:acme/reports/2024'))
+    grant = plan.steps['folder:acme/reports/role:viewers']
+    # propagated grants wait for everything created below the folder
+    assert({'folder:acme/reports/2024/q1', 'content:acme/reports/2024/q1#0'} <= grant.deps)
+    assert('content:acme/archive#1' not in grant.deps)
+    assert(plan.steps['user:acme/user1'].deps == {'tenant:acme', 'role:acme/viewers', 'role:acme/analysts'})
+    # tenant -> root -> reports -> 2024 -> q1 -> import -> grant
+    assert(plan.depth() == 7)
+    assert('createUserDb(User(tenantId=<tenant:acme>' in plan.describe())
+
+    with pytest.raises(ValueError):
+        build_plan(ProvisioningSpec(roles=[Role('acme', 'admins')] * 2))
+
+
+@pytest.mark.offline
+def test__provisioning_runs_by_critical_path():
+    spec = _spec()
+    with Emulator(latency=Fixed(LATENCY)) as emu:
+        api = PasswordGrant(emu.url, 'admin', 'admin').get_api()
+        plan = build_plan(spec)
+        result = provision(api, plan, workers=16)
+        result.raise_for_errors()
+        assert(result.ok and len(result.ids) == len(plan.steps))
+
+        state = emu.state
+        tenant_id = result.ids['tenant:acme']
+        assert(state.tenants[tenant_id]['name'] == 'acme')
+        viewers, analysts = result.ids['role:acme/viewers'], result.ids['role:acme/analysts']
+        user = state.users[result.ids['user:acme/user1']]
+        assert(user['tenantId'] == tenant_id and user['roleIds'] == [viewers, analysts])
+        q1 = result.ids['folder:acme/reports/2024/q1']
+        assert(state.content[q1]['parentId'] == result.ids['folder:acme/reports/2024'])
+        assert(state.grants[q1] == {analysts: AccessType.write})
+        db = result.ids['server:acme/pg1/db:sales']
+        assert(state.databases[db]['serverId'] == result.ids['server:acme/pg1'])
+        assert(len(state.imports) == 2)
+
+        # wall clock follows the longest chain, not the number of calls
+        path, seconds = result.critical_path()
+        assert(len(path) == plan.depth())
+        assert(result.elapsed < result.sequential_seconds() / 3)
+        assert(result.elapsed < 2 * seconds)
+
+        # the tenant exists now: it fails and everything depending on it is skipped
+        result = provision(api, spec)
+        assert(list(result.errors) == ['tenant:acme'])
+        assert(len(result.skipped) == len(plan.steps) - 1)
+        with pytest.raises(APIException):
+            result.raise_for_errors()
+        api.close()
+
+
+@pytest.mark.offline
+def test__provisioning_from_wrapped_types(tmp_path):
+    from ..pyramid_api.helper_types import (
+        MetaData,
+        WrappedType
+    )
+    from ..pyramid_api.api_types import (
+        NewFolder,
+        PieApiObject,
+        RoleAssignmentType
+    )
+    files = []
+    for i, (obj, dst) in enumerate([
+        (NewTenant('', '${tenant}'), None),
+        (Role('${tenant}', 'admins'), None),
+        (User('${tenant}', 'ann', roleIds=['admins']), None),
+        (NewFolder('', 'dashboards'), '${tenant}/'),
+        (PieApiObject('', 'cGll', rolesAssignmentType=RoleAssignmentType.forceexternalroles,
+                      roleIds=['admins']), '${tenant}/dashboards')
+    ]):
+        wrapped = WrappedType.create(obj)
+        wrapped.metaData = MetaData(dstPath=dst)
+        files.append(str(tmp_path / f'{i}.json'))
+        wrapped.to_file(files[-1])
+    spec = load_spec(files, {'tenant': 'beta'})
+    assert([f.path for f in spec.folders] == ['dashboards'])
+    assert(spec.content[0].rolesAssignmentType == RoleAssignmentType.forceexternalroles)
+    with Emulator() as emu:
+        api = PasswordGrant(emu.url, 'admin', 'admin').get_api()
+        result = provision(api, spec)
+        assert(result.ok)
+        assert(emu.state.users[result.ids['user:beta/ann']]['roleIds'] == [result.ids['role:beta/admins']])
+        # imported with the role assignment of the file
+        assert(emu.state.imports[-1]['roleIds'] == [result.ids['role:beta/admins']])
+        api.close()
@@ -0,0 +1,96 @@
+import pytest
+
+from ..pyramid_api.api import PasswordGrant
+from ..pyramid_api.api_types import (
+    AccessType,
+    NewTenant,
+    Role,
+    Server,
+    User
+)
+from ..pyramid_api.emulator import Emulator
+from ..pyramid_api.provisioning import (
+    ContentSpec,
+    FolderSpec,
+    ProvisioningSpec,
+    ServerSpec
+)
+from ..pyramid_api.reconcile import reconcile
+
+
+def _spec(users, folders=('reports',), content=()):
+    return ProvisioningSpec(
+        tenants=[NewTenant('', 'acme')],
+        roles=[Role('acme', 'admins'), Role('acme', 'viewers')],
+        users=[User('acme', f'user{i}', roleIds=['viewers'], password='pw') for i in range(users)],
+        servers=[ServerSpec(Server(5432, 'pg', tenantId='acme'), {'admins': AccessType.admin}, {'sales': {}})],
+        folders=[FolderSpec('acme', path, {'viewers': AccessType.read}) for path in folders],
+        content=list(content))
+
+
+@pytest.mark.offline
+def test__reconcile_only_issues_changes():
+    with Emulator() as emu:
+        api = PasswordGrant(emu.url, 'admin', 'admin').get_api()
+        # nothing exists yet: the whole DAG, no lookups below the missing tenant
+        rec = reconcile(api, _spec(50))
+        assert(rec.changes == len(rec.plan.steps) and not rec.plan.given and rec.lookups == 1)
+        ids = rec.apply().ids
+
+        spec = _spec(60, ('reports', 'reports/2024'), [ContentSpec('acme', 'reports/2024', 'cGll', name='import 1')])
+        rec = reconcile(api, spec, known=ids)
+        plan = rec.describe()
+        assert('+ user:acme/user55: createUserDb' in plan and '+ user:acme/user5:' not in plan)
+        assert('= role:acme/viewers: ' in plan and '(known)' in plan)
+        assert(set(rec.plan.steps) == {f'user:acme/user{i}' for i in range(50, 60)} | {
+            'folder:acme/reports/2024', 'folder:acme/reports/2024/role:viewers',
+            'content:acme/reports/2024#0',
+            # propagated grants are issued again when something new is below them
+            'folder:acme/reports/role:viewers'})
+        created = emu.calls['/API2/access/createUserDb']
+        result = rec.apply()
+        assert(result.ok and emu.calls['/API2/access/createUserDb'] == created + 10)
+        ids.update(result.ids)
+
+        # converged: a re-run is lookups only, no matter how many objects exist
+        before = dict(emu.calls)
+        rec = reconcile(api, spec, known=ids)
+        assert(rec.changes == 0 and len(rec.observed) == 60 + 2 + 1 + 1 + 1 + 2 + 1 + 1)
+        assert(rec.lookups < 75)
+        assert(not any(k.split('/')[-1].startswith(('create', 'import', 'add', 'recognize'))
+                       for k, n in emu.calls.items() if n != before.get(k)))
+
+        # no endpoint updates users, changed roles are reported only
+        spec.users[0].roleIds = ['admins']
+        rec = reconcile(api, spec, known=ids)
+        assert(rec.changes == 0 and list(rec.drift) == ['user:acme/user0'])
+        assert('~ user:acme/user0: roles' in rec.describe())
+
+        # without the ids of the last run roles are still found by name, only
+        # grants cannot be told apart from new ones
+        rec = reconcile(api, spec)
+        assert(rec.changes and all('/role:' in k for k in rec.plan.steps))
+        assert({'role:acme/admins', 'role:acme/viewers'} <= rec.observed)
+        roles = emu.calls['/API2/access/createRole']
+        rec.apply()
+        assert(emu.calls['/API2/access/createRole'] == roles)
+        api.close()
+
+
+@pytest.mark.offline
+def test__reconcile_error_status_is_missing():
+    from requests.exceptions import ConnectionError
+    from ..pyramid_api.testing import stub_api
+
+    def unreachable(body):
+        raise ConnectionError('down')
+
+    spec = ProvisioningSpec(tenants=[NewTenant('', 'acme')], roles=[Role('acme', 'admins')])
+    api = stub_api({'/API2/access/getTenantByName': lambda body: (404, {'error': 'no such tenant'})})
+    rec = reconcile(api, spec)
+    assert(set(rec.plan.steps) == {'tenant:acme', 'role:acme/admins'} and not rec.plan.given)
+    api.close()
+    api = stub_api({'/API2/access/getTenantByName': unreachable})
+    with pytest.raises(ConnectionError):
+        reconcile(api, spec)
+    api.close()
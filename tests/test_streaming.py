@@ -0,0 +1,257 @@
+import base64
+import io
+import json
+import logging
+import mmap
+import tracemalloc
+
+import pytest
+from requests.adapters import BaseAdapter
+from requests import Response
+
+from ..pyramid_api.api_types import (
+    ContentItem,
+    ImportApiResultObject,
+    PieApiObject,
+    SearchParams
+)
+
+from ..pyramid_api.streaming import (
+    JsonArrayParser,
+    PieFile,
+    StreamingJsonBody
+)
+
+from ..pyramid_api.testing import (
+    STUB_DOMAIN,
+    stub_adapter,
+    stub_api
+)
+
+
+LOG = logging.getLogger(__name__)
+
+PIE_PATH = './tests/content/TimeSeriesRadar.pie'
+IMPORT = {'/API2/content/importContent': lambda body: {'data': {}}}
+
+
+@pytest.mark.offline
+def test__pie_file_sources(tmp_path):
+    expected = PieApiObject.dataFromPath(PIE_PATH)
+    with open(PIE_PATH, 'rb') as f:
+        raw = f.read()
+    with_newline = tmp_path / 'newline.pie'
+    with_newline.write_bytes(raw + b'\n')
+    with open(PIE_PATH, 'rb') as f, open(PIE_PATH, 'rb') as m:
+        mm = mmap.mmap(m.fileno(), 0, access=mmap.ACCESS_READ)
+        sources = [
+            PieFile(PIE_PATH, chunk_size=1000),
+            PieFile(PIE_PATH, use_mmap=True),
+            PieFile(str(with_newline), chunk_size=999),
+            PieFile(f),
+            PieFile(io.BytesIO(raw + b'\r\n')),
+            PieFile(memoryview(mm)),
+        ]
+        for pie in sources:
+            body = StreamingJsonBody({'auth': 't', 'pieApiObject': {'fileZippedData': pie}})
+            payload = b''.join(body)
+            assert(len(payload) == body.len)
+            assert(json.loads(payload)['pieApiObject']['fileZippedData'] == expected)
+        del sources, pie, body
+        mm.close()
+
+    binary = bytes(range(256)) * 41
+    encoded = PieFile(binary, encode=True, chunk_size=100)
+    assert(b''.join(encoded) == base64.b64encode(binary))
+    assert(encoded.length == len(base64.b64encode(binary)))
+    with pytest.raises(ValueError):
+        b''.join(PieFile(binary))
+
+    class ShortReads(io.RawIOBase):
+        # a pipe: reads return whatever arrived, here never more than 7 bytes
+        def __init__(self, data):
+            self.data = io.BytesIO(data)
+
+        def readable(self):
+            return True
+
+        def readinto(self, buf):
+            data = self.data.read(min(len(buf), 7))
+            buf[:len(data)] = data
+            return len(data)
+
+    assert(b''.join(PieFile(ShortReads(binary), encode=True, chunk_size=99)) == base64.b64encode(binary))
+
+
+@pytest.mark.offline
+def test__import_content_streams():
+    api = stub_api(IMPORT)
+    res = api.importContent(PieApiObject('folder', PieFile(PIE_PATH, chunk_size=4096)))
+    assert(isinstance(res, ImportApiResultObject))
+    call = stub_adapter(api).calls[0]
+    assert(call['body']['pieApiObject'] == {
+        'rootFolderId': 'folder',
+        'fileZippedData': PieApiObject.dataFromPath(PIE_PATH),
+        'clashDefaultOption': 1,
+        'rolesAssignmentType': 3
+    })
+
+
+class _CountingAdapter(BaseAdapter):
+    # consumes the request body without keeping it
+
+    def __init__(self):
+        super().__init__()
+        self.sent = 0
+
+    def send(self, request, **kwargs):
+        for chunk in request.body:
+            self.sent += len(chunk)
+        res = Response()
+        res.status_code = 200
+        res._content = b'{"data": {}}'
+        res.request = request
+        return res
+
+    def close(self):
+        pass
+
+
+@pytest.mark.offline
+def test__import_content_constant_memory(tmp_path):
+    size = 32 << 20
+    big = tmp_path / 'big.pie'
+    with open(big, 'wb') as f:
+        for _ in range(size >> 20):
+            f.write(b'A' * (1 << 20))
+    api = stub_api()
+    adapter = _CountingAdapter()
+    api.session.mount(STUB_DOMAIN, adapter)
+    tracemalloc.start()
+    try:
+        api.importContent(PieApiObject('folder', PieFile(str(big), chunk_size=256 << 10)))
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    assert(adapter.sent > size)
+    assert(peak < 4 << 20)
+
+
+ITEM = {'id': 'i1', 'parentId': 'f1', 'caption': 'caf\u00e9', 'itemType': 1, 'contentType': 3}
+
+
+@pytest.mark.offline
+def test__json_array_parser():
+    doc = {'meta': {'a': [1, 2]}, 'data': [dict(ITEM, id=str(i)) for i in range(500)] + [1.5, None, 'x']}
+    raw = json.dumps(doc, ensure_ascii=False).encode('utf-8')
+    for size in (1, 7, 4096, len(raw)):
+        parser = JsonArrayParser()
+        items, peak = [], 0
+        for i in range(0, len(raw), size):
+            items += parser.feed(raw[i:i + size])
+            peak = max(peak, parser.buffered)
+        items += parser.close()
+        assert(items == doc['data'])
+        assert(parser.fields == {'meta': {'a': [1, 2]}})
+        # never more than about one item plus one chunk is held
+        assert(peak <= 2 * len(json.dumps(ITEM)) + size)
+
+    parser = JsonArrayParser()
+    assert(parser.feed(b'{"error": "nope", "data": []}') == [])
+    assert(parser.close() == [] and parser.fields == {'error': 'nope'})
+    parser = JsonArrayParser()
+    parser.feed(b'{"data": [1, 2')
+    with pytest.raises(ValueError):
+        parser.close()
+
+
+class _ItemsBody(io.RawIOBase):
+    # a {"data": [...]} body of `count` items made up while it is read
+
+    def __init__(self, count: int):
+        self.count = count
+        self.sent = 0
+        self._parts = self._generate()
+        self._pending = b''
+
+    def _generate(self):
+        yield b'{"data": ['
+        item = json.dumps(ITEM).encode()
+        for i in range(self.count):
+            yield item if i == 0 else b',' + item
+        yield b']}'
+
+    def readable(self):
+        return True
+
+    def readinto(self, buf):
+        while len(self._pending) < len(buf):
+            part = next(self._parts, None)
+            if part is None:
+                break
+            self._pending += part
+        n = min(len(buf), len(self._pending))
+        buf[:n], self._pending = self._pending[:n], self._pending[n:]
+        self.sent += n
+        return n
+
+
+class _ItemsAdapter(BaseAdapter):
+
+    def __init__(self, count: int):
+        super().__init__()
+        self.body = _ItemsBody(count)
+
+    def send(self, request, stream=False, **kwargs):
+        res = Response()
+        res.status_code = 200
+        res.request = request
+        res.url = request.url
+        res.raw = self.body
+        return res
+
+    def close(self):
+        pass
+
+
+@pytest.mark.offline
+def test__stream_response_constant_memory():
+    count = 50000
+    api = stub_api()
+    adapter = _ItemsAdapter(count)
+    api.session.mount(STUB_DOMAIN, adapter)
+    tracemalloc.start()
+    try:
+        seen = 0
+        for item in api.findContentItem(SearchParams('x', []), stream=True):
+            assert(isinstance(item, ContentItem))
+            seen += 1
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    assert(seen == count)
+    assert(adapter.body.sent > 4 << 20)
+    assert(peak < 1 << 20)
+    assert(api.metrics.snapshot()['/API2/content/findContentItem']['response_bytes']['sum'] == adapter.body.sent)
+
+
+@pytest.mark.offline
+def test__stream_response_errors():
+    from requests.exceptions import HTTPError
+    from ..pyramid_api.api import APIException
+    routes = {
+        '/API2/content/getFolderItems': lambda body: {'data': [ITEM, ITEM]},
+        '/API2/content/findContentItem': lambda body: {'error': 'bad search'},
+        '/API2/dataSources/getAllConnectionStrings': lambda body: (500, {'error': 'boom'}),
+    }
+    api = stub_api(routes)
+    items = api.getFolderItems('u1', 'f1', stream=True)
+    # nothing is sent before the first item is asked for
+    assert(stub_adapter(api).calls == [])
+    assert([i.caption for i in items] == ['caf\u00e9', 'caf\u00e9'])
+    with pytest.raises(APIException):
+        list(api.findContentItem(SearchParams('x', []), stream=True))
+    with pytest.raises(HTTPError):
+        list(api.getAllConnectionStrings(stream=True))
+    with pytest.raises(ValueError):
+        api.getFolderItems('u1', 'f1', columnar=True, stream=True)
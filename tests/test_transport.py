@@ -0,0 +1,461 @@
+import json
+import logging
+
+import pytest
+
+from ..pyramid_api.api import (
+    ConnectionOptions,
+    Grant,
+)
+
+from ..pyramid_api.api_types import (
+    User
+)
+
+from ..pyramid_api.testing import (
+    stub_adapter,
+    stub_api
+)
+
+
+LOG = logging.getLogger(__name__)
+
+ME = {'data': {'tenantId': 't1', 'userName': 'admin', 'id': 'u1'}}
+
+
+@pytest.mark.offline
+def test__session_options():
+    api = Grant().get_api(pool_connections=2, pool_maxsize=16, connect_timeout=1.5, read_timeout=30)
+    adapter = api.session.get_adapter('https://somewhere')
+    assert(adapter._pool_connections == 2)
+    assert(adapter._pool_maxsize == 16)
+    assert(api.options.timeout == (1.5, 30))
+    api.close()
+
+
+@pytest.mark.offline
+def test__session_reused_across_calls():
+    api = stub_api({'/API2/access/getMe': lambda body: ME}, read_timeout=5)
+    session = api.session
+    for _ in range(3):
+        assert(isinstance(api.getMe(), User))
+    assert(api.session is session)
+    calls = stub_adapter(api).calls
+    assert(len(calls) == 3)
+    assert(calls[0]['timeout'] == (None, 5))
+    assert(calls[0]['body'] == {'auth': 'stub-token'})
+
+
+@pytest.mark.offline
+def test__shared_session():
+    shared = ConnectionOptions().build_session()
+    with Grant().get_api(session=shared) as a, Grant().get_api(session=shared) as b:
+        assert(a.session is b.session is shared)
+        # closing an API never closes a session it was handed
+        assert(not a._owns_session)
+
+
+@pytest.mark.offline
+def test__response_cache():
+    from ..pyramid_api.cache import ResponseCache
+    clock = [0.0]
+    cache = ResponseCache(max_size=2, clock=lambda: clock[0])
+    routes = {
+        '/API2/access/getMe': lambda body: ME,
+        '/API2/access/getUsersByName': lambda body: {'data': [ME['data']]},
+        '/API2/access/getTenantByName': lambda body: {'data': {'id': 't1', 'name': body['tenantName']}},
+        '/API2/access/createUserDb': lambda body: {'data': {'success': True}},
+        '/API2/tasks/runSchedule': lambda body: {'data': 'ok'},
+    }
+    api = stub_api(routes, cache=cache)
+    calls = stub_adapter(api).calls
+
+    for _ in range(3):
+        api.getMe()
+        api.getUsersByName('admin')
+    assert(len(calls) == 2)
+    assert(cache.stats()['hits'] == 4)
+
+    # writes drop only the lookups they affect
+    api.createUserDb(User('t1', 'new'))
+    api.getMe()
+    api.getUsersByName('admin')
+    assert([c['endpoint'] for c in calls[-2:]] ==
+           ['/API2/access/createUserDb', '/API2/access/getUsersByName'])
+
+    # LRU eviction at max_size, getMe was the least recently used
+    api.getTenantByName('a')
+    assert(len(cache) == 2 and cache.evictions == 1)
+    api.getMe()
+    assert(calls[-1]['endpoint'] == '/API2/access/getMe')
+    # TTL expiry
+    api.getMe()
+    assert(calls[-1]['endpoint'] == '/API2/access/getMe' and len(calls) == 6)
+    clock[0] += 301
+    api.getMe()
+    assert(len(calls) == 7)
+
+    # unknown writes clear everything
+    api.runSchedule('s1')
+    assert(len(cache) == 0)
+
+
+@pytest.mark.offline
+def test__tracing(tmp_path):
+    from ..pyramid_api.api_types import PieApiObject
+    from ..pyramid_api.tracing import Tracer, REDACTED
+    records = []
+    routes = {
+        '/API2/access/getMe': lambda body: ME,
+        '/API2/content/importContent': lambda body: {'data': {}},
+        '/API2/access/getUsersByName': lambda body: (500, {'error': 'boom'}),
+    }
+    api = stub_api(routes, tracer=Tracer(records.append, sample_every=2, max_chars=16))
+    for _ in range(4):
+        api.getMe()
+    assert(len(records) == 2)
+    assert(records[0].request == {'auth': REDACTED})
+    assert(records[0].response == ME)
+
+    records.clear()
+    api.tracer.sample_every = 1
+    api.importContent(PieApiObject('f1', 'A' * 100000))
+    data = records[0].request['pieApiObject']['fileZippedData']
+    assert(data.startswith('A' * 16) and data.endswith('[100000 chars]'))
+
+    # failures are always traced, slow-only sampling skips fast calls
+    records.clear()
+    api.tracer = Tracer(str(tmp_path / 'trace.jsonl'), sample_every=0, slow_threshold=60)
+    api.getMe()
+    with pytest.raises(Exception):
+        api.getUsersByName('x')
+    lines = (tmp_path / 'trace.jsonl').read_text().splitlines()
+    assert(len(lines) == 1 and '"status": 500' in lines[0])
+    assert('boom' in lines[0])
+
+    # plain text bodies, ie the bare session token of authenticateUser, never reach a sink
+    from ..pyramid_api.api import PasswordGrant
+    from ..pyramid_api.testing import STUB_DOMAIN, stub_adapter
+    stub_adapter(api).routes.update({
+        '/API2/auth/authenticateUser': lambda body: b'SECRET-TOKEN-123',
+        '/API2/tasks/runSchedule': lambda body: b'SECRET-TOKEN-456',
+    })
+    path = tmp_path / 'secrets.jsonl'
+    api.tracer = Tracer(str(path))
+    api.authenticate(PasswordGrant(STUB_DOMAIN, 'admin', 'pw'))
+    assert(api.token == 'SECRET-TOKEN-123')
+    assert(api.runSchedule('s1') == 'SECRET-TOKEN-456')
+    trace = path.read_text()
+    assert(len(trace.splitlines()) == 2)
+    assert('SECRET-TOKEN' not in trace and '"pw"' not in trace)
+
+
+@pytest.mark.offline
+def test__adaptive_timeouts_and_hedging():
+    import threading
+    import time
+    from ..pyramid_api.latency import LatencyPolicy
+    stall = threading.Event()
+    seen = []
+
+    def folder_items(body):
+        seen.append(time.perf_counter())
+        # the first copy of the stalled call hangs, its hedge answers at once
+        if stall.is_set() and len(seen) == 1:
+            time.sleep(2)
+        return {'data': []}
+
+    routes = {
+        '/API2/content/getFolderItems': folder_items,
+        '/API2/access/createUserDb': lambda body: (time.sleep(0.05), {'data': {'success': True}})[1],
+    }
+    policy = LatencyPolicy(hedge=True, hedge_budget=1.0, min_samples=5, min_timeout=2)
+    api = stub_api(routes, latency=policy, read_timeout=30)
+    calls = stub_adapter(api).calls
+
+    # reads are bounded before enough samples exist, writes keep the configured timeout
+    api.getFolderItems('u1', 'f1')
+    assert(calls[-1]['timeout'] == (None, 30))
+    for _ in range(5):
+        api.getFolderItems('u1', 'f1')
+        api.createUserDb(User('t1', 'new'))
+    assert(2 <= calls[-2]['timeout'][1] < 30)
+    assert(calls[-1]['timeout'] == (None, 30))
+    assert(policy.stats()['/API2/content/getFolderItems']['count'] == 6)
+
+    seen.clear()
+    stall.set()
+    start = time.perf_counter()
+    assert(api.getFolderItems('u1', 'f1') == [])
+    assert(time.perf_counter() - start < 1)
+    assert(len(seen) == 2)
+    assert(policy.hedges['/API2/content/getFolderItems'] == 1)
+    assert(policy.hedge_wins['/API2/content/getFolderItems'] == 1)
+
+    # slow writes are never duplicated
+    before = len(calls)
+    api.createUserDb(User('t1', 'new'))
+    assert(len(calls) == before + 1)
+    assert(sum(policy.hedges.values()) == 1)
+    api.close()
+
+
+@pytest.mark.offline
+def test__token_cache(tmp_path):
+    import os
+    import stat
+    from ..pyramid_api.api import PasswordGrant, TokenGrant
+    from ..pyramid_api.testing import STUB_DOMAIN, StubAdapter
+    server = {'token': 'tok-1', 'logins': 0}
+
+    def authenticate(body):
+        server['logins'] += 1
+        return server['token']
+
+    def get_me(body):
+        return ME if body['auth'] == server['token'] else (401, {'error': 'expired'})
+
+    adapter = StubAdapter({
+        '/API2/auth/authenticateUser': authenticate,
+        '/API2/access/getMe': get_me,
+    })
+    session = ConnectionOptions().build_session()
+    session.mount(STUB_DOMAIN, adapter)
+    path = tmp_path / 'cache' / 'tokens.json'
+
+    def login(password='pw'):
+        return PasswordGrant(STUB_DOMAIN, 'admin', password).get_api(session=session, token_cache=str(path))
+
+    assert(login().token == 'tok-1')
+    assert(stat.S_IMODE(os.stat(path).st_mode) == 0o600)
+    assert('pw' not in path.read_text())
+    # the next process starts without a round trip
+    api = login()
+    assert(api.token == 'tok-1' and server['logins'] == 1 and len(adapter.calls) == 1)
+
+    # the server expired the token, it is replaced once and the call resent
+    server['token'] = 'tok-2'
+    assert(api.getMe().id == 'u1')
+    assert([c['endpoint'] for c in adapter.calls[1:]] == [
+        '/API2/access/getMe', '/API2/auth/authenticateUser', '/API2/access/getMe'])
+    assert(login().token == 'tok-2' and server['logins'] == 2)
+
+    # another password is checked by the server, not answered from the cache
+    login('changed')
+    assert(server['logins'] == 3)
+    login()
+    assert(server['logins'] == 4)
+    login()
+    assert(server['logins'] == 4)
+
+    # token grants skip getMe once validated, and nothing is retried for them
+    TokenGrant(STUB_DOMAIN, 'tok-2').get_api(session=session, token_cache=str(path))
+    before = len(adapter.calls)
+    api = TokenGrant(STUB_DOMAIN, 'tok-2').get_api(session=session, token_cache=str(path))
+    assert(len(adapter.calls) == before)
+    server['token'] = 'tok-3'
+    with pytest.raises(Exception):
+        api.getMe()
+    import json
+    assert(list(json.loads(path.read_text())) == [f'{STUB_DOMAIN}|admin'])
+
+
+@pytest.mark.offline
+def test__single_flight():
+    import threading
+    import time
+    from ..pyramid_api.bulk import run_bulk
+    workers = 10
+    sent = []
+
+    def tenant(body):
+        sent.append(body['tenantName'])
+        time.sleep(0.2)
+        return {'data': {'id': 't1', 'name': body['tenantName']}}
+
+    routes = {
+        '/API2/access/getTenantByName': tenant,
+        '/API2/access/createUserDb': lambda body: (time.sleep(0.2), {'data': {'success': True}})[1],
+    }
+    api = stub_api(routes, single_flight=True, pool_maxsize=workers)
+    barrier = threading.Barrier(workers)
+
+    def lookup(name):
+        barrier.wait()
+        return api.getTenantByName(name)
+
+    results = [r.value for r in run_bulk(lookup, ['a'] * workers, workers)]
+    assert(sent == ['a'])
+    assert(all(r is results[0] for r in results))
+    stats = api.single_flight.stats()
+    assert(stats['calls'] == 1 and stats['saved'] == workers - 1)
+
+    # different bodies and writes are never merged
+    sent.clear()
+    list(run_bulk(lookup, ['a', 'b'] * (workers // 2), workers))
+    assert(sorted(sent) == ['a', 'b'])
+
+    def create(_):
+        barrier.wait()
+        return api.createUserDb(User('t1', 'new'))
+
+    list(run_bulk(create, range(workers), workers))
+    assert(len([c for c in stub_adapter(api).calls if c['endpoint'].endswith('createUserDb')]) == workers)
+
+
+@pytest.mark.offline
+def test__metrics():
+    from requests.exceptions import ConnectionError
+    from ..pyramid_api.api import APIException
+    from ..pyramid_api.metrics import MetricsRegistry, aggregate
+    routes = {
+        '/API2/access/getMe': lambda body: ME,
+        '/API2/access/getUsersByName': lambda body: (500, {'error': 'boom'}),
+        '/API2/access/getTenantByName': lambda body: {'error': 'no such tenant'},
+    }
+    api = stub_api(routes)
+    for _ in range(3):
+        api.getMe()
+    with pytest.raises(Exception):
+        api.getUsersByName('x')
+    with pytest.raises(APIException):
+        api.getTenantByName('x')
+
+    snap = api.metrics.snapshot()
+    me = snap['/API2/access/getMe']
+    assert(me['calls'] == 3 and me['latency']['count'] == 3)
+    assert(me['response_bytes']['sum'] == 3 * len(json.dumps(ME)))
+    assert(me['request_bytes']['sum'] == 3 * len(json.dumps({'auth': 'stub-token'})))
+    assert(me['latency']['buckets'][-1] == (float('inf'), 3))
+    assert(snap['/API2/access/getUsersByName']['errors'] == {500: 1})
+    assert(snap['/API2/access/getTenantByName']['exceptions'] == {'APIException': 1})
+
+    text = api.metrics.to_prometheus(labels={'instance': 'a'})
+    assert('pyramid_api_calls_total{instance="a",endpoint="/API2/access/getMe"} 3' in text)
+    assert('pyramid_api_http_errors_total{instance="a",endpoint="/API2/access/getUsersByName",status="500"} 1' in text)
+    assert('pyramid_api_request_seconds_bucket{instance="a",endpoint="/API2/access/getMe",le="+Inf"} 3' in text)
+
+    # requests that never got an answer count under the transport's exception
+    stub_adapter(api).routes = {**routes, '/API2/access/getMe': _raise(ConnectionError('down'))}
+    with pytest.raises(ConnectionError):
+        api.getMe()
+    assert(api.metrics.snapshot()['/API2/access/getMe']['exceptions'] == {'ConnectionError': 1})
+
+    # one registry pooled by two APIs, and a process wide roll up of all of them
+    shared = MetricsRegistry()
+    first, second = stub_api(routes, metrics=shared), stub_api(routes, metrics=shared)
+    first.getMe()
+    second.getMe()
+    assert(shared.snapshot()['/API2/access/getMe']['calls'] == 2)
+    total = aggregate([api.metrics, shared, shared])
+    assert(total.snapshot()['/API2/access/getMe']['calls'] == 4 + 2)
+    assert(aggregate().snapshot()['/API2/access/getMe']['calls'] >= 6)
+
+    assert(api.metrics.reset()['/API2/access/getMe']['calls'] == 4)
+    assert(api.metrics.snapshot() == {})
+    for a in (api, first, second):
+        a.close()
+
+
+def _raise(err):
+    def handler(body):
+        raise err
+    return handler
+
+
+@pytest.mark.offline
+def test__adaptive_timeout_follows_a_latency_step():
+    from requests.exceptions import ReadTimeout
+    from ..pyramid_api.latency import LatencyPolicy
+    server = {'latency': 0.0}
+
+    def folder_items(body):
+        # answers after server['latency'], a shorter read timeout fails the call
+        if calls[-1]['timeout'][1] < server['latency']:
+            raise ReadTimeout('read timed out')
+        return {'data': []}
+
+    policy = LatencyPolicy(min_samples=5, min_timeout=0.1)
+    api = stub_api({'/API2/content/getFolderItems': folder_items}, latency=policy, read_timeout=30)
+    calls = stub_adapter(api).calls
+    for _ in range(256):
+        api.getFolderItems('u1', 'f1')
+    assert(calls[-1]['timeout'][1] == 0.1)
+
+    # the server slows down for good: the timeout backs off until calls succeed again
+    server['latency'] = 1.0
+    failures = 0
+    while True:
+        try:
+            api.getFolderItems('u1', 'f1')
+            break
+        except ReadTimeout:
+            failures += 1
+            assert(failures <= 10)
+    assert(policy.timeouts['/API2/content/getFolderItems'] == failures)
+    assert(1.0 <= calls[-1]['timeout'][1] < 30)
+    api.close()
+
+
+@pytest.mark.offline
+def test__hooks_and_profiler():
+    from ..pyramid_api.hooks import Encoded, Hooks, Profiler
+    routes = {
+        '/API2/access/getMe': lambda body: ME,
+        '/API2/access/createUserDb': lambda body: {'data': {'success': True, 'modifiedList': []}},
+        '/API2/access/getUsersByName': lambda body: (500, {'error': 'boom'}),
+        '/API2/tasks/runSchedule': lambda body: b'job-1',
+    }
+    before, after = [], []
+
+    def broken(call):
+        raise RuntimeError('hooks must not fail calls')
+
+    profiler = Profiler()
+    hooks = Hooks(before=[before.append, broken], after=[after.append, profiler])
+    api = stub_api(routes, hooks=hooks, concurrency=True)
+
+    api.createUserDb(User('t1', 'new'))
+    assert(len(before) == 1 and len(after) == 1)
+    call = after[0]
+    assert(call.endpoint == '/API2/access/createUserDb' and call.error is None)
+    assert(set(call.phases) == {'encode', 'queue', 'serialize', 'network', 'parse', 'decode'})
+    assert(sum(call.phases.values()) <= call.elapsed)
+
+    # untyped calls through _call_api are hooked too, not decoded
+    assert(api.runSchedule('s1') == 'job-1')
+    assert(after[-1].endpoint == '/API2/tasks/runSchedule' and 'decode' not in after[-1].phases)
+
+    with pytest.raises(Exception):
+        api.getUsersByName('x')
+    assert(after[-1].error is not None and 'network' in after[-1].phases)
+
+    for _ in range(3):
+        api.getMe()
+    stats = profiler.stats()
+    assert(stats['/API2/access/getMe']['calls'] == 3)
+    assert(stats['/API2/access/getUsersByName']['errors'] == 1)
+    shares = stats['/API2/access/getMe']['phases']
+    assert(abs(sum(p['share'] for p in shares.values()) - 1) < 1e-6)
+    report = profiler.report()
+    assert('/API2/access/getMe' in report and 'network' in report)
+    profiler.reset()
+    assert(profiler.stats() == {})
+    api.close()
+
+    # streamed listings are one call each, from the request to the last item
+    listing = {'/API2/content/getFolderItems': lambda body: {'data': [{'id': 'i1'}] * 3}}
+    api = stub_api(listing, hooks=hooks)
+    assert(len(list(api.getFolderItems('u1', 'f1', stream=True))) == 3)
+    assert(after[-1].endpoint == '/API2/content/getFolderItems')
+    assert({'serialize', 'network', 'parse', 'decode'} <= set(after[-1].phases))
+    stream = api.getFolderItems('u1', 'f1', stream=True)
+    next(stream)
+    stream.close()
+    assert(len(after) == len(before) and after[-1].error is None)
+    api.close()
+
+    # only APIs with hooks time encoding
+    plain = stub_api(routes)
+    assert(not isinstance(plain._encode(User('t1', 'new')), Encoded))
+    plain.close()